@@ -1,3 +1,4 @@
+import logging
 import os
 from urllib.parse import urlparse, urlunparse
 from datetime import timedelta
@@ -6,6 +7,12 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 
 from extensions import jwt, mongo
+from instrumentation import init_query_metrics, query_metrics
+from metrics import init_metrics, pool_metrics
+from structured_logging import configure_logging, init_request_ids
+from serialization import BSONJSONProvider
+
+logger = logging.getLogger(__name__)
 
 
 def create_app() -> Flask:
@@ -13,8 +20,15 @@ def create_app() -> Flask:
     Factory function to create and configure the Flask application.
     """
     load_dotenv()
+    configure_logging()
     app = Flask(__name__)
     
+    # --- JSON Encoding ---
+    # Encode ObjectId/datetime natively (orjson when available), so handlers
+    # can return Mongo documents without hand-converting ids.
+    app.json_provider_class = BSONJSONProvider
+    app.json = BSONJSONProvider(app)
+    
     # --- CORS Configuration ---
     # Allow frontend origin from environment variable
     frontend_url = os.getenv("FRONTEND_URL", "*")
@@ -22,7 +36,8 @@ def create_app() -> Flask:
         r"/api/*": {
             "origins": frontend_url,
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Request-ID"],
+            "expose_headers": ["X-Request-ID", "Retry-After"],
             "supports_credentials": True
         }
     })
@@ -55,8 +70,23 @@ def create_app() -> Flask:
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=12)
 
     # --- Initialize Extensions ---
-    mongo.init_app(app)
+    # Every Mongo command is attributed to the endpoint that issued it
+    mongo.init_app(app, event_listeners=[query_metrics, pool_metrics])
     jwt.init_app(app)
+    init_request_ids(app)
+    init_query_metrics(app)
+    init_metrics(app)
+
+    # --- Indexes ---
+    # Apply the index registry (idempotent); set ENSURE_INDEXES=0 to leave
+    # index builds to the deploy step (scripts/init_db.py) instead.
+    if os.getenv("ENSURE_INDEXES", "1") != "0":
+        from routes.indexes import ensure_indexes
+        try:
+            with app.app_context():
+                ensure_indexes(mongo.db)
+        except Exception as e:
+            logger.warning("Index creation skipped at startup: %s", e)
 
     # --- Import and Register Blueprints ---
     # Import blueprints here, after extensions are initialized,
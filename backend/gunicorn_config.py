@@ -1,12 +1,22 @@
 import os
+import shutil
+
+# Prometheus multiprocess mode: every worker writes its metric samples here so
+# /metrics can aggregate them. Must be set before the workers import the app.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/skillatics-prometheus")
 
 # Server socket
 bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
 backlog = 2048
 
 # Worker processes
-workers = 4
-worker_class = 'sync'
+# gthread: each worker serves `threads` requests concurrently, so requests
+# waiting on Gemini, Brevo or a code execution hold one thread, not a whole
+# worker. The app is thread-safe (PyMongo client, locked caches/metrics and a
+# per-worker cap on concurrent code executions, CODE_EXEC_CONCURRENCY).
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
 worker_connections = 1000
 timeout = 120
 keepalive = 2
@@ -31,3 +41,26 @@ tmp_upload_dir = None
 # SSL (if needed in future)
 keyfile = None
 certfile = None
+
+
+# Server hooks
+def on_starting(server):
+    """Start from an empty metrics directory so stale worker files are not aggregated"""
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def post_worker_init(worker):
+    """Start loading the near-duplicate index so the first question generation does not wait for it"""
+    from services.dedup_index import start_index_load
+    start_index_load()
+
+
+def child_exit(server, worker):
+    """Drop live gauges of a worker that exited"""
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
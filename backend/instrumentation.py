@@ -0,0 +1,160 @@
+"""
+Per-endpoint MongoDB query instrumentation.
+
+A PyMongo CommandListener attributes every command to the Flask endpoint that
+issued it (or "<background>" outside a request) and keeps, per worker process,
+command counts, total time and a ring of slow-command samples. PyMongo calls
+listeners on the thread that ran the command, so the current request context
+is the one that issued it.
+
+Set MONGO_SERVER_TIMING=1 to add a `Server-Timing: db;...` header to every
+response with that request's command count and time.
+"""
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import g, has_request_context, request
+from pymongo import monitoring
+
+BACKGROUND = "<background>"
+
+# Commands slower than this are kept as samples
+SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", "100"))
+MAX_SLOW_SAMPLES = 100
+
+# Command names whose first value is not a collection name
+_ADMIN_COMMANDS = {"ping", "hello", "isMaster", "ismaster", "endSessions", "buildInfo", "explain"}
+
+
+def _current_endpoint():
+    if has_request_context():
+        return request.endpoint or request.path
+    return BACKGROUND
+
+
+class QueryMetrics(monitoring.CommandListener):
+    """Command listener aggregating Mongo command stats per endpoint"""
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, max_samples=MAX_SLOW_SAMPLES):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._endpoints = {}
+        self._requests = {}
+        self._slow = deque(maxlen=max_samples)
+        self._since = datetime.utcnow()
+
+    # --- CommandListener ---
+
+    def started(self, event):
+        collection = None
+        if event.command_name not in _ADMIN_COMMANDS:
+            value = event.command.get(event.command_name)
+            if isinstance(value, str):
+                collection = value
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (_current_endpoint(), collection)
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def _record(self, event, failed):
+        duration_ms = event.duration_micros / 1000.0
+        with self._lock:
+            endpoint, collection = self._pending.pop(
+                (event.connection_id, event.request_id), (_current_endpoint(), None)
+            )
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    "commands": 0, "failures": 0, "totalMs": 0.0, "maxMs": 0.0, "byCommand": {}
+                }
+            stats["commands"] += 1
+            stats["failures"] += failed
+            stats["totalMs"] += duration_ms
+            stats["maxMs"] = max(stats["maxMs"], duration_ms)
+            stats["byCommand"][event.command_name] = stats["byCommand"].get(event.command_name, 0) + 1
+            if duration_ms >= self.slow_ms:
+                self._slow.append({
+                    "endpoint": endpoint,
+                    "command": event.command_name,
+                    "collection": collection,
+                    "durationMs": round(duration_ms, 2),
+                    "failed": failed,
+                    "at": datetime.utcnow(),
+                })
+
+        if has_request_context():
+            g._mongo_commands = g.get("_mongo_commands", 0) + 1
+            g._mongo_ms = g.get("_mongo_ms", 0.0) + duration_ms
+
+    # --- Request accounting ---
+
+    def record_request(self, endpoint):
+        with self._lock:
+            self._requests[endpoint] = self._requests.get(endpoint, 0) + 1
+
+    def snapshot(self, reset=False):
+        """
+        Stats collected by this worker since start (or the last reset).
+
+        Returns:
+            dict: pid, since, endpoints (sorted by total time) and slowQueries
+        """
+        with self._lock:
+            endpoints = []
+            for name, stats in self._endpoints.items():
+                requests = self._requests.get(name, 0)
+                endpoints.append({
+                    "endpoint": name,
+                    "requests": requests,
+                    "commands": stats["commands"],
+                    "failures": stats["failures"],
+                    "totalMs": round(stats["totalMs"], 2),
+                    "avgMs": round(stats["totalMs"] / stats["commands"], 2),
+                    "maxMs": round(stats["maxMs"], 2),
+                    "commandsPerRequest": round(stats["commands"] / requests, 2) if requests else None,
+                    "byCommand": dict(stats["byCommand"]),
+                })
+            result = {
+                "pid": os.getpid(),
+                "since": self._since,
+                "endpoints": sorted(endpoints, key=lambda e: e["totalMs"], reverse=True),
+                "slowQueries": list(self._slow),
+            }
+            if reset:
+                self._endpoints.clear()
+                self._requests.clear()
+                self._slow.clear()
+                self._since = datetime.utcnow()
+        return result
+
+
+query_metrics = QueryMetrics()
+
+
+def init_query_metrics(app):
+    """Count requests per endpoint and optionally emit Server-Timing headers"""
+    server_timing = os.getenv("MONGO_SERVER_TIMING", "0") == "1"
+
+    @app.before_request
+    def _start_request_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        query_metrics.record_request(_current_endpoint())
+        if server_timing:
+            commands = g.get("_mongo_commands", 0)
+            db_ms = g.get("_mongo_ms", 0.0)
+            total_ms = (time.perf_counter() - g.get("_request_started", time.perf_counter())) * 1000
+            response.headers.add(
+                "Server-Timing",
+                f'db;desc="{commands} commands";dur={db_ms:.1f}, app;dur={total_ms:.1f}'
+            )
+        return response
@@ -0,0 +1,197 @@
+"""
+Prometheus metrics for the API, served as text exposition from /metrics.
+
+Records per-blueprint request latency, in-flight requests, code execution
+duration per language, AI generation latency and failures, rate-limited
+requests, and MongoDB connection pool activity.
+
+With several gunicorn workers, set PROMETHEUS_MULTIPROC_DIR (gunicorn_config.py
+does) so every worker writes its samples to that directory and /metrics
+aggregates all of them, whichever worker serves the scrape. Set METRICS_TOKEN
+to require `Authorization: Bearer <token>` on /metrics. If prometheus_client
+is not installed, recording is a no-op and /metrics returns 503.
+"""
+import functools
+import os
+import time
+from flask import Response, g, request
+from pymongo import monitoring
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+    )
+except ImportError:  # pragma: no cover - metrics are optional
+    CollectorRegistry = None
+
+ENABLED = CollectorRegistry is not None
+
+if ENABLED:
+    REQUEST_LATENCY = Histogram(
+        "http_request_duration_seconds", "Request latency by blueprint",
+        ["blueprint", "method", "status"],
+        buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    )
+    REQUESTS_IN_FLIGHT = Gauge(
+        "http_requests_in_flight", "Requests currently being handled", multiprocess_mode="livesum"
+    )
+    CODE_EXECUTION_DURATION = Histogram(
+        "code_execution_duration_seconds", "Sandboxed code execution time by language",
+        ["language", "status"],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20),
+    )
+    CODE_EXECUTIONS_IN_PROGRESS = Gauge(
+        "code_executions_in_progress", "Code executions currently running", multiprocess_mode="livesum"
+    )
+    AI_GENERATION_DURATION = Histogram(
+        "ai_generation_duration_seconds", "AI question generation latency by model",
+        ["model", "outcome"],
+        buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+    )
+    AI_GENERATION_FAILURES = Counter(
+        "ai_generation_failures_total", "Failed AI generation calls by model", ["model"]
+    )
+    RATE_LIMITED = Counter(
+        "rate_limited_requests_total", "Requests rejected by a rate limit", ["endpoint", "scope"]
+    )
+    MONGO_POOL_CHECKED_OUT = Gauge(
+        "mongo_pool_connections_checked_out", "Pooled MongoDB connections in use", multiprocess_mode="livesum"
+    )
+    MONGO_POOL_OPEN = Gauge(
+        "mongo_pool_connections_open", "Open pooled MongoDB connections", multiprocess_mode="livesum"
+    )
+    MONGO_POOL_CHECKOUT_WAIT = Histogram(
+        "mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled MongoDB connection",
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+    )
+    MONGO_POOL_CHECKOUT_FAILURES = Counter(
+        "mongo_pool_checkout_failures_total", "Failed MongoDB connection checkouts", ["reason"]
+    )
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Tracks MongoDB connection pool usage"""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        if ENABLED:
+            MONGO_POOL_OPEN.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        if ENABLED:
+            MONGO_POOL_OPEN.dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        if ENABLED:
+            MONGO_POOL_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+            duration = getattr(event, "duration", None)
+            if duration is not None:
+                MONGO_POOL_CHECKOUT_WAIT.observe(duration)
+
+    def connection_checked_out(self, event):
+        if ENABLED:
+            MONGO_POOL_CHECKED_OUT.inc()
+            duration = getattr(event, "duration", None)
+            if duration is not None:
+                MONGO_POOL_CHECKOUT_WAIT.observe(duration)
+
+    def connection_checked_in(self, event):
+        if ENABLED:
+            MONGO_POOL_CHECKED_OUT.dec()
+
+
+pool_metrics = PoolMetrics()
+
+
+def observe_code_execution(func):
+    """Decorator timing an executor that takes (source, language, ...) and returns a result dict"""
+    @functools.wraps(func)
+    def wrapper(source_code, language, *args, **kwargs):
+        if not ENABLED:
+            return func(source_code, language, *args, **kwargs)
+        started = time.perf_counter()
+        status = "Error"
+        CODE_EXECUTIONS_IN_PROGRESS.inc()
+        try:
+            result = func(source_code, language, *args, **kwargs)
+            status = result.get("status") or ("Accepted" if result.get("success") else "Error")
+            return result
+        finally:
+            CODE_EXECUTIONS_IN_PROGRESS.dec()
+            CODE_EXECUTION_DURATION.labels(language.lower(), status).observe(time.perf_counter() - started)
+    return wrapper
+
+
+def observe_ai_generation(model, seconds, error=None):
+    """Record one AI generation call"""
+    if not ENABLED:
+        return
+    AI_GENERATION_DURATION.labels(model, "failure" if error else "success").observe(seconds)
+    if error:
+        AI_GENERATION_FAILURES.labels(model).inc()
+
+
+def observe_rate_limited(endpoint, scope):
+    """Record one request rejected by a rate limit"""
+    if ENABLED:
+        RATE_LIMITED.labels(endpoint, scope).inc()
+
+
+def _registry():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    from prometheus_client import REGISTRY
+    return REGISTRY
+
+
+def init_metrics(app):
+    """Register request hooks and the /metrics endpoint"""
+
+    @app.before_request
+    def _metrics_request_started():
+        g._metrics_started = time.perf_counter()
+        if ENABLED:
+            REQUESTS_IN_FLIGHT.inc()
+            g._metrics_in_flight = True
+
+    @app.after_request
+    def _metrics_request_finished(response):
+        started = g.get("_metrics_started")
+        if ENABLED and started is not None:
+            REQUEST_LATENCY.labels(
+                request.blueprint or "app", request.method, str(response.status_code)
+            ).observe(time.perf_counter() - started)
+        return response
+
+    @app.teardown_request
+    def _metrics_request_teardown(exc):
+        if g.pop("_metrics_in_flight", False):
+            REQUESTS_IN_FLIGHT.dec()
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        if not ENABLED:
+            return Response("prometheus_client is not installed\n", status=503, mimetype="text/plain")
+        token = os.getenv("METRICS_TOKEN")
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)
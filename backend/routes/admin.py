@@ -1,8 +1,14 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from bson import ObjectId
 from extensions import mongo
 from datetime import datetime
+from services.attempt_facts import sync_student_cohort
+from services.question_ingest import ingest_rows, open_csv, text_hash
+from services.dedup_index import index_questions, screen_near_duplicates
+from services.user_cache import update_user
+from services.import_jobs import FORMATS, create_job, detect_format, get_job, start_background_worker
+from instrumentation import query_metrics
 
 
 admin_bp = Blueprint("admin", __name__)
@@ -19,11 +25,21 @@ def list_users():
     if not is_admin():
         return jsonify({"error": "Forbidden"}), 403
 
-    users = []
-    for u in mongo.db.users.find({}, {"password": 0}):
-        u["_id"] = str(u["_id"])
-        users.append(u)
-    return jsonify(users)
+    return jsonify(list(mongo.db.users.find({}, {"password": 0})))
+
+
+@admin_bp.get("/metrics")
+@jwt_required()
+def query_metrics_report():
+    """
+    Mongo command counts and timings per endpoint for the worker that serves
+    this request (each gunicorn worker keeps its own). ?reset=1 clears them.
+    """
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+
+    reset = request.args.get("reset") == "1"
+    return jsonify(query_metrics.snapshot(reset=reset))
 
 
 @admin_bp.post("/questions")
@@ -64,9 +80,14 @@ def add_question():
         "type": qtype,
         "options": data.get("options", []),
         "answer": data.get("answer"),
+        "textHash": text_hash(data["text"]),
     }
+    accepted, _ = screen_near_duplicates([question_doc])
+    if not accepted:
+        return jsonify({"error": "A near-identical question already exists"}), 409
     res = mongo.db.questions.insert_one(question_doc)
-    return jsonify({"_id": str(res.inserted_id)}), 201
+    index_questions([question_doc])
+    return jsonify({"_id": res.inserted_id}), 201
 
 
 @admin_bp.post("/questions/csv")
@@ -84,66 +105,70 @@ def upload_questions_csv():
 
     # Expect CSV header with columns: text,topic,difficulty,type,options,answer
     # options should be pipe-separated: opt1|opt2|opt3
-    import csv, io
+    # Rows are decoded, validated and inserted in chunks as the upload is read.
     try:
-        stream = io.StringIO(file.stream.read().decode("utf-8"))
-    except Exception:
+        reader = open_csv(file.stream)
+        result = ingest_rows(
+            mongo.db.questions, reader, screen=screen_near_duplicates, on_insert=index_questions
+        )
+    except UnicodeDecodeError:
         return jsonify({"error": "Unable to read CSV (expecting UTF-8)"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    reader = csv.DictReader(stream)
-    required_cols = {"text", "topic", "difficulty", "type", "options", "answer"}
-    if not required_cols.issubset(set([c.strip() for c in (reader.fieldnames or [])])):
-        return jsonify({"error": "CSV must include columns: text, topic, difficulty, type, options, answer"}), 400
+    return jsonify(result), 201
 
-    legacy_map = {
-        "Aptitude": "General Aptitude",
-        "Technical": "Technical Aptitude",
-    }
-    inserted = 0
-    errors = []
-    for idx, row in enumerate(reader, start=2):  # start=2 accounting header row as 1
-        try:
-            text = (row.get("text") or "").strip()
-            topic = (row.get("topic") or "").strip()
-            raw_diff = (row.get("difficulty") or "").strip()
-            raw_type = (row.get("type") or "").strip()
-            options_raw = (row.get("options") or "").strip()
-            answer = (row.get("answer") or "").strip()
-
-            if not text or not topic or not raw_diff or not raw_type or not options_raw or not answer:
-                raise ValueError("Missing required fields")
-
-            try:
-                difficulty = int(raw_diff)
-            except Exception:
-                raise ValueError("Invalid difficulty")
-            if difficulty < 1 or difficulty > 5:
-                raise ValueError("Invalid difficulty range (1-5)")
-
-            qtype = legacy_map.get(raw_type, raw_type)
-            if qtype not in ["General Aptitude", "Technical Aptitude"]:
-                raise ValueError("Invalid type")
-
-            options = [o.strip() for o in options_raw.split("|") if o.strip()]
-            if len(options) < 2:
-                raise ValueError("At least two options required")
-            if answer not in options:
-                raise ValueError("Answer must be match one of the options exactly")
-
-            doc = {
-                "text": text,
-                "topic": topic,
-                "difficulty": difficulty,
-                "type": qtype,
-                "options": options,
-                "answer": answer,
-            }
-            mongo.db.questions.insert_one(doc)
-            inserted += 1
-        except Exception as e:
-            errors.append({"row": idx, "error": str(e)})
-
-    return jsonify({"inserted": inserted, "errors": errors}), 201
+
+# --- Question Import Jobs ---
+@admin_bp.post("/import-jobs")
+@jwt_required()
+def create_import_job():
+    """
+    Queue a question bank import (CSV, JSON, JSON Lines or XLSX). The file is
+    spooled to disk and processed in the background; poll the returned job.
+    """
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+
+    file = request.files.get("file")
+    if not file or file.filename == "":
+        return jsonify({"error": "No file provided"}), 400
+    if not detect_format(file.filename):
+        return jsonify({"error": f"Unsupported file type; expected one of {', '.join(FORMATS)}"}), 400
+
+    job = create_job(file, get_jwt_identity())
+    start_background_worker()
+    return jsonify({"jobId": job["_id"], "status": job["status"]}), 202
+
+
+@admin_bp.get("/import-jobs")
+@jwt_required()
+def list_import_jobs():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+
+    jobs = mongo.db.import_jobs.find(
+        {}, {"path": 0, "leaseUntil": 0, "errors": 0}
+    ).sort("createdAt", -1).limit(20)
+    return jsonify(list(jobs))
+
+
+@admin_bp.get("/import-jobs/<job_id>")
+@jwt_required()
+def get_import_job(job_id: str):
+    """Progress of an import job: rows done, inserted, duplicates, errors and rows/s"""
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    if not ObjectId.is_valid(job_id):
+        return jsonify({"error": "Invalid job id"}), 400
+
+    job = get_job(ObjectId(job_id))
+    if not job:
+        return jsonify({"error": "Not found"}), 404
+    if job["status"] in ["queued", "running"]:
+        # Picks up jobs left behind by a restarted process
+        start_background_worker()
+    return jsonify(job)
 
 
 # --- Topics CRUD (Admin) ---
@@ -152,11 +177,7 @@ def upload_questions_csv():
 def list_topics_admin():
     if not is_admin():
         return jsonify({"error": "Forbidden"}), 403
-    items = []
-    for doc in mongo.db.topics.find({}).sort("name", 1):
-        doc["_id"] = str(doc["_id"])
-        items.append(doc)
-    return jsonify(items)
+    return jsonify(list(mongo.db.topics.find({}).sort("name", 1)))
 
 
 @admin_bp.post("/topics")
@@ -180,7 +201,7 @@ def create_topic():
         "updatedAt": datetime.utcnow(),
     }
     res = mongo.db.topics.insert_one(doc)
-    return jsonify({"_id": str(res.inserted_id)}), 201
+    return jsonify({"_id": res.inserted_id}), 201
 
 
 @admin_bp.put("/topics/<topic_id>")
@@ -243,12 +264,12 @@ def update_user_role(user_id: str):
         return jsonify({"error": f"Invalid role: '{new_role}'"}), 400
 
     try:
-        res = mongo.db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"role": new_role}})
+        user = update_user(user_id, {"$set": {"role": new_role}})
     except Exception as e:
         print(f"[DEBUG] Database error: {e}")
         return jsonify({"error": "Bad user id"}), 400
 
-    if res.matched_count == 0:
+    if user is None:
         return jsonify({"error": "User not found"}), 404
     return jsonify({"ok": True})
 
@@ -265,16 +286,23 @@ def update_user_department(user_id: str):
     if not dept:
         return jsonify({"error": "Department required"}), 400
     try:
-        res = mongo.db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"department": dept, "updatedAt": datetime.utcnow()}})
+        user = update_user(user_id, {"$set": {"department": dept, "updatedAt": datetime.utcnow()}})
     except Exception:
         return jsonify({"error": "Bad user id"}), 400
-    if res.matched_count == 0:
+    if user is None:
         return jsonify({"error": "User not found"}), 404
+    sync_student_cohort(user_id, {"department": dept})
     return jsonify({"ok": True})
 
 
 # --- AI Generation ---
-from services.ai_generator import QuestionGenerator
+from services.generation_orchestrator import GenerationUnavailable, get_orchestrator, insert_generated
+
+# Limits for one batch generation request
+MAX_GENERATION_JOBS = 20
+MAX_JOB_COUNT = 50
+MAX_BATCH_TOTAL = 200
+
 
 @admin_bp.post("/generate-questions")
 @jwt_required()
@@ -297,18 +325,114 @@ def generate_questions():
     count = max(1, min(count, 10))
 
     try:
-        questions = QuestionGenerator.generate_batch(topic, difficulty, count)
-        
-        inserted_ids = []
-        for q in questions:
-            res = mongo.db.questions.insert_one(q)
-            inserted_ids.append(str(res.inserted_id))
-            
+        questions = get_orchestrator().generate(topic, difficulty, count)
+        inserted_ids, _ = insert_generated(mongo.db.questions, questions)
         return jsonify({
             "ok": True, 
-            "generated": len(questions),
+            "generated": len(inserted_ids),
             "ids": inserted_ids
         })
+    except GenerationUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         print(f"Generation error: {e}")
         return jsonify({"error": str(e)}), 500
+
+
+@admin_bp.post("/generate-questions/stream")
+@jwt_required()
+def generate_questions_stream():
+    """
+    Generate and insert questions one at a time as the model produces them.
+    Body: {"topic": "...", "difficulty": 3, "count": 10}
+    Responds with NDJSON: {"id", "text"} per inserted question, then
+    {"done": true, "generated", "nearDuplicates", "error"}.
+    """
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+
+    data = request.get_json(force=True)
+    topic = (data.get("topic") or "").strip()
+    try:
+        difficulty = int(data.get("difficulty", 3))
+        count = int(data.get("count", 5))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid numbers"}), 400
+    if not topic:
+        return jsonify({"error": "Topic required"}), 400
+    count = max(1, min(count, MAX_JOB_COUNT))
+
+    try:
+        orchestrator = get_orchestrator()
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+
+    def body():
+        generated = near_duplicates = 0
+        error = None
+        try:
+            for q in orchestrator.stream(topic, difficulty, count):
+                ids, rejected = insert_generated(mongo.db.questions, [q])
+                near_duplicates += rejected
+                for question_id in ids:
+                    generated += 1
+                    yield current_app.json.dumps({"id": question_id, "text": q["text"]}) + "\n"
+        except GenerationUnavailable as e:
+            error = str(e)
+        yield current_app.json.dumps({
+            "done": True, "generated": generated, "nearDuplicates": near_duplicates, "error": error
+        }) + "\n"
+
+    return Response(stream_with_context(body()), mimetype="application/x-ndjson")
+
+
+@admin_bp.post("/generate-questions/batch")
+@jwt_required()
+def generate_questions_batch():
+    """
+    Generate many (topic, difficulty, count) jobs concurrently.
+    Body: {"jobs": [{"topic": "...", "difficulty": 3, "count": 20}, ...]}
+    """
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+
+    data = request.get_json(force=True)
+    raw_jobs = data.get("jobs") or []
+    if not isinstance(raw_jobs, list) or not raw_jobs:
+        return jsonify({"error": "jobs required"}), 400
+    if len(raw_jobs) > MAX_GENERATION_JOBS:
+        return jsonify({"error": f"At most {MAX_GENERATION_JOBS} jobs per request"}), 400
+
+    jobs = []
+    for j in raw_jobs:
+        try:
+            topic = (j.get("topic") or "").strip()
+            difficulty = int(j.get("difficulty", 3))
+            count = int(j.get("count", 5))
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({"error": "Invalid job"}), 400
+        if not topic or not 1 <= difficulty <= 5:
+            return jsonify({"error": "Each job needs a topic and a difficulty of 1-5"}), 400
+        jobs.append({"topic": topic, "difficulty": difficulty, "count": max(1, min(count, MAX_JOB_COUNT))})
+    if sum(j["count"] for j in jobs) > MAX_BATCH_TOTAL:
+        return jsonify({"error": f"At most {MAX_BATCH_TOTAL} questions per request"}), 400
+
+    try:
+        orchestrator = get_orchestrator()
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+
+    results = orchestrator.run(jobs)
+    questions = [q for r in results for q in r["questions"]]
+    inserted_ids, near_duplicates = insert_generated(mongo.db.questions, questions)
+    return jsonify({
+        "ok": True,
+        "generated": len(inserted_ids),
+        "nearDuplicates": near_duplicates,
+        "ids": inserted_ids,
+        "jobs": [
+            {"topic": r["topic"], "difficulty": r["difficulty"], "requested": r["requested"],
+             "generated": len(r["questions"]), "error": r["error"]}
+            for r in results
+        ],
+    })
@@ -1,41 +1,37 @@
 from datetime import datetime, timedelta
 import random
 import hashlib
+import logging
 import os
-import sib_api_v3_sdk
-from sib_api_v3_sdk.rest import ApiException
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from pymongo import ReturnDocument
 from extensions import mongo
-from bson import ObjectId
+from services.attempt_facts import sync_student_cohort
+from services.email_queue import get_email_queue
+from services.user_cache import get_user, update_user
+from services.rate_limit import Limit, rate_limit
 
 auth_bp = Blueprint("auth", __name__)
+logger = logging.getLogger(__name__)
 
-# --- START: Brevo API Email Logic ---
-def send_otp_email(to, otp):
-    api_key = os.environ.get("BREVO_API_KEY")
-    if not api_key:
-        print(f"[Skillatics-Warning] BREVO_API_KEY not configured. OTP: {otp} (for development only)")
-        return
-
-    # Configure Brevo API
-    configuration = sib_api_v3_sdk.Configuration()
-    configuration.api_key['api-key'] = api_key
-    api_instance = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
-
-    subject = "Your OTP for Skillatics"
-    html_content = f"""
+# --- START: OTP Email ---
+# Brevo template: {{ params.* }} are filled in per recipient, so queued OTP
+# emails with this body can go out together in one API call
+OTP_EMAIL_SUBJECT = "Your OTP for Skillatics"
+OTP_EMAIL_HTML = """
     <html>
     <head>
         <style>
-            body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; line-height: 1.6; color: #333; }}
-            .container {{ width: 100%; max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e2e8f0; border-radius: 12px; background-color: #ffffff; }}
-            .header {{ text-align: center; padding-bottom: 20px; border-bottom: 1px solid #edf2f7; margin-bottom: 20px; }}
-            .brand {{ font-size: 24px; font-weight: 700; color: #7c3aed; }}
-            .otp-box {{ background: linear-gradient(to right, #f5f3ff, #ede9fe); border-radius: 8px; padding: 20px; text-align: center; margin: 24px 0; }}
-            .otp-code {{ font-size: 32px; font-weight: 800; color: #5b21b6; letter-spacing: 6px; font-family: monospace; }}
-            .expiry {{ font-size: 14px; color: #ef4444; font-weight: 500; margin-top: 8px; }}
-            .footer {{ text-align: center; margin-top: 24px; font-size: 12px; color: #94a3b8; }}
+            body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; line-height: 1.6; color: #333; }
+            .container { width: 100%; max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e2e8f0; border-radius: 12px; background-color: #ffffff; }
+            .header { text-align: center; padding-bottom: 20px; border-bottom: 1px solid #edf2f7; margin-bottom: 20px; }
+            .brand { font-size: 24px; font-weight: 700; color: #7c3aed; }
+            .otp-box { background: linear-gradient(to right, #f5f3ff, #ede9fe); border-radius: 8px; padding: 20px; text-align: center; margin: 24px 0; }
+            .otp-code { font-size: 32px; font-weight: 800; color: #5b21b6; letter-spacing: 6px; font-family: monospace; }
+            .expiry { font-size: 14px; color: #ef4444; font-weight: 500; margin-top: 8px; }
+            .footer { text-align: center; margin-top: 24px; font-size: 12px; color: #94a3b8; }
         </style>
     </head>
     <body>
@@ -44,33 +40,39 @@ def send_otp_email(to, otp):
             <p style="font-size: 16px;">Hello,</p>
             <p>You requested a One-Time Password (OTP) to sign in to your account.</p>
             <div class="otp-box">
-                <div class="otp-code">{otp}</div>
+                <div class="otp-code">{{ params.otp }}</div>
                 <div class="expiry">Valid for 5 minutes</div>
             </div>
             <p>If you didn't request this, you can safely ignore this email.</p>
-            <div class="footer">&copy; {datetime.now().year} Skillatics Learning Platform</div>
+            <div class="footer">&copy; {{ params.year }} Skillatics Learning Platform</div>
         </div>
     </body>
     </html>
-    """
+"""
 
-    # Create Transactional Email object
-    send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
-        to=[{"email": to}],
-        html_content=html_content,
-        subject=subject,
-        sender={"name": "Skillatics", "email": "synaptrix4@gmail.com"}
-    )
 
-    try:
-        api_instance.send_transac_email(send_smtp_email)
-        print(f"[Skillatics-Success] OTP email sent to {to} via Brevo API")
-    except ApiException as e:
-        print(f"[Skillatics-Error] Failed to send email via Brevo API: {e}")
-        raise e
-# --- END: Brevo API Email Logic ---
+def send_otp_email(to, otp):
+    """Queue the OTP email; delivery happens on the email queue's sender thread"""
+    get_email_queue().enqueue(to, OTP_EMAIL_SUBJECT, OTP_EMAIL_HTML, {"otp": otp, "year": datetime.now().year})
+# --- END: OTP Email ---
 
 # --- Helpers for OTP ---
+# Wrong guesses allowed before the OTP must be requested again
+MAX_OTP_ATTEMPTS = 5
+
+# A whole campus may log in from one NAT address when an exam starts, so the
+# per-IP limits are loose; per-email and global limits protect the email quota
+REQUEST_OTP_LIMITS = [
+    Limit("email", 3, 60),
+    Limit("email", 10, 3600),
+    Limit("ip", 300, 60),
+    Limit("global", 2000, 60),
+]
+VERIFY_OTP_LIMITS = [
+    Limit("email", 10, 60),
+    Limit("ip", 600, 60),
+]
+
 def random_otp():
     return str(random.randint(100000, 999999))
 
@@ -98,6 +100,7 @@ def serialize_user(user):
 
 # --- REQUEST OTP ---
 @auth_bp.post("/request-otp")
+@rate_limit(*REQUEST_OTP_LIMITS, name="request-otp")
 def request_otp():
     data = request.get_json(force=True)
     email = (data.get("email") or "").strip().lower()
@@ -119,20 +122,23 @@ def request_otp():
     otp_hash = hash_otp(otp)
     expires = datetime.utcnow() + timedelta(minutes=5)
 
-    mongo.db.otps.delete_many({"email": email})  # Invalidate previous OTPs
-    mongo.db.otps.insert_one({
-        "email": email,
-        "otp_hash": otp_hash,
-        "expires": expires,
-        "attempts": 0,
-        "purpose": purpose,
-        "createdAt": datetime.utcnow()
-    })
+    # One OTP per email: a new request replaces (invalidates) the previous one
+    mongo.db.otps.update_one(
+        {"email": email},
+        {"$set": {
+            "otp_hash": otp_hash,
+            "expires": expires,
+            "attempts": 0,
+            "purpose": purpose,
+            "createdAt": datetime.utcnow()
+        }},
+        upsert=True
+    )
     
     # --- START OF UPDATED CODE ---
     is_dev = os.getenv("FLASK_ENV") == "development"
 
-    # Send OTP via SendGrid SMTP relay
+    # Queue the OTP email; the request does not wait for delivery
     email_sent = False
     try:
         send_otp_email(email, otp)
@@ -146,31 +152,41 @@ def request_otp():
 
     if is_dev:
         response["dev_otp"] = otp
-        response["message"] = f"OTP {'emailed and' if email_sent else '(email skipped, dev mode)'}: {otp}"
+        response["message"] = f"OTP {'queued and' if email_sent else '(email skipped, dev mode)'}: {otp}"
 
     return jsonify(response)
     # --- END OF UPDATED CODE ---
 
 # --- VERIFY OTP ---
 @auth_bp.post("/verify-otp")
+@rate_limit(*VERIFY_OTP_LIMITS, name="verify-otp")
 def verify_otp():
     data = request.get_json(force=True)
     email = (data.get("email") or "").strip().lower()
     otp = (data.get("otp") or "").strip()
     if not email or not otp:
         return jsonify({"error": "Email and OTP required"}), 400
-    rec = mongo.db.otps.find_one({"email": email})
+    now = datetime.utcnow()
+    # Consume a matching, live OTP in one step
+    rec = mongo.db.otps.find_one_and_delete({
+        "email": email,
+        "otp_hash": hash_otp(otp),
+        "expires": {"$gt": now},
+        "attempts": {"$lt": MAX_OTP_ATTEMPTS}
+    })
     if not rec:
-        return jsonify({"error": "No OTP requested"}), 400
-    if rec["expires"] < datetime.utcnow():
-        mongo.db.otps.delete_one({"_id": rec["_id"]})
-        return jsonify({"error": "OTP expired"}), 400
-    if rec["attempts"] >= 5:
-        mongo.db.otps.delete_one({"_id": rec["_id"]})
-        return jsonify({"error": "Too many attempts"}), 400
-    hash_input = hash_otp(otp)
-    if hash_input != rec["otp_hash"]:
-        mongo.db.otps.update_one({"_id": rec["_id"]}, {"$inc": {"attempts": 1}})
+        # Count the failed attempt and find out why it failed
+        rec = mongo.db.otps.find_one_and_update(
+            {"email": email},
+            {"$inc": {"attempts": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not rec:
+            return jsonify({"error": "No OTP requested"}), 400
+        if rec["expires"] <= now:
+            return jsonify({"error": "OTP expired"}), 400
+        if rec["attempts"] > MAX_OTP_ATTEMPTS:
+            return jsonify({"error": "Too many attempts"}), 400
         return jsonify({"error": "Invalid OTP"}), 401
     # Success: login or register user
     user = mongo.db.users.find_one({"email": email})
@@ -186,11 +202,10 @@ def verify_otp():
             "createdAt": datetime.utcnow(),
             # profile fields may be completed later
         }
-        result = mongo.db.users.insert_one(user_doc)
-        user = mongo.db.users.find_one({"_id": result.inserted_id})
+        mongo.db.users.insert_one(user_doc)
+        user = user_doc
     elif user:
         role = user.get("role", "Student")
-    mongo.db.otps.delete_one({"_id": rec["_id"]})
     access_token = create_access_token(identity=str(user["_id"]), additional_claims={"role": role})
     resp = {
         "token": access_token,
@@ -206,10 +221,20 @@ def update_profile():
     data = request.get_json(force=True)
     allowed = ["name", "mobile", "gender", "department", "division", "rollNo", "yearOfStudy"]
     updates = {k: data[k].strip() if isinstance(data[k], str) else data[k] for k in allowed if k in data}
+    # Timezone (IANA name) drives streak day boundaries. The profile forms
+    # send the browser's zone on every save, so an unknown one is ignored
+    # rather than failing the rest of the update.
+    if "timezone" in data:
+        tz_name = (data.get("timezone") or "").strip()
+        try:
+            ZoneInfo(tz_name)
+            updates["timezone"] = tz_name
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning("Ignoring invalid timezone %r", tz_name, extra={"userId": uid})
     if not updates:
         return jsonify({"error": "No profile fields provided"}), 400
-    result = mongo.db.users.update_one({"_id": ObjectId(uid)}, {"$set": updates})
-    user = mongo.db.users.find_one({"_id": ObjectId(uid)})
+    user = update_user(uid, {"$set": updates})
+    sync_student_cohort(uid, updates)
     return jsonify({
         "ok": True,
         "user": serialize_user(user)
@@ -225,7 +250,7 @@ def refresh_token():
     This is useful when an admin changes a user's role.
     """
     uid = get_jwt_identity()
-    user = mongo.db.users.find_one({"_id": ObjectId(uid)})
+    user = get_user(uid, fresh=True)
     if not user:
         return jsonify({"error": "User not found"}), 404
     
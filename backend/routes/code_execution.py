@@ -2,6 +2,7 @@
 # Handles code execution for coding questions
 # Updated to use Piston API for free code execution
 
+import logging
 import os
 import requests
 import time
@@ -12,12 +13,19 @@ from datetime import datetime
 from .code_wrapper import wrap_user_code_with_test_harness
 
 from extensions import mongo
+from metrics import observe_code_execution
+from services.rate_limit import Limit, rate_limit
 
 code_bp = Blueprint("code", __name__)
+logger = logging.getLogger(__name__)
 
 # Piston API Configuration (FREE - No signup needed!)
 PISTON_API = os.getenv("CODE_EXECUTION_API", "https://emkc.org/api/v2/piston")
 
+# Per-student limit on endpoints that run code; each request forks a
+# compiler/interpreter (or calls Piston) for every test case
+CODE_RUN_LIMITS = [Limit("user", 30, 60)]
+
 # Language mapping for Piston
 LANGUAGE_MAP = {
     "python": "python",
@@ -33,7 +41,14 @@ import subprocess
 import tempfile
 import os
 import platform
+import shutil
+import threading
+
+# Bound concurrent sandbox processes per worker; with threaded workers every
+# request thread could otherwise fork a compiler/interpreter at once.
+_exec_slots = threading.BoundedSemaphore(int(os.getenv("CODE_EXEC_CONCURRENCY", "4")))
 
+@observe_code_execution
 def execute_code_piston(source_code: str, language: str, stdin: str = ""):
     """
     Execute code locally using subprocess.
@@ -48,32 +63,37 @@ def execute_code_piston(source_code: str, language: str, stdin: str = ""):
     
     # Configuration for local execution
     is_windows = platform.system() == "Windows"
+    # Each execution gets its own directory, so concurrent requests never
+    # share (or delete) each other's compiled binary
+    work_dir = tempfile.mkdtemp(prefix="skillatics-exec-")
+    exe_path = os.path.join(work_dir, "a.exe" if is_windows else "a.out")
     executor_map = {
         "python": {"ext": ".py", "cmd": ["python" if is_windows else "python3"]},
         "javascript": {"ext": ".js", "cmd": ["node"]},
         "java": {"ext": ".java", "cmd": ["java"]},
-        "c++": {"ext": ".cpp", "cmd": ["g++", "-O2", "-o", "a.exe" if is_windows else "./a.out"]},
-        "c": {"ext": ".c", "cmd": ["gcc", "-O2", "-o", "a.exe" if is_windows else "./a.out"]},
+        "c++": {"ext": ".cpp", "cmd": ["g++", "-O2", "-o", exe_path]},
+        "c": {"ext": ".c", "cmd": ["gcc", "-O2", "-o", exe_path]},
         "typescript": {"ext": ".ts", "cmd": ["npx", "ts-node"]},
     }
     
     config = executor_map.get(piston_lang)
     if not config:
+        shutil.rmtree(work_dir, ignore_errors=True)
         return {
             "error": f"Local executor not set up for {piston_lang}. Please use Python or JavaScript.",
             "success": False
         }
         
-    print(f"[LOCAL EXEC] Executing {piston_lang} code locally...")
+    logger.debug("Executing %s code locally", piston_lang)
     
     try:
         # 1. Write source code
-        with tempfile.NamedTemporaryFile(suffix=config["ext"], delete=False, mode="w", encoding="utf-8") as src_file:
+        with tempfile.NamedTemporaryFile(suffix=config["ext"], dir=work_dir, delete=False, mode="w", encoding="utf-8") as src_file:
             src_file.write(source_code)
             src_path = src_file.name
             
         # 2. Write stdin
-        with tempfile.NamedTemporaryFile(delete=False, mode="w", encoding="utf-8") as in_file:
+        with tempfile.NamedTemporaryFile(dir=work_dir, delete=False, mode="w", encoding="utf-8") as in_file:
             in_file.write(stdin)
             in_path = in_file.name
             
@@ -83,11 +103,12 @@ def execute_code_piston(source_code: str, language: str, stdin: str = ""):
         # 3. Compile step (if required)
         if piston_lang in ["c++", "c"]:
             compile_cmd = config["cmd"] + [src_path]
-            compile_proc = subprocess.run(compile_cmd, capture_output=True, text=True, timeout=10)
+            with _exec_slots:
+                compile_proc = subprocess.run(compile_cmd, capture_output=True, text=True, timeout=10)
             compile_output = compile_proc.stderr.strip() # GCC writes errors to stderr
             
             if compile_proc.returncode != 0:
-                print(f"[LOCAL EXEC] Compilation failed")
+                logger.debug("Compilation failed", extra={"language": piston_lang})
                 return {
                     "success": False,
                     "status": "Compilation Error",
@@ -100,18 +121,18 @@ def execute_code_piston(source_code: str, language: str, stdin: str = ""):
                 }
             
             # Update command for execution
-            run_cmd = ["a.exe" if is_windows else "./a.out"]
+            run_cmd = [exe_path]
         else:
             run_cmd = config["cmd"] + [src_path]
             
         # 4. Run step
-        with open(in_path, "r", encoding="utf-8") as stdin_file:
+        with open(in_path, "r", encoding="utf-8") as stdin_file, _exec_slots:
             run_proc = subprocess.run(run_cmd, stdin=stdin_file, capture_output=True, text=True, timeout=5)
             
         stdout = run_proc.stdout.strip()
         stderr = run_proc.stderr.strip()
         
-        print(f"[LOCAL EXEC] Result: {len(stdout)} bytes stdout, {len(stderr)} bytes stderr")
+        logger.debug("Execution finished", extra={"stdoutBytes": len(stdout), "stderrBytes": len(stderr)})
         
         has_error = run_proc.returncode != 0 or (stderr and not stdout)
         success = not has_error
@@ -119,13 +140,6 @@ def execute_code_piston(source_code: str, language: str, stdin: str = ""):
         status = "Accepted" if success else "Runtime Error"
         output = stdout if stdout else stderr
         
-        # Cleanup temp files
-        os.remove(src_path)
-        os.remove(in_path)
-        if piston_lang in ["c++", "c"]:
-            exe_path = "a.exe" if is_windows else "a.out"
-            if os.path.exists(exe_path): os.remove(exe_path)
-            
         return {
             "success": success,
             "status": status,
@@ -138,22 +152,26 @@ def execute_code_piston(source_code: str, language: str, stdin: str = ""):
         }
         
     except subprocess.TimeoutExpired:
-        print("[LOCAL EXEC] Timeout")
+        logger.info("Code execution timed out", extra={"language": piston_lang})
         return {
             "error": "Code execution timed out",
             "success": False,
             "status": "Timeout"
         }
     except Exception as e:
-        print(f"[LOCAL EXEC] ERROR: {e}")
+        logger.exception("Code execution error")
         return {
             "error": f"Execution error: {str(e)}",
             "success": False
         }
+    finally:
+        # Cleanup temp files
+        shutil.rmtree(work_dir, ignore_errors=True)
 
 
 @code_bp.post("/execute")
 @jwt_required()
+@rate_limit(*CODE_RUN_LIMITS, name="code-execute")
 def execute_code():
     """
     Execute student's code submission.
@@ -167,11 +185,8 @@ def execute_code():
         ]
     }
     """
-    print("[CODE_EXEC] Starting code execution...")
-    
     claims = get_jwt()
     if claims.get("role") != "Student":
-        print("[CODE_EXEC] Forbidden - not a student")
         return jsonify({"error": "Forbidden"}), 403
     
     data = request.get_json(force=True)
@@ -180,17 +195,15 @@ def execute_code():
     stdin = data.get("stdin", "")
     test_cases = data.get("test_cases", [])
     
-    print(f"[CODE_EXEC] Language: {language}, Test cases: {len(test_cases)}")
+    logger.debug("Execute request", extra={"language": language, "testCases": len(test_cases)})
     
     if not source_code:
-        print("[CODE_EXEC] No source code provided")
         return jsonify({"error": "Source code is required"}), 400
     
     # If no test cases OR empty array, just run the code once and return output
     if not test_cases or len(test_cases) == 0:
-        print("[CODE_EXEC] No test cases, running code directly")
         result = execute_code_piston(source_code, language, stdin)
-        print(f"[CODE_EXEC] Result: {result.get('status', 'unknown')}")
+        logger.debug("Direct run finished", extra={"status": result.get("status", "unknown")})
         
         # Return direct output (not test_results format)
         return jsonify({
@@ -203,7 +216,6 @@ def execute_code():
         })
     
     # Run against all test cases
-    print(f"[CODE_EXEC] Running {len(test_cases)} test cases...")
     results = []
     all_passed = True
     
@@ -211,8 +223,6 @@ def execute_code():
         test_input = test_case.get("input", "")
         expected_output = test_case.get("expected_output", "").strip()
         
-        print(f"[CODE_EXEC] Test case {idx + 1}/{len(test_cases)}")
-        
         # For function-style questions, wrap the code with test harness
         # This allows users to write just the function, not I/O logic
         # Function metadata should be passed from frontend or default to None
@@ -263,6 +273,7 @@ def execute_code():
 
 @code_bp.post("/run")
 @jwt_required()
+@rate_limit(*CODE_RUN_LIMITS, name="code-run")
 def run_against_question():
     """
     Run code against ALL test cases (including hidden) fetched from the DB.
@@ -363,6 +374,7 @@ def run_against_question():
 
 @code_bp.post("/submit-coding-test")
 @jwt_required()
+@rate_limit(*CODE_RUN_LIMITS, name="code-submit-coding-test")
 def submit_coding_test():
     """
     Submit a coding test question with code execution.
@@ -496,7 +508,6 @@ def get_random_coding_question():
         return jsonify({"error": "No coding questions found"}), 404
     
     question = questions[0]
-    question["_id"] = str(question["_id"])
 
     # Auto-inject starter_code if not stored
     if not question.get("starter_code"):
@@ -554,8 +565,6 @@ def get_coding_question(question_id):
         if not q or q.get("type") != "coding":
             return jsonify({"error": "Question not found"}), 404
 
-        q["_id"] = str(q["_id"])
-
         # Auto-inject starter_code if not stored in DB
         if not q.get("starter_code"):
             q["starter_code"] = generate_starter_code(
@@ -573,15 +582,6 @@ def my_submissions():
     """Get student's coding submissions."""
     user_id = get_jwt_identity()
     
-    cursor = mongo.db.code_submissions.find({"studentId": ObjectId(user_id)})
-    submissions = []
-    
-    for sub in cursor:
-        sub["_id"] = str(sub["_id"])
-        sub["studentId"] = str(sub["studentId"])
-        sub["questionId"] = str(sub["questionId"])
-        # Remove source code from list view (only show in detail)
-        sub.pop("source_code", None)
-        submissions.append(sub)
-    
-    return jsonify(submissions)
+    # Source code is left out of the list view (only shown in detail)
+    cursor = mongo.db.code_submissions.find({"studentId": ObjectId(user_id)}, {"source_code": 0})
+    return jsonify(list(cursor))
@@ -1,34 +1,95 @@
-from flask import Blueprint, jsonify, request
+import os
+from datetime import datetime
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from bson import ObjectId
 
 from extensions import mongo
+from services.topic_mastery import get_topic_stats
+from services.cache import TTLCache
+from services.user_cache import get_user
+from services.cohort_rollup import query_cohort_rollup
+from services.cohort_export import iter_cohort_rows, stream_csv, stream_parquet
 
 
 data_bp = Blueprint("data", __name__)
 
+# student-stats responses per (filters, page, sort) tuple
+_student_stats_cache = TTLCache(ttl=int(os.getenv("STUDENT_STATS_CACHE_SECONDS", "30")), maxsize=256)
+STUDENT_STATS_SORT_FIELDS = ["avgScore", "tests", "lastCompleted"]
+
+
+# Fields returned by /my-results unless details are requested
+RESULT_SUMMARY_FIELDS = {
+    "score": 1, "totalQuestions": 1, "correctQuestions": 1, "completedAt": 1,
+    "type": 1, "xpEarned": 1, "timeTakenSeconds": 1, "adaptivePath": 1,
+}
+
+
+def _encode_results_cursor(doc):
+    return f"{doc['completedAt'].isoformat()}_{doc['_id']}"
+
+
+def _decode_results_cursor(token):
+    completed_at, _, oid = token.rpartition("_")
+    return datetime.fromisoformat(completed_at), ObjectId(oid)
+
 
 @data_bp.get("/my-results")
 @jwt_required()
 def my_results():
+    """
+    Current student's test results, newest first, paginated by completedAt.
+
+    Query params: limit (default 20, max 100), cursor (nextCursor of the previous
+    page), details=1 to include history and questionsReview.
+    """
     user_id = get_jwt_identity()
-    cursor = mongo.db.test_results.find({"studentId": ObjectId(user_id)})
-    results = []
-    for r in cursor:
-        r["_id"] = str(r["_id"])
-        if "studentId" in r:
-            r["studentId"] = str(r["studentId"])
-        
-        # Ensure nested ObjectIds are converted if any
-        if "questionId" in r:
-             r["questionId"] = str(r["questionId"])
-        if "history" in r:
-            for h in r["history"]:
-                if "questionId" in h:
-                    h["questionId"] = str(h["questionId"])
-                    
-        results.append(r)
-    return jsonify(results)
+    student_id = ObjectId(user_id)
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), 100))
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    details = request.args.get("details") in ["1", "true"]
+
+    query = {"studentId": student_id}
+    cursor_token = request.args.get("cursor")
+    if cursor_token:
+        try:
+            completed_at, last_id = _decode_results_cursor(cursor_token)
+        except Exception:
+            return jsonify({"error": "Invalid cursor"}), 400
+        query["$or"] = [
+            {"completedAt": {"$lt": completed_at}},
+            {"completedAt": completed_at, "_id": {"$lt": last_id}},
+        ]
+
+    projection = None if details else RESULT_SUMMARY_FIELDS
+    docs = list(mongo.db.test_results.find(query, projection)
+                .sort([("completedAt", -1), ("_id", -1)])
+                .limit(limit + 1))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    out = {
+        "items": docs,
+        "nextCursor": _encode_results_cursor(docs[-1]) if has_more else None,
+    }
+    # Totals for the dashboard cards come with the first page only
+    if not cursor_token:
+        summary = list(mongo.db.test_results.aggregate([
+            {"$match": {"studentId": student_id}},
+            {"$group": {
+                "_id": None,
+                "tests": {"$sum": 1},
+                "avgScore": {"$avg": "$score"},
+                "bestScore": {"$max": "$score"},
+            }}
+        ]))
+        out["summary"] = summary[0] if summary else {"tests": 0, "avgScore": 0, "bestScore": 0}
+        out["summary"].pop("_id", None)
+
+    return jsonify(out)
 
 
 @data_bp.get("/batch-analytics")
@@ -39,57 +100,19 @@ def batch_analytics():
     if role not in ["TPO", "Faculty", "Admin"]:
         return jsonify({"error": "Forbidden"}), 403
 
-    scope = (request.args.get("scope") or "college").lower()  # college | department | division
     department = (request.args.get("department") or "").strip()
     division = (request.args.get("division") or "").strip()
     year_of_study = (request.args.get("yearOfStudy") or "").strip()
 
-    pipeline = []
-    # If filtering by department/division or role is Faculty, we need user info
-    need_user_join = (scope in ["department", "division"]) or (role == "Faculty") or bool(department or division or year_of_study)
-    if need_user_join:
-        pipeline.append({
-            "$lookup": {
-                "from": "users",
-                "localField": "studentId",
-                "foreignField": "_id",
-                "as": "student"
-            }
-        })
-        pipeline.append({"$unwind": "$student"})
-        # If Faculty, restrict to their department
-        if role == "Faculty":
-            fac = mongo.db.users.find_one({"_id": ObjectId(get_jwt_identity())})
-            fac_dept = (fac or {}).get("department")
-            if fac_dept:
-                pipeline.append({"$match": {"student.department": fac_dept}})
-        # TPO or Admin can optionally filter by dept/division
-        match = {}
-        if department:
-            match["student.department"] = department
-        if division:
-            match["student.division"] = division
-        if year_of_study:
-            match["student.yearOfStudy"] = year_of_study
-        if match:
-            pipeline.append({"$match": match})
-
-    pipeline.append({
-        "$group": {
-            "_id": None,
-            "avgScore": {"$avg": "$score"},
-            "tests": {"$sum": 1},
-            "avgCorrect": {"$avg": "$correctQuestions"},
-            "avgTotal": {"$avg": "$totalQuestions"},
-        }
-    })
-    agg = list(mongo.db.test_results.aggregate(pipeline))
-    if agg:
-        out = agg[0]
-        out.pop("_id", None)
-        return jsonify(out)
-    else:
-        return jsonify({"avgScore": 0, "tests": 0, "avgCorrect": 0, "avgTotal": 0})
+    # If Faculty, restrict to their department
+    if role == "Faculty":
+        fac = get_user(get_jwt_identity())
+        fac_dept = (fac or {}).get("department")
+        if fac_dept:
+            department = fac_dept
+
+    # Answered from the pre-aggregated cohort cube
+    return jsonify(query_cohort_rollup(department, division, year_of_study))
 
 
 # Average score by topic for current student
@@ -97,16 +120,12 @@ def batch_analytics():
 @jwt_required()
 def my_topic_averages():
     user_id = get_jwt_identity()
-    pipeline = [
-        {"$match": {"studentId": ObjectId(user_id)}},
-        {"$unwind": {"path": "$history", "preserveNullAndEmptyArrays": False}},
-        {"$lookup": {"from": "questions", "localField": "history.questionId", "foreignField": "_id", "as": "q"}},
-        {"$unwind": "$q"},
-        {"$group": {"_id": "$q.topic", "avgScore": {"$avg": "$score"}, "tests": {"$sum": 1}}},
-        {"$sort": {"_id": 1}}
-    ]
-    data = list(mongo.db.test_results.aggregate(pipeline))
-    out = [{"topic": d.get("_id"), "avgScore": d.get("avgScore", 0), "tests": d.get("tests", 0)} for d in data]
+    data = get_topic_stats(ObjectId(user_id))
+    out = [{
+        "topic": d.get("topic"),
+        "avgScore": d.get("scoreSum", 0) / d["attempts"] if d.get("attempts") else 0,
+        "tests": d.get("attempts", 0)
+    } for d in data]
     return jsonify(out)
 
 
@@ -123,49 +142,86 @@ def student_stats():
     division = (request.args.get("division") or "").strip()
     year_of_study = (request.args.get("yearOfStudy") or "").strip()
 
-    pipeline = []
-    pipeline.append({
-        "$lookup": {
-            "from": "users",
-            "localField": "studentId",
-            "foreignField": "_id",
-            "as": "student"
-        }
-    })
-    pipeline.append({"$unwind": "$student"})
     match = {}
     if role == "Faculty":
-        fac = mongo.db.users.find_one({"_id": ObjectId(get_jwt_identity())})
+        fac = get_user(get_jwt_identity())
         fac_dept = (fac or {}).get("department")
         if fac_dept:
-            match["student.department"] = fac_dept
+            match["department"] = fac_dept
     else:
         if department:
-            match["student.department"] = department
+            match["department"] = department
         if division:
-            match["student.division"] = division
+            match["division"] = division
     if year_of_study:
-        match["student.yearOfStudy"] = year_of_study
-    if match:
-        pipeline.append({"$match": match})
+        match["yearOfStudy"] = year_of_study
 
-    pipeline.extend([
+    # Paging and sorting (server-side)
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+        limit = max(1, min(int(request.args.get("limit", 50)), 500))
+    except ValueError:
+        return jsonify({"error": "Invalid page or limit"}), 400
+    sort_field = request.args.get("sort", "avgScore")
+    if sort_field not in STUDENT_STATS_SORT_FIELDS:
+        sort_field = "avgScore"
+    order = -1 if (request.args.get("order") or "desc").lower() == "desc" else 1
+
+    cache_key = (tuple(sorted(match.items())), page, limit, sort_field, order)
+    cached = _student_stats_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
+    pipeline = [
+        {"$match": match},
+        # One row per test result, then per student
+        {"$group": {
+            "_id": "$resultId",
+            "studentId": {"$first": "$studentId"},
+            "score": {"$first": "$score"},
+            "completedAt": {"$first": "$completedAt"},
+        }},
         {"$group": {
             "_id": "$studentId",
             "tests": {"$sum": 1},
             "avgScore": {"$avg": "$score"},
             "lastCompleted": {"$max": "$completedAt"},
         }},
-        {"$sort": {"avgScore": -1}},
-    ])
-    rows = list(mongo.db.test_results.aggregate(pipeline))
-    # Attach user names/emails
-    out = []
-    for r in rows:
+        {"$facet": {
+            "summary": [{"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "atRisk": {"$sum": {"$cond": [{"$lt": ["$avgScore", 40]}, 1, 0]}},
+                "b0": {"$sum": {"$cond": [{"$lte": ["$avgScore", 20]}, 1, 0]}},
+                "b1": {"$sum": {"$cond": [{"$and": [{"$gt": ["$avgScore", 20]}, {"$lte": ["$avgScore", 40]}]}, 1, 0]}},
+                "b2": {"$sum": {"$cond": [{"$and": [{"$gt": ["$avgScore", 40]}, {"$lte": ["$avgScore", 60]}]}, 1, 0]}},
+                "b3": {"$sum": {"$cond": [{"$and": [{"$gt": ["$avgScore", 60]}, {"$lte": ["$avgScore", 80]}]}, 1, 0]}},
+                "b4": {"$sum": {"$cond": [{"$gt": ["$avgScore", 80]}, 1, 0]}},
+            }}],
+            "rows": [
+                {"$sort": {sort_field: order, "_id": 1}},
+                {"$skip": (page - 1) * limit},
+                {"$limit": limit},
+                # Attach user names/emails for this page only
+                {"$lookup": {
+                    "from": "users",
+                    "localField": "_id",
+                    "foreignField": "_id",
+                    "pipeline": [{"$project": {"name": 1, "email": 1, "yearOfStudy": 1}}],
+                    "as": "student"
+                }},
+            ],
+        }},
+    ]
+    agg = list(mongo.db.attempt_facts.aggregate(pipeline))[0]
+    summary = (agg["summary"] or [{}])[0]
+
+    items = []
+    for r in agg["rows"]:
         sid = r.get("_id")
-        user = mongo.db.users.find_one({"_id": sid}) if sid else None
-        out.append({
-            "studentId": str(sid) if sid else None,
+        user = r["student"][0] if r.get("student") else None
+        items.append({
+            "studentId": sid,
             "name": user.get("name") if user else None,
             "email": user.get("email") if user else None,
             "yearOfStudy": user.get("yearOfStudy") if user else None,
@@ -173,9 +229,58 @@ def student_stats():
             "avgScore": r.get("avgScore", 0),
             "lastCompleted": r.get("lastCompleted"),
         })
+    out = {
+        "items": items,
+        "total": summary.get("total", 0),
+        "page": page,
+        "limit": limit,
+        "atRisk": summary.get("atRisk", 0),
+        "distribution": [summary.get(f"b{i}", 0) for i in range(5)],
+    }
+    _student_stats_cache.set(cache_key, out)
     return jsonify(out)
 
 
+@data_bp.get("/export/results")
+@jwt_required()
+def export_cohort_results():
+    """
+    Stream cohort test results as CSV (default) or Parquet (?format=parquet).
+    Accepts the same department/division/yearOfStudy filters as batch-analytics.
+    """
+    claims = get_jwt()
+    role = claims.get("role")
+    if role not in ["TPO", "Faculty", "Admin"]:
+        return jsonify({"error": "Forbidden"}), 403
+
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in ["csv", "parquet"]:
+        return jsonify({"error": "Invalid format (csv or parquet)"}), 400
+
+    department = (request.args.get("department") or "").strip()
+    division = (request.args.get("division") or "").strip()
+    year_of_study = (request.args.get("yearOfStudy") or "").strip()
+
+    # If Faculty, restrict to their department
+    if role == "Faculty":
+        fac = get_user(get_jwt_identity())
+        fac_dept = (fac or {}).get("department")
+        if fac_dept:
+            department = fac_dept
+
+    rows = iter_cohort_rows(department, division, year_of_study)
+    if fmt == "parquet":
+        body, mimetype = stream_parquet(rows), "application/vnd.apache.parquet"
+    else:
+        body, mimetype = stream_csv(rows), "text/csv"
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=cohort-results.{fmt}"}
+    )
+
+
 @data_bp.get("/skill-gaps")
 @jwt_required()
 def skill_gaps():
@@ -184,31 +289,14 @@ def skill_gaps():
     """
     user_id = get_jwt_identity()
     
-    # Aggregation to get accuracy per topic
-    pipeline = [
-        {"$match": {"studentId": ObjectId(user_id)}},
-        {"$unwind": "$history"},
-        {"$lookup": {
-            "from": "questions",
-            "localField": "history.questionId",
-            "foreignField": "_id",
-            "as": "q"
-        }},
-        {"$unwind": "$q"},
-        {"$group": {
-            "_id": "$q.topic",
-            "totalAttempted": {"$sum": 1},
-            "totalCorrect": {"$sum": {"$cond": [{"$eq": ["$history.isCorrect", True]}, 1, 0]}},
-            "avgDifficulty": {"$avg": "$q.difficulty"}
-        }}
-    ]
-    
-    stats = list(mongo.db.test_results.aggregate(pipeline))
+    # Per-topic totals are maintained incrementally at test completion
+    stats = get_topic_stats(ObjectId(user_id))
     
     skills = []
     for s in stats:
-        topic = s["_id"] or "General"
-        score = (s["totalCorrect"] / s["totalAttempted"]) * 100 if s["totalAttempted"] > 0 else 0
+        topic = s.get("topic") or "General"
+        attempts = s.get("attempts", 0)
+        score = (s.get("correct", 0) / attempts) * 100 if attempts > 0 else 0
         
         status = "Average"
         if score >= 80: status = "Strong"
@@ -217,8 +305,9 @@ def skill_gaps():
         skills.append({
             "topic": topic,
             "accuracy": round(score, 1),
-            "questions": s["totalAttempted"],
-            "difficulty": round(s.get("avgDifficulty", 0), 1),
+            "recentAccuracy": round(s.get("decayedAccuracy", 0) * 100, 1),
+            "questions": attempts,
+            "difficulty": round(s.get("difficultySum", 0) / attempts, 1) if attempts else 0,
             "status": status
         })
         
@@ -233,10 +322,10 @@ def recommendations():
     """
     user_id = get_jwt_identity()
     
-    # 1. Get recent skills data (reuse logic or simple aggregation)
-    # We'll do a quick check of last 5 tests
+    # 1. Recent scores for the consistency check
     recent_tests = list(mongo.db.test_results.find(
-        {"studentId": ObjectId(user_id)}
+        {"studentId": ObjectId(user_id)},
+        {"score": 1}
     ).sort("completedAt", -1).limit(5))
     
     recommendations = []
@@ -248,25 +337,14 @@ def recommendations():
             "action": "/test"
         }])
         
-    # Check for weak topics
-    # (Simplified aggregation for recommendations)
-    topic_performance = {}
-    for t in recent_tests:
-        # If granular history exists, use it
-        if "history" in t:
-            for h in t["history"]:
-                # We need topic from question... this is slow without lookup. 
-                # Optimization: Infer from test Type if granular missing, 
-                # or fetch question details. For MVP, use Test Type.
-                topic = t.get("type", "General") or "General"
-                if topic not in topic_performance:
-                     topic_performance[topic] = {"correct": 0, "total": 0}
-                topic_performance[topic]["total"] += 1
-                if h.get("isCorrect"):
-                     topic_performance[topic]["correct"] += 1
+    # 2. Weak/strong topics from the time-decayed accuracy, so recent
+    # performance dominates without scanning the history
+    topic_performance = {
+        (t.get("topic") or "General"): t.get("decayedAccuracy", 0) * 100
+        for t in get_topic_stats(ObjectId(user_id))
+    }
     
-    for topic, stats in topic_performance.items():
-        accuracy = (stats["correct"] / stats["total"]) * 100
+    for topic, accuracy in topic_performance.items():
         if accuracy < 50:
             recommendations.append({
                 "type": "weakness",
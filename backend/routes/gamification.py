@@ -1,15 +1,16 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from bson import ObjectId
 
-from extensions import mongo
 from services.gamification import (
     get_leaderboard,
     get_user_rank,
     ACHIEVEMENTS,
     calculate_level,
-    xp_for_next_level
+    xp_for_next_level,
+    get_current_streak
 )
+from services.platform_stats import get_platform_stats
+from services.user_cache import get_user
 
 gamification_bp = Blueprint("gamification", __name__)
 
@@ -19,7 +20,7 @@ gamification_bp = Blueprint("gamification", __name__)
 def get_gamification_profile():
     """Get user's gamification profile (XP, level, badges, rank)"""
     user_id = get_jwt_identity()
-    user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
+    user = get_user(user_id)
     
     if not user:
         return jsonify({"error": "User not found"}), 404
@@ -31,6 +32,8 @@ def get_gamification_profile():
     # Get user rank
     rank = get_user_rank(user_id)
     
+    streak = user.get("streak") or {}
+    
     # Calculate progress to next level
     current_level_xp = level ** 2 * 100
     next_level_xp = xp_for_next_level(level)
@@ -54,6 +57,11 @@ def get_gamification_profile():
         "level": level,
         "rank": rank,
         "badges": badge_details,
+        "streak": {
+            "current": get_current_streak(user),
+            "longest": streak.get("longest", 0),
+            "lastActiveDay": streak.get("lastActiveDay")
+        },
         "xp_progress": xp_progress,
         "xp_needed": xp_needed,
         "progress_percentage": int((xp_progress / xp_needed) * 100) if xp_needed > 0 else 0
@@ -65,7 +73,7 @@ def get_gamification_profile():
 def get_achievements():
     """Get all achievements with earned status"""
     user_id = get_jwt_identity()
-    user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
+    user = get_user(user_id)
     
     if not user:
         return jsonify({"error": "User not found"}), 404
@@ -127,31 +135,13 @@ def leaderboard():
 def gamification_stats():
     """Get overall gamification statistics"""
     
-    # Total XP distributed
-    pipeline = [
-        {"$match": {"role": "Student"}},
-        {"$group": {
-            "_id": None,
-            "total_xp": {"$sum": "$xp"},
-            "avg_level": {"$avg": "$level"},
-            "total_badges": {"$sum": {"$size": {"$ifNull": ["$badges", []]}}}
-        }}
-    ]
-    
-    stats = list(mongo.db.users.aggregate(pipeline))
-    
-    if stats:
-        stats = stats[0]
-        return jsonify({
-            "total_xp_distributed": stats.get("total_xp", 0),
-            "average_level": round(stats.get("avg_level", 1), 2),
-            "total_badges_earned": stats.get("total_badges", 0),
-            "total_achievements": len(ACHIEVEMENTS)
-        })
+    # Counters are maintained incrementally and reconciled in the background
+    stats = get_platform_stats()
+    level_count = stats.get("level_count", 0)
     
     return jsonify({
-        "total_xp_distributed": 0,
-        "average_level": 1,
-        "total_badges_earned": 0,
+        "total_xp_distributed": stats.get("total_xp", 0),
+        "average_level": round(stats.get("level_sum", 0) / level_count, 2) if level_count else 1,
+        "total_badges_earned": stats.get("total_badges", 0),
         "total_achievements": len(ACHIEVEMENTS)
     })
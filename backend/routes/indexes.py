@@ -0,0 +1,159 @@
+"""
+Index registry for every collection the blueprints and services query.
+
+INDEXES declares the indexes; `ensure_indexes` applies them idempotently at app
+startup (and from scripts/init_db.py). QUERY_SHAPES lists the hot query shapes
+with the index each one should use; scripts/check_indexes.py explains them and
+fails when any plan falls back to a collection scan.
+"""
+import logging
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# collection -> list of IndexModel
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="uniq_email"),
+        # Leaderboard (role=Student sorted by xp) and rank counting
+        IndexModel([("role", ASCENDING), ("xp", DESCENDING)], name="by_role_xp"),
+    ],
+    "questions": [
+        # Adaptive pool sampling and next-question selection
+        IndexModel([("topic", ASCENDING), ("difficulty", ASCENDING)], name="by_topic_difficulty"),
+        # Coding problem lists (type=coding sorted by difficulty)
+        IndexModel([("type", ASCENDING), ("difficulty", ASCENDING)], name="by_type_difficulty"),
+        # Duplicate detection on import
+        IndexModel([("textHash", ASCENDING)], name="by_text_hash"),
+    ],
+    "test_results": [
+        IndexModel([("studentId", ASCENDING), ("completedAt", ASCENDING)], name="by_student_completed"),
+        # Incremental cohort rollup refresh
+        IndexModel([("completedAt", ASCENDING)], name="by_completed"),
+    ],
+    "code_submissions": [
+        IndexModel([("studentId", ASCENDING), ("all_passed", ASCENDING)], name="by_student_passed"),
+    ],
+    "otps": [
+        # One pending OTP per email, upserted on request
+        IndexModel([("email", ASCENDING)], unique=True, name="uniq_email"),
+        # Expired OTPs are removed by the server
+        IndexModel([("expires", ASCENDING)], expireAfterSeconds=0, name="ttl_expires"),
+    ],
+    "import_jobs": [
+        IndexModel([("status", ASCENDING), ("createdAt", ASCENDING)], name="by_status_created"),
+    ],
+    "ai_response_cache": [
+        IndexModel([("expiresAt", ASCENDING)], expireAfterSeconds=0, name="ttl_expires"),
+        IndexModel([("lastUsedAt", ASCENDING)], name="by_last_used"),
+    ],
+    "rate_limits": [
+        IndexModel([("expiresAt", ASCENDING)], expireAfterSeconds=0, name="ttl_expires"),
+    ],
+    "attempt_facts": [
+        IndexModel([("resultId", ASCENDING), ("seq", ASCENDING)], unique=True, name="uniq_result_seq"),
+        IndexModel([("studentId", ASCENDING), ("topic", ASCENDING)], name="by_student_topic"),
+        IndexModel(
+            [("department", ASCENDING), ("division", ASCENDING), ("yearOfStudy", ASCENDING)],
+            name="by_cohort"
+        ),
+    ],
+    "student_topic_stats": [
+        IndexModel([("studentId", ASCENDING), ("topic", ASCENDING)], unique=True, name="uniq_student_topic"),
+    ],
+    "cohort_rollup": [
+        IndexModel(
+            [("department", ASCENDING), ("division", ASCENDING), ("yearOfStudy", ASCENDING), ("day", ASCENDING)],
+            unique=True, name="uniq_cohort_day"
+        ),
+    ],
+}
+
+_SAMPLE_ID = ObjectId("000000000000000000000000")
+
+# (collection, filter, sort) for each hot query path
+QUERY_SHAPES = [
+    ("users", {"email": "student@example.com"}, None),
+    ("users", {"role": "Student"}, [("xp", DESCENDING)]),
+    ("users", {"role": "Student", "xp": {"$gt": 100}}, None),
+    ("questions", {"topic": "Mixed Aptitude", "difficulty": 3}, None),
+    ("questions", {"type": "coding"}, [("difficulty", ASCENDING)]),
+    ("questions", {"textHash": {"$in": ["0" * 40]}}, None),
+    ("test_results", {"studentId": _SAMPLE_ID}, [("completedAt", DESCENDING)]),
+    ("test_results", {"studentId": _SAMPLE_ID, "score": 100}, None),
+    ("test_results", {"completedAt": {"$gte": _SAMPLE_ID.generation_time.replace(tzinfo=None)}}, None),
+    ("code_submissions", {"studentId": _SAMPLE_ID, "all_passed": True}, None),
+    ("otps", {"email": "student@example.com"}, None),
+    ("import_jobs", {"status": "queued"}, [("createdAt", ASCENDING)]),
+    ("attempt_facts", {"studentId": _SAMPLE_ID}, None),
+    ("attempt_facts", {"department": "Computer Engineering", "division": "A"}, None),
+    ("student_topic_stats", {"studentId": _SAMPLE_ID}, [("topic", ASCENDING)]),
+    ("cohort_rollup", {"department": "Computer Engineering"}, None),
+]
+
+# collection -> names of indexes replaced by ones above; dropped before creating
+RETIRED = {
+    "otps": ["by_email"],
+}
+
+
+def ensure_indexes(db):
+    """
+    Create every registered index. Existing identical indexes are a no-op;
+    conflicts are reported and skipped so startup never fails on them.
+
+    Returns:
+        list: (collection, error) pairs for indexes that could not be created
+    """
+    failures = []
+    for collection, models in INDEXES.items():
+        try:
+            retired = RETIRED.get(collection)
+            if retired:
+                existing = db[collection].index_information()
+                for name in retired:
+                    if name in existing:
+                        db[collection].drop_index(name)
+            db[collection].create_indexes(models)
+        except OperationFailure as err:
+            failures.append((collection, str(err)))
+            logger.warning("Could not create indexes on %s: %s", collection, err)
+    return failures
+
+
+def _plan_stages(plan):
+    """Yield every stage name in a (possibly nested) query plan"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ["inputStage", "queryPlan"]:
+        yield from _plan_stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def explain_query_shapes(db):
+    """
+    Explain each registered query shape.
+
+    Returns:
+        list: dicts with collection, filter, sort, stages and collscan flag
+    """
+    report = []
+    for collection, query, sort in QUERY_SHAPES:
+        cmd = {"find": collection, "filter": query}
+        if sort:
+            cmd["sort"] = dict(sort)
+        explained = db.command("explain", cmd, verbosity="queryPlanner")
+        stages = list(_plan_stages(explained["queryPlanner"]["winningPlan"]))
+        report.append({
+            "collection": collection,
+            "filter": query,
+            "sort": sort,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return report
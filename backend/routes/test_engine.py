@@ -1,3 +1,4 @@
+import logging
 from datetime import datetime
 from typing import Optional
 from flask import Blueprint, request, jsonify
@@ -6,13 +7,18 @@ from bson import ObjectId
 
 from extensions import mongo
 from services.ai_generator import QuestionGenerator
+from services.attempt_facts import fetch_questions_by_id, record_attempt_facts
+from services.dedup_index import index_questions
+from services.topic_mastery import record_topic_attempts
 from services.gamification import (
     calculate_xp_reward,
     update_user_xp,
+    update_streak,
     check_and_award_achievements
 )
 
 test_bp = Blueprint("test", __name__)
+logger = logging.getLogger(__name__)
 
 def _get_adaptive_test_pool(user_id, topic: str) -> list[dict]:
     """
@@ -40,7 +46,7 @@ def _get_adaptive_test_pool(user_id, topic: str) -> list[dict]:
     seen_cursor = mongo.db.test_results.aggregate(pipeline)
     seen_ids = {str(doc["history"]["questionId"]) for doc in seen_cursor}
     
-    print(f"[Adaptive] User {user_id} has seen {len(seen_ids)} questions.")
+    logger.debug("Building adaptive pool", extra={"userId": user_id, "seenQuestions": len(seen_ids)})
 
     for diff, count in stages:
         # Try to fetch from DB first
@@ -63,16 +69,17 @@ def _get_adaptive_test_pool(user_id, topic: str) -> list[dict]:
         needed = count - len(db_candidates)
         
         if needed > 0:
-            print(f"[Adaptive] Generating {needed} new questions for Diff {diff}...")
+            logger.info("Generating %d new questions", needed, extra={"topic": topic, "difficulty": diff})
             try:
                 new_batch = QuestionGenerator.generate_batch(topic, diff, count=needed)
                 for q in new_batch:
                     # Insert new question
                     res = mongo.db.questions.insert_one(q)
+                    index_questions([q])
                     q["_id"] = str(res.inserted_id)
                     pool.append(q)
             except Exception as e:
-                print(f"[Adaptive] Generation failed: {e}")
+                logger.warning("Question generation failed: %s", e, extra={"topic": topic, "difficulty": diff})
                 # We continue, hopefully we have enough other questions
     
     return pool
@@ -163,7 +170,8 @@ def submit_answer():
         "questionId": question_id,
         "isCorrect": is_correct,
         "selected": selected,
-        "difficulty": q.get("difficulty", 1)
+        "difficulty": q.get("difficulty", 1),
+        "topic": q.get("topic")
     }
     
     # --- ADAPTIVE PROGRESSION LOGIC ---
@@ -291,13 +299,16 @@ def _conclude_test_session(session, user_id):
     score = round(100.0 * correct_count / max(1, total), 2) if total > 0 else 0
 
     # Build detailed review
+    questions_by_id = fetch_questions_by_id(history, projection={
+        "text": 1, "options": 1, "answer": 1, "topic": 1, "difficulty": 1
+    })
     review_data = []
     avg_difficulty = 0
     for h_item in history:
         qid = h_item.get("questionId")
         if not qid: continue
         q_oid = ObjectId(qid) if isinstance(qid, str) else qid
-        q_doc = mongo.db.questions.find_one({"_id": q_oid})
+        q_doc = questions_by_id.get(q_oid)
         if q_doc:
             avg_difficulty += q_doc.get("difficulty", 3)
             review_data.append({
@@ -327,6 +338,9 @@ def _conclude_test_session(session, user_id):
     # Award XP to user
     xp_update = update_user_xp(user_id, xp_earned)
     
+    # Record today's activity for streak tracking
+    streak = update_streak(user_id)
+    
     # Check for new achievements
     new_achievements = check_and_award_achievements(user_id)
     
@@ -344,7 +358,15 @@ def _conclude_test_session(session, user_id):
         "xpEarned": xp_earned,
         "timeTakenSeconds": time_taken_sec
     }
-    mongo.db.test_results.insert_one(result_doc)
+    res = mongo.db.test_results.insert_one(result_doc)
+    result_doc["_id"] = res.inserted_id
+    
+    # Flatten into per-question analytics facts
+    record_attempt_facts(result_doc, questions_by_id=questions_by_id)
+    record_topic_attempts(
+        result_doc["studentId"], history, score,
+        completed_at=result_doc["completedAt"], questions_by_id=questions_by_id
+    )
     mongo.db.test_sessions.delete_one({"_id": session["_id"]})
 
     return jsonify({
@@ -359,6 +381,7 @@ def _conclude_test_session(session, user_id):
             "new_level": xp_update.get("new_level", 1) if xp_update else 1,
             "leveled_up": xp_update.get("leveled_up", False) if xp_update else False,
             "xp_for_next_level": xp_update.get("xp_for_next_level", 100) if xp_update else 100,
+            "streak": streak.get("current", 0) if streak else 0,
             "new_achievements": new_achievements
         }
     })
@@ -24,7 +24,6 @@ def list_topics():
     general = []
     technical = []
     for doc in cursor:
-        doc["_id"] = str(doc["_id"]) if doc.get("_id") else None
         cat = doc.get("category") or ""
         if cat == "General Aptitude":
             general.append(doc)
@@ -50,8 +49,6 @@ def get_topic(topic_id: str):
     doc = mongo.db.topics.find_one({"_id": obj_id})
     if not doc:
         return jsonify({"error": "Not found"}), 404
-    # Serialize
-    doc["_id"] = str(doc["_id"]) if doc.get("_id") else None
     return jsonify({
         "_id": doc.get("_id"),
         "name": doc.get("name"),
@@ -77,16 +74,10 @@ def get_topic_questions(topic_id: str):
         return jsonify([])
 
     name = topic.get("name")
-    rows = []
-    for q in mongo.db.questions.find({"topic": name}):
-        q["_id"] = str(q["_id"]) if q.get("_id") else None
-        rows.append({
-            "_id": q.get("_id"),
-            "text": q.get("text"),
-            "options": q.get("options", []),
-            "answer": q.get("answer"),
-            "topic": q.get("topic"),
-        })
-    return jsonify(rows)
+    cursor = mongo.db.questions.find(
+        {"topic": name},
+        {"text": 1, "options": 1, "answer": 1, "topic": 1}
+    )
+    return jsonify(list(cursor))
 
 
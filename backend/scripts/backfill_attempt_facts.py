@@ -0,0 +1,70 @@
+"""
+Backfill the `attempt_facts` collection from existing test results.
+
+Streams test_results in batches, resolves questions and students for each
+batch with one $in query apiece, and upserts facts keyed by (resultId, seq),
+so the job can be stopped and re-run safely:
+
+    python scripts/backfill_attempt_facts.py [--batch-size 500]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import mongo
+from services.attempt_facts import (
+    COHORT_FIELDS,
+    build_attempt_facts,
+    fetch_questions_by_id,
+    upsert_attempt_facts,
+)
+
+
+def backfill_batch(results):
+    history = [h for r in results for h in r.get("history", [])]
+    questions_by_id = fetch_questions_by_id(history)
+
+    student_ids = list({r.get("studentId") for r in results if r.get("studentId")})
+    students = {
+        u["_id"]: u
+        for u in mongo.db.users.find({"_id": {"$in": student_ids}}, {f: 1 for f in COHORT_FIELDS})
+    }
+
+    facts = []
+    for r in results:
+        facts.extend(build_attempt_facts(r, students.get(r.get("studentId")), questions_by_id))
+    return upsert_attempt_facts(mongo.db, facts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        cursor = mongo.db.test_results.find(
+            {},
+            {"studentId": 1, "score": 1, "completedAt": 1, "history": 1}
+        ).batch_size(args.batch_size)
+
+        batch, processed, written = [], 0, 0
+        for result in cursor:
+            batch.append(result)
+            if len(batch) >= args.batch_size:
+                written += backfill_batch(batch)
+                processed += len(batch)
+                batch = []
+                print(f"Processed {processed} results, {written} facts written")
+        if batch:
+            written += backfill_batch(batch)
+            processed += len(batch)
+
+    print(f"Backfill complete: {processed} results, {written} new facts")
+
+
+if __name__ == "__main__":
+    main()
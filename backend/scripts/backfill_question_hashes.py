@@ -0,0 +1,44 @@
+"""
+One-off migration: store `textHash` on questions created before CSV imports
+deduplicated by normalized text, so new imports skip them as duplicates.
+
+Only questions without a hash are touched, so it is safe to re-run:
+
+    python scripts/backfill_question_hashes.py [--batch-size 1000]
+"""
+import argparse
+import os
+import sys
+
+from pymongo import UpdateOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import mongo
+from services.question_ingest import text_hash
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        cursor = mongo.db.questions.find(
+            {"textHash": {"$exists": False}, "text": {"$type": "string"}}, {"text": 1}
+        ).batch_size(args.batch_size)
+        ops, updated = [], 0
+        for q in cursor:
+            ops.append(UpdateOne({"_id": q["_id"]}, {"$set": {"textHash": text_hash(q["text"])}}))
+            if len(ops) >= args.batch_size:
+                updated += mongo.db.questions.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            updated += mongo.db.questions.bulk_write(ops, ordered=False).modified_count
+    print(f"Hashed {updated} questions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Load-test the API with many concurrent clients and compare gunicorn worker classes.
+
+Each client is a thread issuing requests back to back for --duration seconds,
+cycling through the given paths. Against a running server:
+
+    python scripts/bench_concurrency.py --url http://localhost:10000 \\
+        --path /api/health --path /api/gamification/leaderboard --token <jwt>
+
+With --compare, the script starts gunicorn (gunicorn_config.py) once per
+worker class on a local port, runs the same load against each and prints a
+side-by-side table:
+
+    python scripts/bench_concurrency.py --compare sync gthread --clients 500
+
+--data sends each request as a POST with that JSON body, e.g. a code run
+that blocks for a while, to load endpoints that wait on something:
+
+    python scripts/bench_concurrency.py --compare sync gthread --token <jwt> \\
+        --path /api/code/execute --data '{"source_code": "import time; time.sleep(0.2)"}'
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(base_url, paths, clients, duration, token=None, timeout=60, data=None):
+    """
+    Hammer `paths` from `clients` threads for `duration` seconds.
+
+    Returns:
+        dict: requests, errors, rps and latency percentiles in ms
+    """
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    body = data.encode("utf-8") if data else None
+    if body:
+        headers["Content-Type"] = "application/json"
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start_gate = threading.Event()
+    deadline = [0.0]
+
+    def client(offset):
+        local_lat, local_err = [], 0
+        i = offset
+        start_gate.wait()
+        while time.perf_counter() < deadline[0]:
+            req = urllib.request.Request(base_url + paths[i % len(paths)], data=body, headers=headers)
+            i += 1
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=timeout) as resp:
+                    resp.read()
+                local_lat.append((time.perf_counter() - started) * 1000)
+            except (urllib.error.URLError, OSError):
+                local_err += 1
+        with lock:
+            latencies.extend(local_lat)
+            errors[0] += local_err
+
+    threads = [threading.Thread(target=client, args=(n,), daemon=True) for n in range(clients)]
+    for t in threads:
+        t.start()
+    began = time.perf_counter()
+    deadline[0] = began + duration
+    start_gate.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "p99": _percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0.0,
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+    }
+
+
+def _wait_healthy(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/api/health", timeout=2):
+                return True
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    return False
+
+
+def start_gunicorn(worker_class, port):
+    env = {**os.environ, "GUNICORN_WORKER_CLASS": worker_class}
+    # gunicorn silently runs "sync" as gthread when threads > 1, which
+    # gunicorn_config.py sets, so pin a real sync run to one thread
+    threads = ["--threads", "1"] if worker_class == "sync" else []
+    return subprocess.Popen(
+        ["gunicorn", "-c", "gunicorn_config.py", "-k", worker_class, *threads,
+         "-b", f"127.0.0.1:{port}", "--access-logfile", "/dev/null", "app:create_app()"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def print_table(rows):
+    print(f"{'run':<12}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, r in rows:
+        print(f"{name:<12}{r['requests']:>10}{r['errors']:>8}{r['rps']:>10.1f}"
+              f"{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{r['max']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:10000", help="Base URL of a running server")
+    parser.add_argument("--path", action="append", help="Path to request (repeatable, default /api/health)")
+    parser.add_argument("--token", help="JWT sent as a Bearer token")
+    parser.add_argument("--data", help="JSON body; requests are sent as POST")
+    parser.add_argument("--clients", type=int, default=500, help="Concurrent clients (default 500)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load per run (default 30)")
+    parser.add_argument("--compare", nargs="+", metavar="WORKER_CLASS",
+                        help="Start gunicorn with each worker class and compare (e.g. sync gthread)")
+    parser.add_argument("--port", type=int, default=18000, help="Port used with --compare")
+    args = parser.parse_args()
+    paths = args.path or ["/api/health"]
+
+    if not args.compare:
+        print(f"{args.clients} clients for {args.duration:.0f}s against {args.url} {paths}")
+        print_table([("server", run_load(args.url, paths, args.clients, args.duration, args.token, data=args.data))])
+        return
+
+    rows = []
+    base_url = f"http://127.0.0.1:{args.port}"
+    for worker_class in args.compare:
+        proc = start_gunicorn(worker_class, args.port)
+        try:
+            if not _wait_healthy(base_url):
+                print(f"gunicorn ({worker_class}) did not become healthy; skipping")
+                continue
+            print(f"Running {worker_class}: {args.clients} clients for {args.duration:.0f}s ...")
+            rows.append((worker_class, run_load(base_url, paths, args.clients, args.duration, args.token, data=args.data)))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    print_table(rows)
+    if not rows:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark the streaming CSV question ingest against the old per-row insert.
+
+Generates a CSV of --rows questions (with a share of duplicates and invalid
+rows), then imports it into a scratch collection with the streaming ingest
+and, with --baseline, with one insert_one per row as the old upload did. The
+scratch collection is dropped before each run and at the end:
+
+    python scripts/bench_question_ingest.py --rows 100000 --baseline
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import mongo
+from routes.indexes import INDEXES
+from services.question_ingest import ingest_rows, open_csv, parse_question_row
+
+
+def write_csv(path, rows, duplicate_rate=0.05, invalid_rate=0.01):
+    rng = random.Random(42)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["text", "topic", "difficulty", "type", "options", "answer"])
+        for i in range(rows):
+            n = rng.randrange(i) if i and rng.random() < duplicate_rate else i
+            options = [str(n + k) for k in range(4)]
+            difficulty = "9" if rng.random() < invalid_rate else str(n % 5 + 1)
+            writer.writerow([f"What is {n} + 1?  (bench)", "Arithmetic", difficulty,
+                             "General Aptitude", "|".join(options), options[1]])
+
+
+def run_streaming(collection, path):
+    with open(path, "rb") as f:
+        return ingest_rows(collection, open_csv(f))
+
+
+def run_per_row(collection, path):
+    inserted, errors = 0, 0
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(io.StringIO(f.read())):
+            try:
+                collection.insert_one(parse_question_row(row))
+                inserted += 1
+            except ValueError:
+                errors += 1
+    return {"inserted": inserted, "duplicates": 0, "errors": [None] * errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--collection", default="bench_questions")
+    parser.add_argument("--baseline", action="store_true", help="Also time one insert_one per row")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        collection = mongo.db[args.collection]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "questions.csv")
+            write_csv(path, args.rows)
+            print(f"{args.rows} rows, {os.path.getsize(path) / 1e6:.1f} MB")
+
+            runs = [("streaming", run_streaming)]
+            if args.baseline:
+                runs.append(("per-row", run_per_row))
+            try:
+                for name, fn in runs:
+                    collection.drop()
+                    collection.create_indexes(INDEXES["questions"])
+                    started = time.perf_counter()
+                    result = fn(collection, path)
+                    elapsed = time.perf_counter() - started
+                    print(f"{name:<10} {elapsed:8.2f}s {args.rows / elapsed:10.0f} rows/s  "
+                          f"inserted={result['inserted']} duplicates={result['duplicates']} "
+                          f"errors={len(result['errors'])}")
+            finally:
+                collection.drop()
+
+
+if __name__ == "__main__":
+    main()
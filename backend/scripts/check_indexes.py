@@ -0,0 +1,46 @@
+"""
+Verify that every registered query shape is served by an index.
+
+Applies the index registry (routes/indexes.py), runs explain() on each entry
+in QUERY_SHAPES and exits non-zero if any winning plan is a COLLSCAN. Run it
+in CI against a scratch database:
+
+    python scripts/check_indexes.py
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import mongo
+from routes.indexes import ensure_indexes, explain_query_shapes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--no-apply", action="store_true", help="Check existing indexes without creating any")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if not args.no_apply and ensure_indexes(mongo.db):
+            sys.exit(1)
+        report = explain_query_shapes(mongo.db)
+
+    scans = 0
+    for entry in report:
+        status = "COLLSCAN" if entry["collscan"] else "ok"
+        scans += entry["collscan"]
+        sort = f" sort={entry['sort']}" if entry["sort"] else ""
+        print(f"[{status:8}] {entry['collection']} {entry['filter']}{sort} -> {' > '.join(entry['stages'])}")
+
+    if scans:
+        print(f"{scans} of {len(report)} query shapes fall back to a collection scan")
+        sys.exit(1)
+    print(f"All {len(report)} query shapes use an index")
+
+
+if __name__ == "__main__":
+    main()
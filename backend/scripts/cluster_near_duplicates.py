@@ -0,0 +1,61 @@
+"""
+Cluster the existing question bank into groups of near-identical questions.
+
+Uses the same MinHash/LSH index that screens new questions. Prints a summary
+and the largest clusters; with --apply, stores the cluster on each member as
+`nearDupCluster` (the oldest member's _id) and `nearDupClusterSize`, and
+clears those fields from questions no longer in a cluster:
+
+    python scripts/cluster_near_duplicates.py [--threshold 0.8] [--apply]
+"""
+import argparse
+import os
+import sys
+
+from pymongo import UpdateMany
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import mongo
+from services.dedup_index import THRESHOLD, cluster_questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Minimum estimated Jaccard similarity")
+    parser.add_argument("--apply", action="store_true", help="Write cluster ids onto the questions")
+    parser.add_argument("--show", type=int, default=10, help="Largest clusters to print")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        clusters = cluster_questions(mongo.db.questions, threshold=args.threshold)
+        clusters.sort(key=len, reverse=True)
+        members = sum(len(c) for c in clusters)
+        print(f"{len(clusters)} clusters covering {members} questions "
+              f"({members - len(clusters)} redundant) at threshold {args.threshold}")
+
+        for cluster in clusters[:args.show]:
+            texts = mongo.db.questions.find({"_id": {"$in": cluster[:3]}}, {"text": 1})
+            print(f"\n{len(cluster)} questions, cluster {cluster[0]}:")
+            for q in texts:
+                print(f"  - {q['text'][:100]}")
+
+        if args.apply:
+            ops = [
+                UpdateMany({"_id": {"$in": c}}, {"$set": {"nearDupCluster": c[0], "nearDupClusterSize": len(c)}})
+                for c in clusters
+            ]
+            if ops:
+                mongo.db.questions.bulk_write(ops, ordered=False)
+            clustered = [qid for c in clusters for qid in c]
+            mongo.db.questions.update_many(
+                {"nearDupCluster": {"$exists": True}, "_id": {"$nin": clustered}},
+                {"$unset": {"nearDupCluster": "", "nearDupClusterSize": ""}}
+            )
+            print(f"\nCluster ids written to {members} questions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Run question bank import jobs outside the web workers.
+
+Claims queued jobs (and jobs whose worker died) from `import_jobs` and ingests
+them in chunks, resuming from the last checkpoint. Run it as the Procfile
+`worker` process with IMPORT_WORKER_MODE=external on the web processes:
+
+    python scripts/import_worker.py [--once] [--poll 2]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.import_jobs import process_jobs, run_worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--once", action="store_true", help="Drain the queue and exit")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds between queue polls when idle")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.once:
+            print(f"Processed {process_jobs()} import jobs")
+        else:
+            print("Import worker started")
+            run_worker(poll_seconds=args.poll)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 import os
+import sys
 from datetime import datetime
 from dotenv import load_dotenv
 from passlib.hash import bcrypt
-from pymongo import MongoClient, ASCENDING, errors  # Import errors
+from pymongo import MongoClient, errors  # Import errors
 from urllib.parse import urlparse
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.indexes import ensure_indexes
+
 
 def main():
     load_dotenv()
@@ -34,19 +39,14 @@ def main():
     # Collections
     users = db["users"]
     questions = db["questions"]
-    tests = db["tests"]
 
-    # Indexes
+    # Indexes (declared in routes/indexes.py)
     print("Ensuring indexes...")
-    try:
-        users.create_index([("email", ASCENDING)], unique=True, name="uniq_email")
-        questions.create_index([("difficulty", ASCENDING)], name="by_difficulty")
-        questions.create_index([("type", ASCENDING)], name="by_type")
-        tests.create_index([("userId", ASCENDING), ("createdAt", ASCENDING)], name="by_user_created")
-    except errors.OperationFailure as err:
-        print(f"Error creating indexes: {err}")
+    failures = ensure_indexes(db)
+    if failures:
         # Continue, as indexes might already exist in a conflicting way
-        
+        print(f"{len(failures)} collection(s) have conflicting indexes; see errors above")
+
     # Seed admin
     admin_email = os.getenv("ADMIN_EMAIL", "admin@skillatics.local").strip().lower()
     admin_password = os.getenv("ADMIN_PASSWORD")
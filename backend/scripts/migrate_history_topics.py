@@ -0,0 +1,77 @@
+"""
+One-off migration: copy each question's topic onto the history items of
+existing test results and in-flight test sessions.
+
+New answers record the topic at submit time; this brings older documents in
+line so topic analytics never need to $lookup into `questions`. Documents that
+already have topics on every history item are skipped, so it is safe to re-run:
+
+    python scripts/migrate_history_topics.py [--batch-size 500]
+"""
+import argparse
+import os
+import sys
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import mongo
+from services.attempt_facts import fetch_questions_by_id
+
+
+def migrate_batch(collection, docs):
+    history = [h for d in docs for h in d.get("history", [])]
+    questions_by_id = fetch_questions_by_id(history)
+
+    ops = []
+    for d in docs:
+        # Set the topic on matching elements in place rather than rewriting
+        # the array, so answers pushed onto a live session meanwhile are kept
+        updates, filters = {}, []
+        for qid in {h.get("questionId") for h in d.get("history", []) if "topic" not in h}:
+            key = ObjectId(qid) if isinstance(qid, str) and ObjectId.is_valid(qid) else qid
+            name = f"h{len(filters)}"
+            updates[f"history.$[{name}].topic"] = (questions_by_id.get(key) or {}).get("topic")
+            filters.append({f"{name}.questionId": qid, f"{name}.topic": {"$exists": False}})
+        if updates:
+            ops.append(UpdateOne({"_id": d["_id"]}, {"$set": updates}, array_filters=filters))
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def migrate_collection(collection, batch_size):
+    cursor = collection.find(
+        {"history": {"$elemMatch": {"topic": {"$exists": False}}}},
+        {"history": 1}
+    ).batch_size(batch_size)
+
+    batch, updated = [], 0
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            updated += migrate_batch(collection, batch)
+            batch = []
+            print(f"[{collection.name}] {updated} documents updated")
+    if batch:
+        updated += migrate_batch(collection, batch)
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        for collection in [mongo.db.test_results, mongo.db.test_sessions]:
+            updated = migrate_collection(collection, args.batch_size)
+            print(f"[{collection.name}] Migration complete: {updated} documents updated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Rebuild `student_topic_stats` from `attempt_facts`.
+
+Run once after deploying the topic table (after backfill_attempt_facts.py),
+or any time to correct drift. Rows are merged on (studentId, topic), which
+needs the unique index created by init_db.py:
+
+    python scripts/rebuild_student_topic_stats.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.topic_mastery import rebuild_from_attempt_facts
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        rebuild_from_attempt_facts()
+    print("student_topic_stats rebuilt from attempt_facts")
+
+
+if __name__ == "__main__":
+    main()
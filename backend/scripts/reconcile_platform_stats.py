@@ -0,0 +1,26 @@
+"""
+Recompute the pre-aggregated gamification counters from scratch.
+
+The API reconciles them in the background when they get stale; run this from
+cron (e.g. every 15 minutes) to keep them fresh even without traffic:
+
+    python scripts/reconcile_platform_stats.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.platform_stats import reconcile_platform_stats
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        counters = reconcile_platform_stats()
+    print(f"Platform stats reconciled: {counters}")
+
+
+if __name__ == "__main__":
+    main()
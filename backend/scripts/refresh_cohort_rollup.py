@@ -0,0 +1,32 @@
+"""
+Refresh the cohort rollup cube used by /api/data/batch-analytics.
+
+Folds in results completed since the last refresh; schedule it from cron to
+keep the cube fresh without dashboard traffic. Use --rebuild after changing
+cohort fields in bulk to recompute every cell from scratch:
+
+    python scripts/refresh_cohort_rollup.py [--rebuild]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.cohort_rollup import refresh_cohort_rollup, rebuild_cohort_rollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all cells from scratch")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        done = rebuild_cohort_rollup() if args.rebuild else refresh_cohort_rollup()
+    print("Cohort rollup refreshed" if done else "Another process is refreshing the cohort rollup; skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Fast BSON-aware JSON encoding, installed app-wide as Flask's JSON provider.
+
+Encodes ObjectId as its hex string and datetimes as ISO 8601 (naive values are
+the UTC timestamps PyMongo returns, so they get a "Z" suffix), recursing through
+nested documents in the encoder itself instead of copying them first. Uses
+orjson when it is installed and falls back to the stdlib encoder otherwise.
+"""
+import dataclasses
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from bson import ObjectId
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def bson_default(o):
+    """`default` hook for JSON encoders: handles the BSON types we store"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, datetime):
+        return o.isoformat() + "Z" if o.tzinfo is None else o.isoformat()
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, (Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Serialize to a JSON string"""
+    if orjson is not None:
+        return orjson.dumps(
+            obj,
+            default=bson_default,
+            option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        ).decode("utf-8")
+    return json.dumps(obj, default=bson_default, separators=(",", ":"))
+
+
+def loads(s):
+    """Deserialize a JSON string or bytes"""
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+class BSONJSONProvider(JSONProvider):
+    """
+    Flask JSON provider backed by `dumps`, so `jsonify` and returning dicts or
+    lists from views accept MongoDB documents as they come out of PyMongo.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
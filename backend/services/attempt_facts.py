@@ -0,0 +1,100 @@
+"""
+Attempt Facts Service - Flattened, one-row-per-answered-question analytics store
+
+Each document in `attempt_facts` describes a single answered question together
+with the test result it belongs to and the student's cohort, so analytics can
+filter and group on one collection without $unwind or $lookup.
+"""
+from bson import ObjectId
+from pymongo import UpdateOne
+from extensions import mongo
+from services.user_cache import get_user
+
+# Student fields copied onto every fact for cohort filtering
+COHORT_FIELDS = ["department", "division", "yearOfStudy"]
+
+
+def _to_object_id(value):
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except Exception:
+        return None
+
+
+def build_attempt_facts(result_doc, student=None, questions_by_id=None):
+    """
+    Flatten a test result into attempt facts.
+
+    Args:
+        result_doc: Persisted test_results document (must have _id)
+        student: User document (cohort fields only are used)
+        questions_by_id: Map of question ObjectId -> question document
+
+    Returns:
+        list: Fact documents in history order
+    """
+    student = student or {}
+    questions_by_id = questions_by_id or {}
+    facts = []
+    for seq, h in enumerate(result_doc.get("history", [])):
+        qid = _to_object_id(h.get("questionId"))
+        q = questions_by_id.get(qid) or {}
+        fact = {
+            "resultId": result_doc["_id"],
+            "seq": seq,
+            "studentId": result_doc.get("studentId"),
+            "questionId": qid,
+            "topic": h.get("topic") or q.get("topic"),
+            "difficulty": h.get("difficulty", q.get("difficulty")),
+            "isCorrect": bool(h.get("isCorrect")),
+            "score": result_doc.get("score", 0),
+            "completedAt": result_doc.get("completedAt"),
+        }
+        for field in COHORT_FIELDS:
+            fact[field] = student.get(field)
+        facts.append(fact)
+    return facts
+
+
+def fetch_questions_by_id(history_items, projection=None):
+    """Load the questions referenced by history items in one query"""
+    ids = {_to_object_id(h.get("questionId")) for h in history_items}
+    ids.discard(None)
+    if not ids:
+        return {}
+    cursor = mongo.db.questions.find({"_id": {"$in": list(ids)}}, projection or {"topic": 1, "difficulty": 1})
+    return {q["_id"]: q for q in cursor}
+
+
+def record_attempt_facts(result_doc, student=None, questions_by_id=None):
+    """Write the facts for a freshly completed test result"""
+    if student is None and result_doc.get("studentId"):
+        # Usually already loaded by this request (XP, streak, achievements)
+        student = get_user(result_doc["studentId"])
+    if questions_by_id is None:
+        questions_by_id = fetch_questions_by_id(result_doc.get("history", []))
+    facts = build_attempt_facts(result_doc, student, questions_by_id)
+    if facts:
+        mongo.db.attempt_facts.insert_many(facts, ordered=False)
+    return len(facts)
+
+
+def upsert_attempt_facts(db, facts):
+    """Idempotently write facts keyed by (resultId, seq); used by the backfill job"""
+    if not facts:
+        return 0
+    ops = [
+        UpdateOne({"resultId": f["resultId"], "seq": f["seq"]}, {"$setOnInsert": f}, upsert=True)
+        for f in facts
+    ]
+    res = db.attempt_facts.bulk_write(ops, ordered=False)
+    return res.upserted_count
+
+
+def sync_student_cohort(student_id, updates):
+    """Propagate changed cohort fields of a student onto their existing facts"""
+    changed = {k: v for k, v in updates.items() if k in COHORT_FIELDS}
+    if changed:
+        mongo.db.attempt_facts.update_many({"studentId": ObjectId(student_id)}, {"$set": changed})
@@ -0,0 +1,141 @@
+"""
+Cohort Export Service - Streams cohort test results as CSV or Parquet
+
+Rows are produced from a server-side cursor and emitted in small chunks, so
+memory use stays flat regardless of how many results are exported.
+"""
+import csv
+import io
+from extensions import mongo
+
+EXPORT_COLUMNS = [
+    "studentId", "name", "email", "rollNo", "department", "division", "yearOfStudy",
+    "resultId", "type", "score", "correctQuestions", "totalQuestions",
+    "timeTakenSeconds", "completedAt",
+]
+
+# Rows per CSV chunk / Parquet row group
+CHUNK_ROWS = 1000
+
+
+def iter_cohort_rows(department=None, division=None, year_of_study=None):
+    """Yield one flat dict per test result of the matching students"""
+    user_filter = {"role": "Student"}
+    if department:
+        user_filter["department"] = department
+    if division:
+        user_filter["division"] = division
+    if year_of_study:
+        user_filter["yearOfStudy"] = year_of_study
+
+    students = {
+        u["_id"]: u for u in mongo.db.users.find(
+            user_filter,
+            {"name": 1, "email": 1, "rollNo": 1, "department": 1, "division": 1, "yearOfStudy": 1}
+        )
+    }
+    if not students:
+        return
+
+    cursor = mongo.db.test_results.find(
+        {"studentId": {"$in": list(students)}},
+        {"studentId": 1, "type": 1, "score": 1, "correctQuestions": 1,
+         "totalQuestions": 1, "timeTakenSeconds": 1, "completedAt": 1}
+    ).sort([("studentId", 1), ("completedAt", 1)]).batch_size(CHUNK_ROWS)
+
+    for r in cursor:
+        s = students.get(r["studentId"], {})
+        yield {
+            "studentId": str(r["studentId"]),
+            "name": s.get("name"),
+            "email": s.get("email"),
+            "rollNo": s.get("rollNo"),
+            "department": s.get("department"),
+            "division": s.get("division"),
+            "yearOfStudy": s.get("yearOfStudy"),
+            "resultId": str(r["_id"]),
+            "type": r.get("type"),
+            "score": r.get("score"),
+            "correctQuestions": r.get("correctQuestions"),
+            "totalQuestions": r.get("totalQuestions"),
+            "timeTakenSeconds": r.get("timeTakenSeconds"),
+            "completedAt": r.get("completedAt"),
+        }
+
+
+def stream_csv(rows):
+    """Encode rows as CSV, yielding one chunk every CHUNK_ROWS rows"""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        if row.get("completedAt"):
+            row = {**row, "completedAt": row["completedAt"].isoformat()}
+        writer.writerow(row)
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the caller while tracking the offset"""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_parquet(rows):
+    """Encode rows as Parquet, yielding bytes after each row group"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("studentId", pa.string()), ("name", pa.string()), ("email", pa.string()),
+        ("rollNo", pa.string()), ("department", pa.string()), ("division", pa.string()),
+        ("yearOfStudy", pa.string()), ("resultId", pa.string()), ("type", pa.string()),
+        ("score", pa.float64()), ("correctQuestions", pa.int64()), ("totalQuestions", pa.int64()),
+        ("timeTakenSeconds", pa.int64()), ("completedAt", pa.timestamp("ms")),
+    ])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+
+    def flush(batch):
+        columns = {name: [r.get(name) for r in batch] for name in schema.names}
+        for name in ["rollNo", "yearOfStudy"]:
+            columns[name] = [None if v is None else str(v) for v in columns[name]]
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK_ROWS:
+            flush(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        flush(batch)
+    writer.close()
+    yield sink.drain()
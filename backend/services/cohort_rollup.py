@@ -0,0 +1,259 @@
+"""
+Cohort Rollup Service - Pre-aggregated test metrics per cohort and day
+
+`cohort_rollup` holds one cell per (department, division, yearOfStudy, day)
+with summed score, test count, correct and total questions; missing cohort
+fields are stored as "". Any filter combination is answered by summing the
+matching cells. Cells are refreshed incrementally: every day touched since
+the last refresh is recomputed in full and its cells replaced, so folding the
+same results twice (e.g. after a crash before the watermark moved) is harmless.
+"""
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from extensions import mongo
+
+logger = logging.getLogger(__name__)
+
+STATE_ID = "cohort_rollup"
+
+# How often the cube is refreshed when dashboards are being read
+REFRESH_INTERVAL = timedelta(seconds=int(os.getenv("COHORT_ROLLUP_REFRESH_SECONDS", "300")))
+
+# Results completed within this window are left for the next refresh, so a
+# result whose insert lands slightly after its completedAt is never skipped
+SETTLE_DELAY = timedelta(minutes=1)
+
+# Cross-worker lease so only one process refreshes at a time; a rebuild
+# renews it after every slice of REBUILD_SLICE worth of results
+LEASE = timedelta(minutes=10)
+REBUILD_SLICE = timedelta(days=30)
+
+_refresh_lock = threading.Lock()
+
+
+class LeaseLost(RuntimeError):
+    """The refresh lease expired and another process took it over"""
+
+
+def _acquire_lease(now):
+    """
+    Take the refresh lease.
+
+    Returns:
+        dict: the state document with a `holder` token, or None if the lease is held
+    """
+    holder = uuid.uuid4().hex
+    state = mongo.db.rollup_state.find_one_and_update(
+        {"_id": STATE_ID, "$or": [{"leaseUntil": {"$lt": now}}, {"leaseUntil": None}]},
+        {"$set": {"leaseUntil": now + LEASE, "holder": holder}},
+        return_document=ReturnDocument.AFTER
+    )
+    if state:
+        return state
+    # First run: create the state document holding the lease
+    try:
+        mongo.db.rollup_state.insert_one(
+            {"_id": STATE_ID, "watermark": None, "leaseUntil": now + LEASE, "holder": holder}
+        )
+    except DuplicateKeyError:
+        return None
+    return {"_id": STATE_ID, "watermark": None, "holder": holder}
+
+
+def _update_state(state, fields):
+    """Update the state document while still holding its lease"""
+    res = mongo.db.rollup_state.update_one({"_id": STATE_ID, "holder": state["holder"]}, {"$set": fields})
+    if not res.matched_count:
+        raise LeaseLost()
+
+
+def _release_lease(state):
+    mongo.db.rollup_state.update_one({"_id": STATE_ID, "holder": state["holder"]}, {"$set": {"leaseUntil": None}})
+
+
+def _day_start(when):
+    return datetime(when.year, when.month, when.day)
+
+
+def _fold(completed):
+    """
+    Recompute the cells for test results whose completedAt matches `completed`
+    and replace the stored ones. `completed` must start on a day boundary so
+    each cell it touches is rebuilt from all of that day's results.
+    """
+    pipeline = [
+        {"$match": {"completedAt": completed}},
+        {"$project": {"studentId": 1, "score": 1, "correctQuestions": 1, "totalQuestions": 1, "completedAt": 1}},
+        # Only new results are joined, never the whole collection
+        {"$lookup": {
+            "from": "users",
+            "localField": "studentId",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"department": 1, "division": 1, "yearOfStudy": 1}}],
+            "as": "student"
+        }},
+        {"$unwind": {"path": "$student", "preserveNullAndEmptyArrays": True}},
+        {"$group": {
+            "_id": {
+                "department": "$student.department",
+                "division": "$student.division",
+                "yearOfStudy": "$student.yearOfStudy",
+                "day": {"$dateTrunc": {"date": "$completedAt", "unit": "day"}},
+            },
+            "scoreSum": {"$sum": "$score"},
+            "tests": {"$sum": 1},
+            "correctSum": {"$sum": "$correctQuestions"},
+            "totalSum": {"$sum": "$totalQuestions"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "department": {"$ifNull": ["$_id.department", ""]},
+            "division": {"$ifNull": ["$_id.division", ""]},
+            "yearOfStudy": {"$ifNull": ["$_id.yearOfStudy", ""]},
+            "day": "$_id.day",
+            "scoreSum": 1,
+            "tests": 1,
+            "correctSum": 1,
+            "totalSum": 1,
+        }},
+        {"$merge": {
+            "into": "cohort_rollup",
+            "on": ["department", "division", "yearOfStudy", "day"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }},
+    ]
+    mongo.db.test_results.aggregate(pipeline, allowDiskUse=True)
+
+
+def refresh_cohort_rollup():
+    """
+    Recompute the cells for every day with results since the last watermark.
+
+    Returns:
+        bool: False if another process holds the refresh lease
+    """
+    now = datetime.utcnow()
+    state = _acquire_lease(now)
+    if state is None:
+        return False
+
+    cutoff = now - SETTLE_DELAY
+    completed = {"$lt": cutoff}
+    if state.get("watermark"):
+        completed["$gte"] = _day_start(state["watermark"])
+    try:
+        _fold(completed)
+        _update_state(state, {"watermark": cutoff, "refreshedAt": now, "leaseUntil": None})
+    except LeaseLost:
+        raise
+    except Exception:
+        _release_lease(state)
+        raise
+    return True
+
+
+def rebuild_cohort_rollup():
+    """
+    Drop the cube and rebuild it from all test results.
+
+    The cube is only cleared once the lease is held. Results are folded in
+    REBUILD_SLICE slices; after each one the watermark advances and the
+    lease is renewed, so a rebuild that dies part way is finished by the
+    next incremental refresh.
+
+    Returns:
+        bool: False if another process holds the refresh lease
+    """
+    now = datetime.utcnow()
+    state = _acquire_lease(now)
+    if state is None:
+        return False
+
+    cutoff = now - SETTLE_DELAY
+    try:
+        _update_state(state, {"watermark": None})
+        mongo.db.cohort_rollup.delete_many({})
+        first = mongo.db.test_results.find_one(
+            {"completedAt": {"$lt": cutoff}}, {"completedAt": 1}, sort=[("completedAt", 1)]
+        )
+        start = _day_start(first["completedAt"]) if first else cutoff
+        while start < cutoff:
+            end = min(start + REBUILD_SLICE, cutoff)
+            _fold({"$gte": start, "$lt": end})
+            _update_state(state, {"watermark": end, "leaseUntil": datetime.utcnow() + LEASE})
+            start = end
+        _update_state(state, {"watermark": cutoff, "refreshedAt": now, "leaseUntil": None})
+    except LeaseLost:
+        raise
+    except Exception:
+        _release_lease(state)
+        raise
+    return True
+
+
+def _refresh_in_background(app):
+    try:
+        with app.app_context():
+            refresh_cohort_rollup()
+    except Exception:
+        logger.exception("Cohort rollup refresh failed")
+    finally:
+        _refresh_lock.release()
+
+
+def schedule_refresh_if_stale():
+    """Start a background refresh when the cube is older than REFRESH_INTERVAL"""
+    state = mongo.db.rollup_state.find_one({"_id": STATE_ID}, {"refreshedAt": 1})
+    refreshed_at = (state or {}).get("refreshedAt")
+    if refreshed_at and datetime.utcnow() - refreshed_at < REFRESH_INTERVAL:
+        return
+    if not _refresh_lock.acquire(blocking=False):
+        return
+    app = current_app._get_current_object()
+    threading.Thread(target=_refresh_in_background, args=(app,), daemon=True).start()
+
+
+def query_cohort_rollup(department=None, division=None, year_of_study=None):
+    """
+    Sum the cube cells matching the given filters.
+
+    Returns:
+        dict: avgScore, tests, avgCorrect, avgTotal
+    """
+    schedule_refresh_if_stale()
+
+    match = {}
+    if department:
+        match["department"] = department
+    if division:
+        match["division"] = division
+    if year_of_study:
+        match["yearOfStudy"] = year_of_study
+
+    agg = list(mongo.db.cohort_rollup.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": None,
+            "scoreSum": {"$sum": "$scoreSum"},
+            "tests": {"$sum": "$tests"},
+            "correctSum": {"$sum": "$correctSum"},
+            "totalSum": {"$sum": "$totalSum"},
+        }}
+    ]))
+    totals = agg[0] if agg else {}
+    tests = totals.get("tests", 0)
+    if not tests:
+        return {"avgScore": 0, "tests": 0, "avgCorrect": 0, "avgTotal": 0}
+    return {
+        "avgScore": totals["scoreSum"] / tests,
+        "tests": tests,
+        "avgCorrect": totals["correctSum"] / tests,
+        "avgTotal": totals["totalSum"] / tests,
+    }
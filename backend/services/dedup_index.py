@@ -0,0 +1,266 @@
+"""
+Dedup Index Service - MinHash/LSH near-duplicate detection for questions
+
+Each question text is reduced to character 5-gram shingles and a 64-value
+MinHash signature; signatures are bucketed into 16 LSH bands of 4 rows, so a
+lookup only compares against questions sharing a band. A candidate counts as
+a near duplicate when its estimated Jaccard similarity reaches
+NEAR_DUP_THRESHOLD (default 0.8).
+
+The index lives in memory per process. It is loaded from `questions` on a
+background thread (started by the gunicorn worker hook, or by the first
+lookup) and screening is skipped until that finishes, so no request waits on
+a scan of the bank. Afterwards it is extended incrementally: callers pass the questions they actually
+inserted to `index_questions`, and questions inserted by other processes are
+picked up by periodic rescans. _ids are generated before screening, so
+another worker's insert can sort below this worker's newest _id; each rescan
+therefore re-reads a trailing REFRESH_OVERLAP window behind the watermark.
+
+NEAR_DUP_MODE controls what screening does with a near duplicate: "flag"
+(default) keeps it with `nearDuplicateOf`/`similarity` set, "reject" drops it,
+"off" disables screening.
+"""
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import timedelta
+import numpy as np
+from bson import ObjectId
+from extensions import mongo
+from services.question_ingest import normalize_text
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+MODE = os.getenv("NEAR_DUP_MODE", "flag")
+
+# Seconds between watermark refreshes that pick up other processes' inserts,
+# and how far behind the watermark each refresh starts
+REFRESH_SECONDS = 30
+REFRESH_OVERLAP = timedelta(minutes=10)
+
+# Multiply-shift hash family: h(x) = ((a*x + b) mod 2^64) >> 32, a odd
+_rng = np.random.default_rng(20240601)
+_A = (_rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)).reshape(-1, 1)
+_B = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64).reshape(-1, 1)
+_EMPTY = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+
+
+def shingles(text):
+    """Stable 32-bit hashes of the normalized text's character shingles"""
+    text = normalize_text(text)
+    if len(text) <= SHINGLE_SIZE:
+        grams = {text} if text else set()
+    else:
+        grams = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def signature(text):
+    """64-value MinHash signature of a question text"""
+    x = shingles(text)
+    if not x.size:
+        return _EMPTY
+    with np.errstate(over="ignore"):
+        hashed = (_A * x + _B) >> np.uint64(32)
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+class NearDuplicateIndex:
+    """In-memory LSH index of question signatures keyed by question _id"""
+
+    def __init__(self, threshold=THRESHOLD):
+        self.threshold = threshold
+        self._signatures = {}
+        self._buckets = [{} for _ in range(BANDS)]
+        self._watermark = None
+        self._refreshed_at = 0.0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def add(self, question_id, sig):
+        with self._lock:
+            self._signatures[question_id] = sig
+            for band in range(BANDS):
+                key = sig[band * ROWS:(band + 1) * ROWS].tobytes()
+                self._buckets[band].setdefault(key, set()).add(question_id)
+
+    def query(self, sig, exclude=None):
+        """
+        Indexed questions similar to `sig`, best first.
+
+        Returns:
+            list: (question_id, similarity) pairs at or above the threshold
+        """
+        with self._lock:
+            candidates = set()
+            for band in range(BANDS):
+                candidates |= self._buckets[band].get(sig[band * ROWS:(band + 1) * ROWS].tobytes(), set())
+            candidates.discard(exclude)
+            matches = [(qid, similarity(sig, self._signatures[qid])) for qid in candidates]
+        matches = [m for m in matches if m[1] >= self.threshold]
+        matches.sort(key=lambda m: m[1], reverse=True)
+        return matches
+
+    def load_new(self, collection, batch_size=5000):
+        """
+        Index questions not seen yet, re-reading REFRESH_OVERLAP behind the
+        watermark.
+
+        Returns:
+            int: number of questions added
+        """
+        with self._lock:
+            query = {"text": {"$type": "string"}}
+            if self._watermark is not None:
+                since = self._watermark.generation_time - REFRESH_OVERLAP
+                query["_id"] = {"$gt": ObjectId.from_datetime(since)}
+            added = 0
+            for q in collection.find(query, {"text": 1}).sort("_id", 1).batch_size(batch_size):
+                if q["_id"] not in self._signatures:
+                    self.add(q["_id"], signature(q["text"]))
+                    added += 1
+                if self._watermark is None or q["_id"] > self._watermark:
+                    self._watermark = q["_id"]
+            self._refreshed_at = time.monotonic()
+            return added
+
+    def refresh_if_stale(self, collection):
+        if time.monotonic() - self._refreshed_at >= REFRESH_SECONDS:
+            self.load_new(collection)
+
+
+_index = None
+_index_loading = False
+_index_lock = threading.Lock()
+
+
+def _load_index(collection):
+    global _index, _index_loading
+    try:
+        index = NearDuplicateIndex()
+        started = time.monotonic()
+        index.load_new(collection)
+        _index = index
+        logger.info("Near-duplicate index loaded: %d questions in %.1fs", len(index), time.monotonic() - started)
+    except Exception:
+        logger.exception("Near-duplicate index load failed")
+    finally:
+        with _index_lock:
+            _index_loading = False
+
+
+def start_index_load():
+    """Load the process index on a background thread, unless it is loaded or loading"""
+    global _index_loading
+    if MODE == "off":
+        return
+    with _index_lock:
+        if _index is not None or _index_loading:
+            return
+        _index_loading = True
+    threading.Thread(target=_load_index, args=(mongo.db.questions,), name="dedup-index-load", daemon=True).start()
+
+
+def get_index():
+    """Process-wide index over `questions`, or None while it is still loading"""
+    index = _index
+    if index is None:
+        start_index_load()
+        return None
+    index.refresh_if_stale(mongo.db.questions)
+    return index
+
+
+def screen_near_duplicates(docs, mode=None):
+    """
+    Check new question docs against the bank and each other.
+
+    Accepted docs get an `_id` (if missing). Until the process index has
+    loaded, docs are only checked against each other. Nothing is added to
+    the process index here; pass the docs that were actually inserted to
+    `index_questions`. In "flag" mode, near duplicates are accepted with
+    `nearDuplicateOf` and `similarity` set.
+
+    Returns:
+        tuple: (accepted docs, rejected docs)
+    """
+    mode = mode or MODE
+    if mode == "off" or not docs:
+        return list(docs), []
+    index = get_index()
+    # Earlier docs of this batch, so later ones are compared against them too
+    batch = NearDuplicateIndex()
+    accepted, rejected = [], []
+    for doc in docs:
+        sig = signature(doc.get("text", ""))
+        matches = batch.query(sig)
+        if index is not None:
+            matches = sorted(index.query(sig) + matches, key=lambda m: m[1], reverse=True)
+        if matches:
+            if mode == "reject":
+                rejected.append(doc)
+                continue
+            doc["nearDuplicateOf"], doc["similarity"] = matches[0][0], round(matches[0][1], 3)
+        doc.setdefault("_id", ObjectId())
+        batch.add(doc["_id"], sig)
+        accepted.append(doc)
+    return accepted, rejected
+
+
+def index_questions(docs):
+    """Add inserted question docs to the process index"""
+    if MODE == "off" or not docs:
+        return
+    index = get_index()
+    if index is None:
+        # The load in progress (or a later refresh) picks them up
+        return
+    for doc in docs:
+        index.add(doc["_id"], signature(doc.get("text", "")))
+
+
+def cluster_questions(collection, threshold=THRESHOLD):
+    """
+    Group the whole bank into clusters of near-identical questions.
+
+    Returns:
+        list: clusters (lists of question _ids, oldest first) with 2+ members
+    """
+    index = NearDuplicateIndex(threshold=threshold)
+    index.load_new(collection)
+
+    parent = {}
+
+    def find(x):
+        while parent.get(x, x) != x:
+            parent[x] = parent.get(parent[x], parent[x])
+            x = parent[x]
+        return x
+
+    for qid, sig in list(index._signatures.items()):
+        for other, _ in index.query(sig, exclude=qid):
+            a, b = find(qid), find(other)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    clusters = {}
+    for qid in parent:
+        clusters.setdefault(find(qid), set()).add(qid)
+    for root, members in clusters.items():
+        members.add(root)
+    return [sorted(members) for members in clusters.values() if len(members) > 1]
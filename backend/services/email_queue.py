@@ -0,0 +1,223 @@
+"""
+Email Queue Service - Non-blocking outbound email delivery
+
+Requests enqueue messages and return at once; a background sender thread per
+process drains the queue. Messages that share a subject and HTML template
+within a short window go out in one Brevo call as `messageVersions` (each
+version carries its own recipient and params), so a login surge becomes a
+few API calls instead of one per OTP. Failed sends are retried with
+exponential backoff; client errors other than 429 are not retried. A batch
+rejected with such an error is split in halves and resent, so only the
+message that caused it (e.g. an invalid address) is dropped.
+
+The queue lives in memory: messages still queued when a process dies are
+lost, which for OTPs just means the user requests a new one.
+
+EMAIL_TRANSPORT selects the transport: "brevo" (default when BREVO_API_KEY is
+set), "log" (default otherwise; logs the params for local development) or
+"memory" (records batches, for tests).
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SENDER = {"name": "Skillatics", "email": "synaptrix4@gmail.com"}
+
+# Brevo accepts up to 1000 message versions per call
+BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+# Seconds the sender waits for more messages to join a batch
+LINGER_SECONDS = float(os.getenv("EMAIL_LINGER_SECONDS", "0.2"))
+MAX_RETRIES = 4
+BASE_DELAY = 1.0
+
+
+class TransportError(Exception):
+    """A send failed; `retryable` tells the queue whether to try again"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class BrevoTransport:
+    """Brevo transactional API with one pooled client per process"""
+
+    def __init__(self, api_key=None, pool_size=4):
+        import sib_api_v3_sdk
+        from sib_api_v3_sdk.rest import ApiException
+
+        api_key = api_key or os.getenv("BREVO_API_KEY")
+        if not api_key:
+            raise RuntimeError("BREVO_API_KEY is not configured.")
+        configuration = sib_api_v3_sdk.Configuration()
+        configuration.api_key["api-key"] = api_key
+        configuration.connection_pool_maxsize = pool_size
+        self._sdk = sib_api_v3_sdk
+        self._api_exception = ApiException
+        self._api = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
+
+    def send(self, subject, html, messages):
+        versions = [{"to": [{"email": m["to"]}], "params": m["params"]} for m in messages]
+        email = self._sdk.SendSmtpEmail(
+            sender=SENDER, subject=subject, html_content=html, message_versions=versions
+        )
+        try:
+            self._api.send_transac_email(email)
+        except self._api_exception as e:
+            raise TransportError(str(e), retryable=e.status == 429 or (e.status or 500) >= 500) from e
+
+
+class LogTransport:
+    """Development transport: logs recipients and params instead of sending"""
+
+    def send(self, subject, html, messages):
+        for m in messages:
+            logger.warning("Email not sent (no BREVO_API_KEY): %r to %s, params %s", subject, m["to"], m["params"])
+
+
+class MemoryTransport:
+    """
+    Test transport recording each batch. The first sends raise the given
+    `errors` in order, or a retryable TransportError `fail_times` times.
+    """
+
+    def __init__(self, fail_times=0, errors=()):
+        self.batches = []
+        self.errors = list(errors) or [TransportError("simulated failure") for _ in range(fail_times)]
+        self.attempts = 0
+        self._lock = threading.Lock()
+
+    def send(self, subject, html, messages):
+        with self._lock:
+            self.attempts += 1
+            if self.errors:
+                raise self.errors.pop(0)
+            self.batches.append({"subject": subject, "html": html, "messages": list(messages)})
+
+    @property
+    def sent(self):
+        with self._lock:
+            return [m for b in self.batches for m in b["messages"]]
+
+
+def make_transport(name=None):
+    name = name or os.getenv("EMAIL_TRANSPORT") or ("brevo" if os.getenv("BREVO_API_KEY") else "log")
+    if name == "brevo":
+        return BrevoTransport()
+    if name == "memory":
+        return MemoryTransport()
+    return LogTransport()
+
+
+class EmailQueue:
+    """In-process queue drained by a lazily started daemon sender thread"""
+
+    def __init__(self, transport, batch_size=BATCH_SIZE, linger=LINGER_SECONDS,
+                 max_retries=MAX_RETRIES, base_delay=BASE_DELAY, sleep=time.sleep):
+        self.transport = transport
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._sleep = sleep
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, to, subject, html, params=None):
+        """Queue one email; `html` may reference {{ params.<name> }}"""
+        self._queue.put({"to": to, "subject": subject, "html": html, "params": params or {}})
+        self._ensure_sender()
+
+    def _ensure_sender(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="email-sender", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        """Block for one message, then collect more for up to `linger` seconds"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send_with_retry(self, subject, html, messages):
+        """
+        Returns:
+            int: number of messages the transport accepted
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.transport.send(subject, html, messages)
+                return len(messages)
+            except Exception as e:
+                retryable = getattr(e, "retryable", True)
+                if not retryable and len(messages) > 1:
+                    # One bad message rejects the whole call; find it by bisecting
+                    half = len(messages) // 2
+                    return (self._send_with_retry(subject, html, messages[:half])
+                            + self._send_with_retry(subject, html, messages[half:]))
+                if not retryable or attempt == self.max_retries:
+                    logger.error("Dropping %d emails (%r): %s", len(messages), subject, e)
+                    return 0
+                delay = self.base_delay * (2 ** attempt) * (1 + random.random() / 2)
+                logger.warning("Email send failed, retrying in %.1fs: %s", delay, e)
+                self._sleep(delay)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            groups = {}
+            for m in batch:
+                groups.setdefault((m["subject"], m["html"]), []).append(m)
+            try:
+                for (subject, html), messages in groups.items():
+                    sent = self._send_with_retry(subject, html, messages)
+                    if sent:
+                        logger.info("Sent %d emails (%r)", sent, subject)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued email has been handed to the transport.
+
+        Returns:
+            bool: False if `timeout` seconds passed first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+_email_queue = None
+_email_queue_lock = threading.Lock()
+
+
+def get_email_queue():
+    """Process-wide queue, so the transport's connection pool is shared"""
+    global _email_queue
+    with _email_queue_lock:
+        if _email_queue is None:
+            _email_queue = EmailQueue(make_transport())
+            # Give queued emails a moment to go out on a clean shutdown
+            atexit.register(_email_queue.flush, 5)
+        return _email_queue
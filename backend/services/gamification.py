@@ -1,9 +1,16 @@
 """
 Gamification Service - Handles XP, levels, badges, and achievements
 """
-from datetime import datetime, timedelta
+import os
+from datetime import datetime, timedelta, date
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from bson import ObjectId
 from extensions import mongo
+from services.platform_stats import record_xp_change, record_badge_awarded
+from services.user_cache import get_user, update_user
+
+# Timezone used for streak days when the user has not set one
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "UTC")
 
 # Achievement Definitions
 ACHIEVEMENTS = {
@@ -141,7 +148,7 @@ def calculate_xp_reward(score, total_questions, difficulty_avg=3, time_taken_sec
 
 def update_user_xp(user_id, xp_to_add):
     """Add XP to user and update level"""
-    user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
+    user = get_user(user_id, fresh=True)
     if not user:
         return None
     
@@ -149,12 +156,13 @@ def update_user_xp(user_id, xp_to_add):
     new_xp = current_xp + xp_to_add
     new_level = calculate_level(new_xp)
     old_level = calculate_level(current_xp)
+    stored_level = user.get("level")
     
     # Check if leveled up
     leveled_up = new_level > old_level
     
-    mongo.db.users.update_one(
-        {"_id": ObjectId(user_id)},
+    update_user(
+        user_id,
         {
             "$set": {
                 "xp": new_xp,
@@ -163,6 +171,13 @@ def update_user_xp(user_id, xp_to_add):
         }
     )
     
+    # Keep the platform-wide counters in sync
+    record_xp_change(
+        xp_to_add,
+        level_delta=new_level - (stored_level or 0),
+        new_student=stored_level is None
+    )
+    
     return {
         "new_xp": new_xp,
         "xp_gained": xp_to_add,
@@ -173,12 +188,85 @@ def update_user_xp(user_id, xp_to_add):
     }
 
 
+def get_user_timezone(user):
+    """Resolve the user's timezone, falling back to DEFAULT_TIMEZONE"""
+    for tz_name in [(user or {}).get("timezone"), DEFAULT_TIMEZONE]:
+        if not tz_name:
+            continue
+        try:
+            return ZoneInfo(tz_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            continue
+    return ZoneInfo("UTC")
+
+
+def local_day(user, when=None):
+    """Calendar day of a naive-UTC datetime in the user's timezone"""
+    when = when or datetime.utcnow()
+    return when.replace(tzinfo=ZoneInfo("UTC")).astimezone(get_user_timezone(user)).date()
+
+
+def get_current_streak(user, when=None):
+    """
+    Streak as of today. A streak survives until the end of the day after
+    the last active day, after which it is broken.
+    """
+    streak = (user or {}).get("streak") or {}
+    last_day = streak.get("lastActiveDay")
+    if not last_day:
+        return 0
+    days_since = (local_day(user, when) - date.fromisoformat(last_day)).days
+    return streak.get("current", 0) if days_since <= 1 else 0
+
+
+def update_streak(user_id, user=None, when=None):
+    """
+    Record activity for the user's local day and update the streak state in O(1).
+
+    The write only applies if the streak's lastActiveDay is still the one
+    read, so concurrent finishes cannot both extend it; the loser re-reads
+    the user and sees the day already counted.
+
+    Returns:
+        dict: Streak state (lastActiveDay, current, longest)
+    """
+    for _ in range(3):
+        if not user:
+            user = get_user(user_id, fresh=True)
+        if not user:
+            return None
+
+        streak = user.get("streak") or {}
+        today = local_day(user, when)
+        last_day = streak.get("lastActiveDay")
+
+        # Already counted today
+        if last_day == today.isoformat():
+            return streak
+
+        if last_day and (today - date.fromisoformat(last_day)).days == 1:
+            current = streak.get("current", 0) + 1
+        else:
+            current = 1
+
+        new_streak = {
+            "lastActiveDay": today.isoformat(),
+            "current": current,
+            "longest": max(current, streak.get("longest", 0))
+        }
+        if update_user(user_id, {"$set": {"streak": new_streak}}, match={"streak.lastActiveDay": last_day}):
+            return new_streak
+        # Someone else updated the streak first (or the copy was stale)
+        user = None
+    return (get_user(user_id, fresh=True) or {}).get("streak")
+
+
 def check_and_award_achievements(user_id):
     """
     Check if user has earned new achievements and award them.
     Returns list of newly earned achievements.
     """
-    user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
+    user = get_user(user_id, fresh=True)
     if not user:
         return []
     
@@ -197,13 +285,14 @@ def check_and_award_achievements(user_id):
         # Check condition
         if achievement["condition"](user_data):
             # Award achievement
-            mongo.db.users.update_one(
-                {"_id": ObjectId(user_id)},
+            update_user(
+                user_id,
                 {
                     "$push": {"badges": achievement_id},
                     "$inc": {"xp": achievement["xp_bonus"]}
                 }
             )
+            record_badge_awarded(achievement["xp_bonus"])
             
             newly_earned.append({
                 "id": achievement_id,
@@ -219,7 +308,7 @@ def check_and_award_achievements(user_id):
 def gather_user_achievement_data(user_id, user=None):
     """Gather data needed for achievement checking"""
     if not user:
-        user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
+        user = get_user(user_id)
     
     # Count tests completed
     tests_completed = mongo.db.test_results.count_documents({"studentId": ObjectId(user_id)})
@@ -242,19 +331,8 @@ def gather_user_achievement_data(user_id, user=None):
         sort=[("completedAt", -1)]
     )
     
-    # Calculate streak (simplified - just check last 7 days)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_tests = list(mongo.db.test_results.find({
-        "studentId": ObjectId(user_id),
-        "completedAt": {"$gte": seven_days_ago}
-    }).sort("completedAt", 1))
-    
-    # Check for unique days with tests
-    test_dates = set()
-    for test in recent_tests:
-        test_dates.add(test["completedAt"].date())
-    
-    current_streak = len(test_dates)
+    # Streak state is maintained incrementally by update_streak
+    current_streak = get_current_streak(user)
     
     # Check for early/late tests
     has_early_test = bool(mongo.db.test_results.find_one({
@@ -269,18 +347,15 @@ def gather_user_achievement_data(user_id, user=None):
     
     # Topic statistics
     topic_stats = {}
+    # History items carry their question's topic, so no $lookup is needed
     pipeline = [
         {"$match": {"studentId": ObjectId(user_id)}},
+        {"$project": {"score": 1, "history.topic": 1}},
         {"$unwind": "$history"},
-        {"$lookup": {
-            "from": "questions",
-            "localField": "history.questionId",
-            "foreignField": "_id",
-            "as": "question"
-        }},
-        {"$unwind": "$question"},
+        # Items without a topic must not form a null "topic"
+        {"$match": {"history.topic": {"$ne": None}}},
         {"$group": {
-            "_id": "$question.topic",
+            "_id": "$history.topic",
             "high_scores": {
                 "$sum": {"$cond": [{"$gte": ["$score", 80]}, 1, 0]}
             }
@@ -348,7 +423,7 @@ def get_leaderboard(timeframe="all", limit=100):
 
 def get_user_rank(user_id):
     """Get user's current rank on leaderboard"""
-    user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
+    user = get_user(user_id)
     if not user:
         return None
     
@@ -0,0 +1,109 @@
+"""
+Generation Cache Service - Content-addressed cache of parsed AI responses
+
+Entries in `ai_response_cache` are keyed by sha256(model + prompt) and hold
+the unserved questions from model responses plus a `served` cursor.
+Callers claim unseen items atomically (across workers) before the model is
+called; each item is handed out once. Entries expire after
+GENERATION_CACHE_TTL_HOURS (TTL index on `expiresAt`), and the least
+recently used ones are evicted beyond GENERATION_CACHE_MAX_ENTRIES.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+
+TTL = timedelta(hours=float(os.getenv("GENERATION_CACHE_TTL_HOURS", "168")))
+MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "5000"))
+
+# Unserved items kept per entry
+MAX_ITEMS = 200
+
+# Size is checked every this many writes rather than on each one
+EVICT_EVERY = 50
+
+
+def cache_key(model, prompt):
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Mongo-backed prompt/response cache with consume-once items"""
+
+    def __init__(self, collection, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+
+    def take(self, models, prompt, count):
+        """
+        Claim up to `count` unserved items cached for `prompt` under any of
+        `models`.
+
+        Returns:
+            tuple: (items, model); items is empty on a miss
+        """
+        now = datetime.utcnow()
+        entry = self.collection.find_one_and_update(
+            {
+                "_id": {"$in": [cache_key(m, prompt) for m in models]},
+                "expiresAt": {"$gt": now},
+                "$expr": {"$lt": ["$served", {"$size": "$items"}]},
+            },
+            [{"$set": {
+                "served": {"$min": [{"$add": ["$served", count]}, {"$size": "$items"}]},
+                "lastUsedAt": now,
+            }}],
+            projection={"items": 1, "served": 1, "model": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if not entry:
+            return [], None
+        return entry["items"][entry["served"]:entry["served"] + count], entry["model"]
+
+    def put(self, model, prompt, items, served):
+        """
+        Add a response's items, the first `served` of which were already
+        handed out. A concurrent put for the same key appends rather than
+        replaces, and already served items are compacted away.
+        """
+        fresh = [{k: v for k, v in q.items() if k != "_id"} for q in items[served:]]
+        if not fresh:
+            return
+        now = datetime.utcnow()
+        # Unserved items of a live entry, then the new ones; $literal keeps
+        # "$..." in question text from being read as field paths
+        self.collection.update_one(
+            {"_id": cache_key(model, prompt)},
+            [{"$set": {
+                "model": model,
+                "items": {"$slice": [
+                    {"$concatArrays": [
+                        {"$cond": [
+                            {"$gt": ["$expiresAt", now]},
+                            {"$slice": [{"$ifNull": ["$items", []]}, {"$ifNull": ["$served", 0]}, MAX_ITEMS]},
+                            [],
+                        ]},
+                        {"$literal": fresh},
+                    ]},
+                    MAX_ITEMS,
+                ]},
+                "served": 0,
+                "createdAt": {"$ifNull": ["$createdAt", now]},
+                "lastUsedAt": now,
+                "expiresAt": now + self.ttl,
+            }}],
+            upsert=True,
+        )
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used entries beyond max_entries"""
+        excess = self.collection.estimated_document_count() - self.max_entries
+        if excess <= 0:
+            return 0
+        ids = [d["_id"] for d in self.collection.find({}, {"_id": 1}).sort("lastUsedAt", 1).limit(excess)]
+        return self.collection.delete_many({"_id": {"$in": ids}}).deleted_count
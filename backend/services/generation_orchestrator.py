@@ -0,0 +1,478 @@
+"""
+Generation Orchestrator Service - Concurrent AI question generation
+
+Fans (topic, difficulty, count) jobs out over a thread pool. Large counts are
+split into calls of at most CALL_SIZE questions. Every call goes through a
+per-model rate limiter and circuit breaker, retries with exponential backoff
+(falling through to the next model whose breaker is closed), and its output
+is validated before it is returned. `insert_generated` screens the results
+for near duplicates and bulk-inserts them.
+
+Responses are streamed when the client supports it and parsed incrementally:
+each array element is validated and yielded as soon as it is complete, and a
+malformed element is skipped rather than discarding the whole response. A
+call only fails over to the next model when it produced no valid question.
+
+With a response cache, every call asks the model for a full CALL_SIZE batch
+under one prompt per (topic, difficulty); items beyond what the caller needs
+are cached and served to later calls before the model is asked again.
+GENERATION_CACHE=0 disables the cache.
+
+The model client is injectable: anything with `generate(model, prompt) -> str`
+works, and `stream(model, prompt)` yielding text chunks is used if present. GENERATION_CLIENT=fake selects FakeModelClient, which needs neither the
+Gemini SDK nor network access.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pymongo.errors import BulkWriteError
+from extensions import mongo
+from metrics import observe_ai_generation
+from services.generation_cache import ResponseCache
+from services.dedup_index import index_questions, screen_near_duplicates
+from services.question_ingest import text_hash
+
+logger = logging.getLogger(__name__)
+
+# Models to try in order of preference; GEMINI_MODEL forces a single one
+DEFAULT_MODELS = ["gemini-2.5-flash", "gemini-2.0-flash", "gemini-flash-latest"]
+
+# Questions requested per model call
+CALL_SIZE = 10
+
+# Requests per minute allowed per model (per process)
+MODEL_RPM = int(os.getenv("GEMINI_RPM", "15"))
+MAX_WORKERS = int(os.getenv("GENERATION_WORKERS", "4"))
+MAX_RETRIES = 3
+BASE_DELAY = 1.0
+
+# Consecutive failures that open a model's breaker, and how long it stays open
+BREAKER_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 60
+
+
+def build_prompt(topic, difficulty, count):
+    topic_lower = (topic or "").lower()
+    if "general aptitude" in topic_lower:
+        topic_instruction = 'on various General Aptitude topics (like Quantitative Analysis, Logical Reasoning, Verbal Ability)'
+    elif "technical aptitude" in topic_lower:
+        topic_instruction = 'on various Technical Aptitude topics (like Computer Science, Programming, Data Structures, Algorithms, Operating Systems, Databases)'
+    elif topic_lower in ["mixed", "any", "mixed aptitude"] or not topic:
+        topic_instruction = 'on a mix of General Aptitude and Technical Computer Science topics'
+    else:
+        topic_instruction = f'on the topic "{topic}"'
+
+    return f"""
+        Generate {count} multiple-choice questions {topic_instruction} with a difficulty level of {difficulty} (on a scale of 1 to 5, where 5 is expert).
+
+        Return ONLY a raw JSON array. Do not wrap in markdown code blocks.
+
+        Each object in the array must have:
+        - "text": The question text (string)
+        - "options": An array of 4 distinct string options
+        - "answer": The correct option string (must be one of the options)
+        - "explanation": A brief explanation of why the answer is correct (string)
+
+        Ensure the questions are high quality and relevant to the topic.
+        """
+
+
+def validate_question(q, topic, difficulty):
+    """Question document for a generated item, or None if it is malformed"""
+    if not isinstance(q, dict) or not all(k in q for k in ["text", "options", "answer"]):
+        return None
+    if not isinstance(q["options"], list) or len(q["options"]) < 2 or q["answer"] not in q["options"]:
+        return None
+    q["difficulty"] = difficulty
+    q["topic"] = topic
+    q["type"] = "Technical Aptitude"
+    q["textHash"] = text_hash(q["text"])
+    return q
+
+
+def _decode(buf):
+    try:
+        return json.loads("".join(buf))
+    except ValueError:
+        return None
+
+
+def iter_json_array(chunks):
+    """
+    Yield the elements of the first JSON array in a stream of text chunks,
+    each as soon as it is complete. A malformed element yields None instead
+    of aborting the rest; an element cut off by the end of the stream is
+    dropped.
+
+    Raises:
+        ValueError: if the stream contains no array
+    """
+    started = in_string = escape = False
+    depth = 0
+    buf = []
+    for chunk in chunks:
+        for ch in chunk:
+            if not started:
+                started = ch == "["
+                continue
+            if in_string:
+                buf.append(ch)
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+                continue
+            if ch == "," and depth == 0:
+                if "".join(buf).strip():
+                    yield _decode(buf)
+                buf = []
+                continue
+            if ch == "]" and depth == 0:
+                if "".join(buf).strip():
+                    yield _decode(buf)
+                return
+            buf.append(ch)
+            if ch == '"':
+                in_string = True
+            elif ch in "{[":
+                depth += 1
+            elif ch in "}]" and depth > 0:
+                depth -= 1
+                if depth == 0:
+                    yield _decode(buf)
+                    buf = []
+    if not started:
+        raise ValueError("Could not find a valid JSON array in the response")
+
+
+def iter_questions(chunks, topic, difficulty):
+    """Validated questions from a streamed response, skipping malformed items"""
+    skipped = 0
+    for item in iter_json_array(chunks):
+        q = validate_question(item, topic, difficulty)
+        if q:
+            yield q
+        else:
+            skipped += 1
+    if skipped:
+        logger.info("Skipped %d malformed generated items", skipped)
+
+
+def parse_questions(text, topic, difficulty):
+    """
+    Extract and validate the JSON array in a model response.
+
+    Raises:
+        ValueError: if there is no array or no valid question in it
+    """
+    questions = list(iter_questions([text or ""], topic, difficulty))
+    if not questions:
+        raise ValueError("Generated JSON contained no valid questions")
+    return questions
+
+
+class GeminiClient:
+    """Model client backed by the google-generativeai SDK"""
+
+    def __init__(self, api_key=None):
+        import google.generativeai as genai
+
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY is not configured.")
+        genai.configure(api_key=api_key)
+        self._genai = genai
+
+    def generate(self, model, prompt):
+        return self._genai.GenerativeModel(model).generate_content(prompt).text
+
+    def stream(self, model, prompt):
+        for chunk in self._genai.GenerativeModel(model).generate_content(prompt, stream=True):
+            yield chunk.text
+
+
+class FakeModelClient:
+    """Offline client returning deterministic, valid question arrays"""
+
+    def __init__(self, latency=0.0, fail_models=()):
+        self.latency = latency
+        self.fail_models = set(fail_models)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, model, prompt):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        if model in self.fail_models:
+            raise RuntimeError(f"{model} unavailable")
+        count = int(prompt.split("Generate ", 1)[1].split(" ", 1)[0])
+        items = [
+            {
+                "text": f"Sample question {call}-{i}: what is {call * 31 + i} + {i * 7}?",
+                "options": [str(call * 31 + i * 8 + k) for k in range(4)],
+                "answer": str(call * 31 + i * 8),
+                "explanation": "Add the two numbers.",
+            }
+            for i in range(count)
+        ]
+        return json.dumps(items)
+
+    def stream(self, model, prompt, chunk_size=64):
+        text = self.generate(model, prompt)
+        for i in range(0, len(text), chunk_size):
+            yield text[i:i + chunk_size]
+
+
+class RateLimiter:
+    """Token bucket allowing `rate_per_minute` calls, waiting for a token when empty"""
+
+    def __init__(self, rate_per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = max(1, rate_per_minute)
+        self.refill_per_second = rate_per_minute / 60.0
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.refill_per_second
+            self._sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures; after `reset_seconds` lets a
+    single trial call through (half-open) and closes again if it succeeds.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.threshold:
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+
+class GenerationUnavailable(Exception):
+    """Every model failed or has an open circuit"""
+
+
+class GenerationOrchestrator:
+    """Runs generation jobs concurrently with per-model limits"""
+
+    def __init__(self, client, models=None, max_workers=MAX_WORKERS, max_retries=MAX_RETRIES,
+                 base_delay=BASE_DELAY, rpm=MODEL_RPM, sleep=time.sleep, clock=time.monotonic, cache=None):
+        self.client = client
+        self.cache = cache
+        self.models = models or DEFAULT_MODELS
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._sleep = sleep
+        self._limiters = {m: RateLimiter(rpm, clock=clock, sleep=sleep) for m in self.models}
+        self.breakers = {m: CircuitBreaker(clock=clock) for m in self.models}
+
+    def _chunks(self, model, prompt):
+        stream = getattr(self.client, "stream", None)
+        if stream:
+            return stream(model, prompt)
+        return [self.client.generate(model, prompt)]
+
+    def _stream_call(self, topic, difficulty, count):
+        """
+        Yield up to `count` validated questions from one call, retried with
+        backoff across available models until one produces a valid question.
+        """
+        if self.cache:
+            prompt = build_prompt(topic, difficulty, max(count, CALL_SIZE))
+            cached, model = self.cache.take(self.models, prompt, count)
+            if cached:
+                logger.debug("Served %d cached questions", len(cached), extra={"model": model})
+                yield from cached
+                return
+        else:
+            prompt = build_prompt(topic, difficulty, count)
+
+        last_error = None
+        for attempt in range(self.max_retries):
+            for model in self.models:
+                breaker = self.breakers[model]
+                if not breaker.allow():
+                    continue
+                self._limiters[model].acquire()
+                started = time.perf_counter()
+                questions, error = [], None
+                try:
+                    for q in iter_questions(self._chunks(model, prompt), topic, difficulty):
+                        questions.append(q)
+                        if len(questions) <= count:
+                            yield q
+                except GeneratorExit:
+                    # The caller stopped reading; the model itself was fine
+                    breaker.record_success()
+                    raise
+                except Exception as e:
+                    error = e
+                if not questions:
+                    error = error or ValueError("Generated JSON contained no valid questions")
+                    breaker.record_failure()
+                    observe_ai_generation(model, time.perf_counter() - started, error=error)
+                    logger.warning("Model %s failed: %s", model, error, extra={"model": model, "attempt": attempt + 1})
+                    last_error = error
+                    continue
+                if error:
+                    logger.warning("Model %s stream broke off after %d questions: %s", model, len(questions), error,
+                                   extra={"model": model})
+                breaker.record_success()
+                observe_ai_generation(model, time.perf_counter() - started)
+                if self.cache:
+                    self.cache.put(model, prompt, questions, served=min(count, len(questions)))
+                return
+            if attempt + 1 < self.max_retries:
+                self._sleep(self.base_delay * (2 ** attempt) * (1 + random.random() / 2))
+        raise GenerationUnavailable(str(last_error) if last_error else "All models have open circuits")
+
+    def stream(self, topic, difficulty, count):
+        """
+        Yield up to `count` questions for one topic/difficulty as they are
+        parsed.
+
+        Raises:
+            GenerationUnavailable: if the first call fails on every model
+        """
+        produced = 0
+        while produced < count:
+            before = produced
+            try:
+                for q in self._stream_call(topic, difficulty, min(CALL_SIZE, count - produced)):
+                    produced += 1
+                    yield q
+            except GenerationUnavailable:
+                if not produced:
+                    raise
+                return
+            if produced == before:
+                return
+
+    def generate(self, topic, difficulty, count):
+        """
+        Generate up to `count` questions for one topic/difficulty.
+
+        Raises:
+            GenerationUnavailable: if the first call fails on every model
+        """
+        return list(self.stream(topic, difficulty, count))
+
+    def run(self, jobs):
+        """
+        Run jobs ({topic, difficulty, count}) concurrently.
+
+        Returns:
+            list: per job, {topic, difficulty, requested, questions, error}
+        """
+        def run_job(job):
+            try:
+                questions = self.generate(job["topic"], job["difficulty"], job["count"])
+                error = None if len(questions) >= job["count"] else "Partially generated"
+            except GenerationUnavailable as e:
+                questions, error = [], str(e)
+            return {
+                "topic": job["topic"],
+                "difficulty": job["difficulty"],
+                "requested": job["count"],
+                "questions": questions,
+                "error": error,
+            }
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="generation") as pool:
+            return list(pool.map(run_job, jobs))
+
+
+def insert_generated(collection, questions):
+    """
+    Screen generated questions for near duplicates and bulk-insert the rest.
+
+    Returns:
+        tuple: (inserted ids, number rejected as near duplicates)
+    """
+    accepted, rejected = screen_near_duplicates(questions)
+    if not accepted:
+        return [], len(rejected)
+    try:
+        res = collection.insert_many(accepted, ordered=False)
+    except BulkWriteError as bwe:
+        failed = {err["index"] for err in bwe.details.get("writeErrors", [])}
+        index_questions([q for i, q in enumerate(accepted) if i not in failed])
+        raise
+    index_questions(accepted)
+    return res.inserted_ids, len(rejected)
+
+
+_orchestrator = None
+_orchestrator_lock = threading.Lock()
+
+
+def get_orchestrator():
+    """Process-wide orchestrator, so rate limits and breakers are shared"""
+    global _orchestrator
+    with _orchestrator_lock:
+        if _orchestrator is None:
+            if os.getenv("GENERATION_CLIENT") == "fake":
+                client = FakeModelClient()
+            else:
+                client = GeminiClient()
+            preferred = os.getenv("GEMINI_MODEL")
+            cache = ResponseCache(mongo.db.ai_response_cache) if os.getenv("GENERATION_CACHE", "1") != "0" else None
+            _orchestrator = GenerationOrchestrator(client, models=[preferred] if preferred else None, cache=cache)
+        return _orchestrator
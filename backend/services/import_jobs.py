@@ -0,0 +1,277 @@
+"""
+Import Jobs Service - Background question bank imports with progress
+
+An upload is spooled to IMPORT_SPOOL_DIR and recorded in `import_jobs`; the
+request returns at once with the job id. A worker claims queued jobs under a
+lease and ingests the file in chunks, checkpointing the number of rows done
+after each one. If a worker dies, its lease expires and the next worker
+resumes from the checkpoint; rows of a half-written chunk are then found by
+their text hash and counted as duplicates, so nothing is inserted twice.
+
+Jobs run in scripts/import_worker.py (Procfile `worker`) when
+IMPORT_WORKER_MODE=external, otherwise in a background thread of the web
+process that accepted the upload. Every process that may run jobs must see
+the same IMPORT_SPOOL_DIR.
+"""
+import csv
+import itertools
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import current_app
+from pymongo import ReturnDocument
+from extensions import mongo
+from services.dedup_index import index_questions, screen_near_duplicates
+from services.question_ingest import (
+    CHUNK_SIZE, ingest_rows, iter_json_rows, iter_xlsx_rows, open_csv
+)
+
+SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "skillatics-imports"))
+WORKER_MODE = os.getenv("IMPORT_WORKER_MODE", "thread")
+
+# Extension -> format
+FORMATS = {".csv": "csv", ".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl", ".xlsx": "xlsx"}
+
+# A job whose lease is not renewed within this window is taken over
+LEASE = timedelta(minutes=5)
+
+# Per-row errors kept on the job document; errorCount has the full total
+MAX_STORED_ERRORS = 1000
+
+# Claims before a job failing with unexpected errors is marked failed, and
+# the wait before an interrupted job is retried
+MAX_ATTEMPTS = 3
+RETRY_DELAY = timedelta(seconds=30)
+
+logger = logging.getLogger(__name__)
+
+_thread_lock = threading.Lock()
+
+
+class LeaseLost(RuntimeError):
+    """Another worker took over the job"""
+
+
+def detect_format(filename):
+    """Return the import format for a filename, or None if unsupported"""
+    return FORMATS.get(os.path.splitext(filename or "")[1].lower())
+
+
+def create_job(file_storage, user_id):
+    """
+    Spool an uploaded file to disk and queue an import job for it.
+
+    Returns:
+        dict: the job document
+    """
+    fmt = detect_format(file_storage.filename)
+    job_id = ObjectId()
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    path = os.path.join(SPOOL_DIR, f"{job_id}{os.path.splitext(file_storage.filename)[1].lower()}")
+    file_storage.save(path)
+
+    job = {
+        "_id": job_id,
+        "filename": file_storage.filename,
+        "format": fmt,
+        "path": path,
+        "status": "queued",
+        "createdBy": ObjectId(user_id),
+        "createdAt": datetime.utcnow(),
+        "rowsDone": 0,
+        "inserted": 0,
+        "duplicates": 0,
+        "nearDuplicates": 0,
+        "flagged": 0,
+        "errorCount": 0,
+        "errors": [],
+        "attempts": 0,
+        "leaseUntil": None,
+    }
+    mongo.db.import_jobs.insert_one(job)
+    return job
+
+
+def get_job(job_id):
+    """Job progress for the API, with rows/s over the running time"""
+    job = mongo.db.import_jobs.find_one({"_id": job_id}, {"path": 0, "leaseUntil": 0})
+    if not job:
+        return None
+    started = job.get("startedAt")
+    if started:
+        elapsed = ((job.get("finishedAt") or datetime.utcnow()) - started).total_seconds()
+        job["elapsedSeconds"] = round(elapsed, 1)
+        job["rowsPerSecond"] = round(job["rowsDone"] / elapsed, 1) if elapsed > 0 else None
+    return job
+
+
+def _claimable(now):
+    return {"$or": [
+        {"status": "queued", "retryAt": {"$not": {"$gt": now}}},
+        {"status": "running", "leaseUntil": {"$lt": now}},
+    ]}
+
+
+def claim_job(worker_id):
+    """Lease the oldest queued job, or a running one whose worker went away"""
+    now = datetime.utcnow()
+    return mongo.db.import_jobs.find_one_and_update(
+        _claimable(now),
+        {"$set": {"status": "running", "worker": worker_id, "leaseUntil": now + LEASE},
+         "$min": {"startedAt": now},
+         "$inc": {"attempts": 1}},
+        sort=[("createdAt", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _open_rows(job):
+    """Row iterator for the job's file and the row number of its first row"""
+    if job["format"] == "csv":
+        f = open(job["path"], "rb")
+        return open_csv(f), 2, f
+    if job["format"] in ["json", "jsonl"]:
+        f = open(job["path"], "rb")
+        return iter_json_rows(f, lines=job["format"] == "jsonl"), 1, f
+    if job["format"] == "xlsx":
+        return iter_xlsx_rows(job["path"]), 2, None
+    raise ValueError(f"Unsupported import format: {job['format']}")
+
+
+def run_job(job, worker_id):
+    """
+    Ingest a claimed job from its checkpoint, renewing the lease per chunk.
+
+    Returns:
+        bool: False if the job was requeued or taken over instead of finished
+    """
+    base = {k: job.get(k, 0) for k in ["rowsDone", "inserted", "duplicates", "nearDuplicates", "flagged", "errorCount"]}
+    reported_errors = [0]
+    handle = None
+
+    def checkpoint(consumed, result):
+        new_errors = result["errors"][reported_errors[0]:]
+        reported_errors[0] = len(result["errors"])
+        update = {
+            "$set": {
+                "rowsDone": base["rowsDone"] + consumed,
+                "inserted": base["inserted"] + result["inserted"],
+                "duplicates": base["duplicates"] + result["duplicates"],
+                "nearDuplicates": base["nearDuplicates"] + result["nearDuplicates"],
+                "flagged": base["flagged"] + result["flagged"],
+                "errorCount": base["errorCount"] + len(result["errors"]),
+                "leaseUntil": datetime.utcnow() + LEASE,
+            }
+        }
+        if new_errors:
+            update["$push"] = {"errors": {"$each": new_errors, "$slice": MAX_STORED_ERRORS}}
+        res = mongo.db.import_jobs.update_one({"_id": job["_id"], "worker": worker_id}, update)
+        if not res.matched_count:
+            raise LeaseLost()
+
+    try:
+        rows, first_row, handle = _open_rows(job)
+        skip = job.get("rowsDone", 0)
+        ingest_rows(
+            mongo.db.questions,
+            itertools.islice(rows, skip, None),
+            chunk_size=CHUNK_SIZE,
+            start=first_row + skip,
+            on_chunk=checkpoint,
+            screen=screen_near_duplicates,
+            on_insert=index_questions,
+        )
+        status, error = "done", None
+    except LeaseLost:
+        return False
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        # Bad file: retrying will not help
+        logger.warning("Import job %s failed: %s", job["_id"], e, extra={"jobId": str(job["_id"])})
+        status, error = "failed", str(e)
+    except Exception as e:
+        if job.get("attempts", 1) < MAX_ATTEMPTS:
+            logger.exception("Import job %s interrupted, requeued", job["_id"], extra={"jobId": str(job["_id"])})
+            mongo.db.import_jobs.update_one(
+                {"_id": job["_id"], "worker": worker_id},
+                {"$set": {"status": "queued", "leaseUntil": None, "retryAt": datetime.utcnow() + RETRY_DELAY}}
+            )
+            return False
+        logger.exception("Import job %s failed", job["_id"], extra={"jobId": str(job["_id"])})
+        status, error = "failed", str(e)
+    finally:
+        if handle:
+            handle.close()
+
+    mongo.db.import_jobs.update_one(
+        {"_id": job["_id"], "worker": worker_id},
+        {"$set": {"status": status, "error": error, "finishedAt": datetime.utcnow(), "leaseUntil": None}}
+    )
+    try:
+        os.remove(job["path"])
+    except OSError:
+        pass
+    return True
+
+
+def process_jobs(worker_id=None, max_jobs=None):
+    """
+    Claim and run jobs until the queue is empty.
+
+    Returns:
+        int: number of jobs processed
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        job = claim_job(worker_id)
+        if not job:
+            break
+        logger.info("Processing import job %s (%s)", job["_id"], job["filename"], extra={"jobId": str(job["_id"])})
+        processed += 1
+        if not run_job(job, worker_id):
+            break
+    return processed
+
+
+def _has_claimable_job():
+    return mongo.db.import_jobs.count_documents(_claimable(datetime.utcnow()), limit=1) > 0
+
+
+def _run_in_background(app):
+    with app.app_context():
+        while True:
+            try:
+                process_jobs()
+            except Exception:
+                logger.exception("Background import failed")
+            _thread_lock.release()
+            # A job queued while the queue was draining would otherwise wait
+            # for the next upload
+            if not _has_claimable_job() or not _thread_lock.acquire(blocking=False):
+                return
+
+
+def start_background_worker():
+    """
+    Drain the queue in a background thread unless an external worker does.
+    Also called when a job is polled, so jobs orphaned by a crashed process
+    are resumed once their lease expires.
+    """
+    if WORKER_MODE == "external":
+        return
+    if not _thread_lock.acquire(blocking=False):
+        return
+    app = current_app._get_current_object()
+    threading.Thread(target=_run_in_background, args=(app,), daemon=True).start()
+
+
+def run_worker(poll_seconds=2.0):
+    """Long-running worker loop for scripts/import_worker.py"""
+    while True:
+        if not process_jobs():
+            time.sleep(poll_seconds)
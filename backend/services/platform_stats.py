@@ -0,0 +1,108 @@
+"""
+Platform Stats Service - Maintains pre-aggregated, platform-wide gamification counters
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from extensions import mongo
+
+logger = logging.getLogger(__name__)
+
+# Single document in `platform_stats` holding the gamification counters
+STATS_ID = "gamification"
+
+# How old the last full recompute may get before a background reconcile is kicked off
+RECONCILE_INTERVAL = timedelta(minutes=int(os.getenv("PLATFORM_STATS_RECONCILE_MINUTES", "15")))
+
+_reconcile_lock = threading.Lock()
+
+
+def record_xp_change(xp_delta, level_delta=0, new_student=False):
+    """
+    Apply an XP/level change for one student to the platform counters.
+
+    Args:
+        xp_delta: XP added to the student
+        level_delta: Change of the student's stored level
+        new_student: True the first time the student gets a stored level
+    """
+    inc = {"total_xp": xp_delta, "level_sum": level_delta}
+    if new_student:
+        inc["level_count"] = 1
+    mongo.db.platform_stats.update_one({"_id": STATS_ID}, {"$inc": inc}, upsert=True)
+
+
+def record_badge_awarded(xp_bonus):
+    """Count a newly awarded badge (and its XP bonus) in the platform counters"""
+    mongo.db.platform_stats.update_one(
+        {"_id": STATS_ID},
+        {"$inc": {"total_badges": 1, "total_xp": xp_bonus}},
+        upsert=True
+    )
+
+
+def compute_platform_stats():
+    """Recompute the counters from scratch over all Student users"""
+    pipeline = [
+        {"$match": {"role": "Student"}},
+        {"$group": {
+            "_id": None,
+            "total_xp": {"$sum": "$xp"},
+            "level_sum": {"$sum": "$level"},
+            "level_count": {"$sum": {"$cond": [{"$ifNull": ["$level", False]}, 1, 0]}},
+            "total_badges": {"$sum": {"$size": {"$ifNull": ["$badges", []]}}}
+        }}
+    ]
+    stats = list(mongo.db.users.aggregate(pipeline))
+    if not stats:
+        return {"total_xp": 0, "level_sum": 0, "level_count": 0, "total_badges": 0}
+    stats[0].pop("_id", None)
+    return stats[0]
+
+
+def reconcile_platform_stats():
+    """Overwrite the stored counters with a full recompute to correct drift"""
+    counters = compute_platform_stats()
+    mongo.db.platform_stats.update_one(
+        {"_id": STATS_ID},
+        {"$set": {**counters, "reconciledAt": datetime.utcnow()}},
+        upsert=True
+    )
+    return counters
+
+
+def _reconcile_in_background(app):
+    try:
+        with app.app_context():
+            reconcile_platform_stats()
+    except Exception:
+        logger.exception("Platform stats reconcile failed")
+    finally:
+        _reconcile_lock.release()
+
+
+def schedule_reconcile_if_stale(stats_doc):
+    """Start a background reconcile if the counters were never or not recently recomputed"""
+    reconciled_at = (stats_doc or {}).get("reconciledAt")
+    if reconciled_at and datetime.utcnow() - reconciled_at < RECONCILE_INTERVAL:
+        return
+    # Only one reconcile per process at a time
+    if not _reconcile_lock.acquire(blocking=False):
+        return
+    app = current_app._get_current_object()
+    threading.Thread(target=_reconcile_in_background, args=(app,), daemon=True).start()
+
+
+def get_platform_stats():
+    """
+    Read the platform counters from their single document.
+
+    Falls back to a synchronous recompute when the document does not exist yet.
+    """
+    doc = mongo.db.platform_stats.find_one({"_id": STATS_ID})
+    if not doc or "reconciledAt" not in doc:
+        return reconcile_platform_stats()
+    schedule_reconcile_if_stale(doc)
+    return doc
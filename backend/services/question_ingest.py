@@ -0,0 +1,251 @@
+"""
+Question Ingest Service - Streaming, batched question bank imports
+
+Uploads are decoded and validated row by row, valid rows are inserted in
+unordered `insert_many` chunks, and questions whose normalized text already
+exists (in the bank or earlier in the same file) are skipped as duplicates.
+Rows come from CSV, JSON / JSON Lines or XLSX files.
+"""
+import csv
+import hashlib
+import io
+import json
+import re
+import unicodedata
+from pymongo.errors import BulkWriteError
+
+# Columns a question CSV must have; options are pipe-separated: opt1|opt2|opt3
+REQUIRED_COLUMNS = {"text", "topic", "difficulty", "type", "options", "answer"}
+
+QUESTION_TYPES = ["General Aptitude", "Technical Aptitude"]
+LEGACY_TYPES = {
+    "Aptitude": "General Aptitude",
+    "Technical": "Technical Aptitude",
+}
+
+# Rows per insert_many call
+CHUNK_SIZE = 1000
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Case-, width- and whitespace-insensitive form of a question text"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def text_hash(text):
+    """Stable hash of the normalized question text, stored as `textHash`"""
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _cell(row, key):
+    value = row.get(key)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # spreadsheet numbers
+    return "" if value is None else str(value).strip()
+
+
+def parse_question_row(row):
+    """
+    Validate one row and build the question document. Options may be a list
+    or a pipe-separated string.
+
+    Raises:
+        ValueError: with a message suitable for the per-row error report
+    """
+    text = _cell(row, "text")
+    topic = _cell(row, "topic")
+    raw_diff = _cell(row, "difficulty")
+    raw_type = _cell(row, "type")
+    answer = _cell(row, "answer")
+    raw_options = row.get("options")
+    if isinstance(raw_options, list):
+        options = [str(o).strip() for o in raw_options if o is not None and str(o).strip()]
+    else:
+        options = [o.strip() for o in _cell(row, "options").split("|") if o.strip()]
+
+    if not text or not topic or not raw_diff or not raw_type or not options or not answer:
+        raise ValueError("Missing required fields")
+
+    try:
+        difficulty = int(raw_diff)
+    except ValueError:
+        raise ValueError("Invalid difficulty")
+    if difficulty < 1 or difficulty > 5:
+        raise ValueError("Invalid difficulty range (1-5)")
+
+    qtype = LEGACY_TYPES.get(raw_type, raw_type)
+    if qtype not in QUESTION_TYPES:
+        raise ValueError("Invalid type")
+
+    if len(options) < 2:
+        raise ValueError("At least two options required")
+    if answer not in options:
+        raise ValueError("Answer must be match one of the options exactly")
+
+    return {
+        "text": text,
+        "topic": topic,
+        "difficulty": difficulty,
+        "type": qtype,
+        "options": options,
+        "answer": answer,
+        "textHash": text_hash(text),
+    }
+
+
+def _check_columns(columns, kind):
+    if not REQUIRED_COLUMNS.issubset({c.strip() for c in columns if c}):
+        raise ValueError(f"{kind} must include columns: text, topic, difficulty, type, options, answer")
+
+
+def _decode_lines(binary_stream):
+    """
+    Decode a binary stream line by line, so invalid UTF-8 fails at its own
+    row rather than up to a whole read buffer earlier.
+    """
+    for n, raw in enumerate(binary_stream):
+        yield raw.decode("utf-8-sig" if n == 0 else "utf-8")
+
+
+def open_csv(binary_stream):
+    """
+    Wrap an uploaded file's binary stream in a streaming DictReader.
+
+    Raises:
+        ValueError: if the header lacks a required column
+    """
+    reader = csv.DictReader(_decode_lines(binary_stream))
+    _check_columns(reader.fieldnames or [], "CSV")
+    reader.fieldnames = [c.strip() for c in reader.fieldnames]
+    return reader
+
+
+def iter_json_rows(binary_stream, lines=False):
+    """
+    Yield question objects from a JSON array (or {"questions": [...]}), or
+    one per line for JSON Lines.
+    """
+    if lines:
+        for line in io.TextIOWrapper(binary_stream, encoding="utf-8-sig"):
+            if line.strip():
+                item = json.loads(line)
+                yield item if isinstance(item, dict) else {}
+        return
+    data = json.load(io.TextIOWrapper(binary_stream, encoding="utf-8-sig"))
+    if isinstance(data, dict):
+        data = data.get("questions")
+    if not isinstance(data, list):
+        raise ValueError("JSON must be an array of questions")
+    for item in data:
+        yield item if isinstance(item, dict) else {}
+
+
+def iter_xlsx_rows(path):
+    """Yield one dict per row of the first worksheet, keyed by the header row"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("XLSX imports need openpyxl installed")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(c).strip() if c is not None else "" for c in next(rows, ())]
+        _check_columns(header, "XLSX")
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _flush(collection, batch, result, screen=None, on_insert=None):
+    """Insert a batch of (row, doc) pairs, skipping hashes already in the bank"""
+    hashes = [doc["textHash"] for _, doc in batch]
+    existing = {d["textHash"] for d in collection.find({"textHash": {"$in": hashes}}, {"textHash": 1, "_id": 0})}
+    pending = []
+    for row, doc in batch:
+        if doc["textHash"] in existing:
+            result["duplicates"] += 1
+        else:
+            pending.append((row, doc))
+    if screen and pending:
+        accepted, rejected = screen([doc for _, doc in pending])
+        result["nearDuplicates"] += len(rejected)
+        result["flagged"] += sum(1 for doc in accepted if "nearDuplicateOf" in doc)
+        accepted_ids = {id(doc) for doc in accepted}
+        pending = [(row, doc) for row, doc in pending if id(doc) in accepted_ids]
+    if not pending:
+        return
+    failed = set()
+    try:
+        res = collection.insert_many([doc for _, doc in pending], ordered=False)
+        result["inserted"] += len(res.inserted_ids)
+    except BulkWriteError as bwe:
+        details = bwe.details
+        result["inserted"] += details.get("nInserted", 0)
+        for err in details.get("writeErrors", []):
+            failed.add(err["index"])
+            result["errors"].append({"row": pending[err["index"]][0], "error": err.get("errmsg", "Insert failed")})
+    if on_insert:
+        on_insert([doc for i, (_, doc) in enumerate(pending) if i not in failed])
+
+
+def ingest_rows(collection, rows, chunk_size=CHUNK_SIZE, start=2, on_chunk=None, screen=None, on_insert=None):
+    """
+    Validate and insert rows in unordered chunks.
+
+    Args:
+        rows: iterable of row dicts
+        start: row number of the first row (2 for files with a header row)
+        on_chunk: optional callback(rows_consumed, result) after each chunk is
+            written; every row up to rows_consumed is reflected in result
+        screen: optional near-duplicate screen, callable(docs) returning
+            (accepted, rejected) docs
+        on_insert: optional callback(docs) with the docs of each chunk that
+            were inserted
+
+    Returns:
+        dict: inserted, duplicates, nearDuplicates (rejected), flagged
+        (inserted as near duplicates) and errors ([{row, error}]). A file
+        that stops decoding part way ends the import there: the rows before
+        it are still written and the bad position is reported as a row
+        error.
+    """
+    result = {"inserted": 0, "duplicates": 0, "nearDuplicates": 0, "flagged": 0, "errors": []}
+    seen = set()
+    batch = []
+    consumed = 0
+    rows = iter(rows)
+    idx = start - 1
+    while True:
+        idx += 1
+        try:
+            row = next(rows)
+        except StopIteration:
+            break
+        except UnicodeDecodeError:
+            result["errors"].append({"row": idx, "error": "Unable to decode file from here on (expecting UTF-8)"})
+            break
+        consumed += 1
+        try:
+            doc = parse_question_row(row)
+        except ValueError as e:
+            result["errors"].append({"row": idx, "error": str(e)})
+            continue
+        if doc["textHash"] in seen:
+            result["duplicates"] += 1
+            continue
+        seen.add(doc["textHash"])
+        batch.append((idx, doc))
+        if len(batch) >= chunk_size:
+            _flush(collection, batch, result, screen, on_insert)
+            batch = []
+            if on_chunk:
+                on_chunk(consumed, result)
+    if batch:
+        _flush(collection, batch, result, screen, on_insert)
+    if on_chunk:
+        on_chunk(consumed, result)
+    return result
@@ -0,0 +1,256 @@
+"""
+Rate Limit Service - Sliding-window request limits per email, IP, user or globally
+
+Each Limit allows `limit` hits per `window` seconds for one scope. Counts are
+kept per fixed window, and the estimate weights the previous window by how
+much of it still overlaps the sliding window:
+
+    estimate = previous * (1 - elapsed / window) + current
+
+so a burst straddling a window boundary cannot get twice the limit through.
+
+Backends (RATE_LIMIT_BACKEND):
+    mongo  - shared by every worker and instance (default); one document per
+             key in `rate_limits` holds the current and previous window
+             counts and is removed by a TTL index once idle
+    memory - per process, for local runs and tests
+    off    - disables limiting
+
+All of an endpoint's shared limits are counted together: the Mongo backend
+spends one bulk write plus one read per request, however many limits there
+are. "global" limits never go to the shared backend, where every request
+would contend on one document; each process enforces its share of the limit
+(limit / RATE_LIMIT_PROCESSES, default GUNICORN_WORKERS) in memory.
+
+Any exhausted limit rejects the request with 429 and Retry-After before the
+endpoint runs. If the backend
+itself fails, requests are let through (fail open) and a warning is logged.
+
+Behind Render's proxy the client address comes from X-Forwarded-For;
+RATE_LIMIT_PROXY_HOPS is the number of trusted proxies in front of the app.
+"""
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from pymongo import UpdateOne
+from extensions import mongo
+from metrics import observe_rate_limited
+
+logger = logging.getLogger(__name__)
+
+BACKEND = os.getenv("RATE_LIMIT_BACKEND", "mongo")
+PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1"))
+PROCESSES = int(os.getenv("RATE_LIMIT_PROCESSES", os.getenv("GUNICORN_WORKERS", "4")))
+
+# Memory backend: stale keys are pruned once the table grows past this size
+MAX_MEMORY_KEYS = 50000
+
+Limit = namedtuple("Limit", ["scope", "limit", "window"])
+
+
+def _window(now, window):
+    index = int(now // window)
+    return index, (now - index * window) / window
+
+
+def _estimate(previous, current, elapsed):
+    return previous * (1 - elapsed) + current
+
+
+def _retry_after(now, window):
+    return max(1, math.ceil(window - now % window))
+
+
+class MemoryBackend:
+    """Per-process counters: key -> [window index, current count, previous count]"""
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def hit_many(self, hits):
+        """
+        Count one hit against each (key, limit, window).
+
+        Returns:
+            list: (allowed, retry_after seconds) per hit
+        """
+        return [self.hit(key, limit, window) for key, limit, window in hits]
+
+    def hit(self, key, limit, window):
+        now = self._clock()
+        index, elapsed = _window(now, window)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or counter[0] < index - 1:
+                counter = [index, 0, 0]
+            elif counter[0] == index - 1:
+                counter = [index, 0, counter[1]]
+            counter[1] += 1
+            self._counters[key] = counter
+            if len(self._counters) > MAX_MEMORY_KEYS:
+                self._prune(index)
+        allowed = _estimate(counter[2], counter[1], elapsed) <= limit
+        return allowed, 0 if allowed else _retry_after(now, window)
+
+    def _prune(self, index):
+        for key in [k for k, c in self._counters.items() if c[0] < index - 1]:
+            del self._counters[key]
+
+
+class MongoBackend:
+    """Counters shared through the `rate_limits` collection, one document per key"""
+
+    def __init__(self, collection=None, clock=time.time):
+        self._collection = collection
+        self._clock = clock
+
+    @property
+    def collection(self):
+        return self._collection if self._collection is not None else mongo.db.rate_limits
+
+    @staticmethod
+    def _roll(index, window):
+        """Pipeline update counting one hit in window `index`, shifting counts on rollover"""
+        return [{"$set": {
+            "previous": {"$switch": {
+                "branches": [
+                    {"case": {"$eq": ["$index", index]}, "then": "$previous"},
+                    {"case": {"$eq": ["$index", index - 1]}, "then": "$current"},
+                ],
+                "default": 0,
+            }},
+            "current": {"$cond": [{"$eq": ["$index", index]}, {"$add": ["$current", 1]}, 1]},
+            "index": index,
+            "expiresAt": datetime.utcfromtimestamp((index + 2) * window),
+        }}]
+
+    def hit_many(self, hits):
+        now = self._clock()
+        windows = {key: _window(now, window) for key, _, window in hits}
+        self.collection.bulk_write(
+            [UpdateOne({"_id": key}, self._roll(windows[key][0], window), upsert=True)
+             for key, _, window in hits],
+            ordered=False
+        )
+        docs = {d["_id"]: d for d in self.collection.find({"_id": {"$in": [key for key, _, _ in hits]}})}
+        results = []
+        for key, limit, window in hits:
+            index, elapsed = windows[key]
+            doc = docs.get(key) or {}
+            if doc.get("index") == index:
+                estimate = _estimate(doc.get("previous", 0), doc.get("current", 0), elapsed)
+            else:
+                # Another request already rolled the document into a later window
+                estimate = 0
+            allowed = estimate <= limit
+            results.append((allowed, 0 if allowed else _retry_after(now, window)))
+        return results
+
+    def hit(self, key, limit, window):
+        return self.hit_many([(key, limit, window)])[0]
+
+
+def make_backend(name=None):
+    name = name or BACKEND
+    if name == "off":
+        return None
+    if name == "memory":
+        return MemoryBackend()
+    return MongoBackend()
+
+
+_backend = make_backend()
+# Per-process counters for "global" limits
+_local_backend = MemoryBackend()
+
+
+def set_backend(backend):
+    """Swap the backend (e.g. a MemoryBackend in tests); None disables limiting"""
+    global _backend
+    _backend = backend
+
+
+def client_ip():
+    """Client address, skipping the trusted proxies' own X-Forwarded-For entries"""
+    route = request.access_route
+    if PROXY_HOPS and len(route) >= PROXY_HOPS and request.headers.get("X-Forwarded-For"):
+        return route[-PROXY_HOPS]
+    return request.remote_addr or "unknown"
+
+
+def _request_email():
+    # force: the handlers parse the body whatever its Content-Type, so the
+    # limit must too or omitting the header would bypass it
+    data = request.get_json(force=True, silent=True) or {}
+    email = data.get("email") if isinstance(data, dict) else None
+    return (email or "").strip().lower() if isinstance(email, str) else ""
+
+
+def _scope_value(scope):
+    """Identity the limit applies to, or None if the request has none"""
+    if scope == "global":
+        return "all"
+    if scope == "ip":
+        return client_ip()
+    if scope == "email":
+        return _request_email() or None
+    if scope == "user":
+        return get_jwt_identity()
+    raise ValueError(f"Unknown rate limit scope: {scope}")
+
+
+def rate_limit(*limits, name=None):
+    """
+    Decorator rejecting requests over any of `limits` with 429. For the
+    "user" scope, apply it below @jwt_required() so the identity is verified.
+
+    Usage:
+        @auth_bp.post("/request-otp")
+        @rate_limit(Limit("email", 3, 60), Limit("ip", 300, 60), name="request-otp")
+        def request_otp(): ...
+    """
+    def decorator(func):
+        bucket = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            backend = _backend
+            if backend is not None:
+                shared, local = [], []
+                for lim in limits:
+                    value = _scope_value(lim.scope)
+                    if value is None:
+                        continue
+                    key = f"{bucket}:{lim.scope}:{lim.window}:{value}"
+                    if lim.scope == "global":
+                        local.append((lim, (key, max(1, math.ceil(lim.limit / PROCESSES)), lim.window)))
+                    else:
+                        shared.append((lim, (key, lim.limit, lim.window)))
+                try:
+                    results = _local_backend.hit_many([hit for _, hit in local])
+                    if shared:
+                        results += backend.hit_many([hit for _, hit in shared])
+                except Exception as e:
+                    logger.warning("Rate limit check failed, allowing request: %s", e)
+                    results = []
+                checked = [lim for lim, _ in local + shared]
+                for lim, (allowed, retry_after) in zip(checked, results):
+                    if not allowed:
+                        observe_rate_limited(bucket, lim.scope)
+                        resp = jsonify({"error": "Too many requests. Please try again later.",
+                                        "retryAfter": retry_after})
+                        resp.status_code = 429
+                        resp.headers["Retry-After"] = str(retry_after)
+                        return resp
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,154 @@
+"""
+Topic Mastery Service - Incremental per-student, per-topic performance table
+
+`student_topic_stats` holds one document per (studentId, topic) with running
+totals and an exponentially time-decayed accuracy, so topic analytics are a
+read of a handful of documents instead of a scan over the student's history.
+"""
+import os
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from extensions import mongo
+
+# Half-life of an answer's weight in the decayed accuracy
+HALF_LIFE_DAYS = float(os.getenv("TOPIC_ACCURACY_HALF_LIFE_DAYS", "14"))
+HALF_LIFE_MS = HALF_LIFE_DAYS * 24 * 60 * 60 * 1000
+
+# Topic recorded for answers whose question has none (legacy history)
+DEFAULT_TOPIC = "General"
+
+
+def summarize_history(history, questions_by_id=None):
+    """
+    Group a test's history items by topic.
+
+    Returns:
+        dict: topic -> {"attempts", "correct", "difficulty_sum"}
+    """
+    questions_by_id = questions_by_id or {}
+    per_topic = {}
+    for h in history:
+        topic = h.get("topic")
+        if topic is None:
+            qid = h.get("questionId")
+            if isinstance(qid, str) and ObjectId.is_valid(qid):
+                qid = ObjectId(qid)
+            topic = (questions_by_id.get(qid) or {}).get("topic")
+        if topic is None:
+            topic = DEFAULT_TOPIC
+        stats = per_topic.setdefault(topic, {"attempts": 0, "correct": 0, "difficulty_sum": 0})
+        stats["attempts"] += 1
+        stats["correct"] += 1 if h.get("isCorrect") else 0
+        stats["difficulty_sum"] += h.get("difficulty") or 0
+    return per_topic
+
+
+def _topic_update(topic_stats, score, now):
+    """Pipeline update applying one test's topic totals, decaying older answers first"""
+    return [
+        {"$set": {
+            "_decay": {"$pow": [0.5, {"$divide": [
+                {"$subtract": [now, {"$ifNull": ["$lastAttemptAt", now]}]},
+                HALF_LIFE_MS
+            ]}]}
+        }},
+        {"$set": {
+            "attempts": {"$add": [{"$ifNull": ["$attempts", 0]}, topic_stats["attempts"]]},
+            "correct": {"$add": [{"$ifNull": ["$correct", 0]}, topic_stats["correct"]]},
+            "difficultySum": {"$add": [{"$ifNull": ["$difficultySum", 0]}, topic_stats["difficulty_sum"]]},
+            "scoreSum": {"$add": [{"$ifNull": ["$scoreSum", 0]}, score * topic_stats["attempts"]]},
+            "decayedAttempts": {"$add": [
+                {"$multiply": [{"$ifNull": ["$decayedAttempts", 0]}, "$_decay"]},
+                topic_stats["attempts"]
+            ]},
+            "decayedCorrect": {"$add": [
+                {"$multiply": [{"$ifNull": ["$decayedCorrect", 0]}, "$_decay"]},
+                topic_stats["correct"]
+            ]},
+            "lastAttemptAt": now,
+        }},
+        {"$set": {
+            "decayedAccuracy": {"$cond": [
+                {"$gt": ["$decayedAttempts", 0]},
+                {"$divide": ["$decayedCorrect", "$decayedAttempts"]},
+                0
+            ]}
+        }},
+        {"$unset": "_decay"},
+    ]
+
+
+def record_topic_attempts(student_id, history, score, completed_at=None, questions_by_id=None):
+    """Fold a completed test into the student's topic table with one bulk upsert"""
+    now = completed_at or datetime.utcnow()
+    per_topic = summarize_history(history, questions_by_id)
+    ops = [
+        UpdateOne({"studentId": student_id, "topic": topic}, _topic_update(stats, score, now), upsert=True)
+        for topic, stats in per_topic.items()
+    ]
+    if ops:
+        mongo.db.student_topic_stats.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def get_topic_stats(student_id):
+    """All topic rows for a student, sorted by topic"""
+    return list(mongo.db.student_topic_stats.find({"studentId": student_id}).sort("topic", 1))
+
+
+def rebuild_from_attempt_facts(match=None):
+    """
+    Recompute `student_topic_stats` from `attempt_facts` and merge it in place.
+
+    Decayed values are computed relative to each row's last attempt, matching
+    what the incremental updates would have produced.
+    """
+    pipeline = [
+        {"$match": match or {}},
+        # Same key as the live path; a null topic would also fail the $merge
+        {"$set": {"topic": {"$ifNull": ["$topic", DEFAULT_TOPIC]}}},
+        {"$setWindowFields": {
+            "partitionBy": {"studentId": "$studentId", "topic": "$topic"},
+            "output": {"lastAttemptAt": {"$max": "$completedAt", "window": {"documents": ["unbounded", "unbounded"]}}}
+        }},
+        {"$set": {
+            "_weight": {"$pow": [0.5, {"$divide": [
+                {"$subtract": ["$lastAttemptAt", "$completedAt"]}, HALF_LIFE_MS
+            ]}]}
+        }},
+        {"$group": {
+            "_id": {"studentId": "$studentId", "topic": "$topic"},
+            "attempts": {"$sum": 1},
+            "correct": {"$sum": {"$cond": ["$isCorrect", 1, 0]}},
+            "difficultySum": {"$sum": {"$ifNull": ["$difficulty", 0]}},
+            "scoreSum": {"$sum": "$score"},
+            "decayedAttempts": {"$sum": "$_weight"},
+            "decayedCorrect": {"$sum": {"$cond": ["$isCorrect", "$_weight", 0]}},
+            "lastAttemptAt": {"$max": "$completedAt"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "studentId": "$_id.studentId",
+            "topic": "$_id.topic",
+            "attempts": 1,
+            "correct": 1,
+            "difficultySum": 1,
+            "scoreSum": 1,
+            "decayedAttempts": 1,
+            "decayedCorrect": 1,
+            "lastAttemptAt": 1,
+            "decayedAccuracy": {"$cond": [
+                {"$gt": ["$decayedAttempts", 0]},
+                {"$divide": ["$decayedCorrect", "$decayedAttempts"]},
+                0
+            ]},
+        }},
+        {"$merge": {
+            "into": "student_topic_stats",
+            "on": ["studentId", "topic"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }},
+    ]
+    mongo.db.attempt_facts.aggregate(pipeline, allowDiskUse=True)
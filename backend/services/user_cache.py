@@ -0,0 +1,91 @@
+"""
+User Cache Service - Request-scoped identity map and short-TTL cache for user documents
+
+`get_user` returns the same document for an id for the rest of the request
+(or app context), so the chain of handlers and services touching the
+current user reads it from Mongo at most once. Across requests, documents
+are kept in a per-process TTLCache for USER_CACHE_SECONDS (default 5).
+
+Writes to a user document go through `update_user`, which returns the
+updated document in the same round trip and stores it in the identity map
+and this process's cache. Other workers may serve a document up to
+USER_CACHE_SECONDS old; pass fresh=True where that matters (e.g. roles
+when issuing a token).
+"""
+import copy
+import os
+from bson import ObjectId
+from flask import g, has_app_context
+from pymongo import ReturnDocument
+from extensions import mongo
+from services.cache import TTLCache
+
+_process_cache = TTLCache(ttl=float(os.getenv("USER_CACHE_SECONDS", "5")), maxsize=4096)
+
+
+def _identity_map():
+    if not has_app_context():
+        return None
+    if "_user_docs" not in g:
+        g._user_docs = {}
+    return g._user_docs
+
+
+def _remember(key, user):
+    users = _identity_map()
+    if users is not None:
+        users[key] = user
+    _process_cache.set(key, copy.deepcopy(user))
+
+
+def get_user(user_id, fresh=False):
+    """
+    User document by id, or None.
+
+    Args:
+        fresh: skip the process cache (the identity map is still used)
+    """
+    key = str(user_id)
+    users = _identity_map()
+    if users is not None and key in users:
+        return users[key]
+    user = None if fresh else _process_cache.get(key)
+    if user is not None:
+        user = copy.deepcopy(user)
+        if users is not None:
+            users[key] = user
+        return user
+    user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
+    if user is not None:
+        _remember(key, user)
+    return user
+
+
+def update_user(user_id, update, match=None):
+    """
+    Apply an update to a user document.
+
+    Args:
+        match: extra filter conditions; the update only applies if they hold
+
+    Returns:
+        dict: the updated document, or None if there is no such user or it did not match
+    """
+    key = str(user_id)
+    user = mongo.db.users.find_one_and_update(
+        {**(match or {}), "_id": ObjectId(user_id)}, update, return_document=ReturnDocument.AFTER
+    )
+    if user is None:
+        invalidate_user(key)
+    else:
+        _remember(key, user)
+    return user
+
+
+def invalidate_user(user_id):
+    """Forget a user document changed outside `update_user`"""
+    key = str(user_id)
+    users = _identity_map()
+    if users is not None:
+        users.pop(key, None)
+    _process_cache.pop(key)
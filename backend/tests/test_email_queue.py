@@ -0,0 +1,170 @@
+import threading
+
+import pytest
+
+from services.email_queue import BrevoTransport, EmailQueue, MemoryTransport, TransportError
+
+
+def make_queue(transport, **kwargs):
+    sleeps = []
+    kwargs.setdefault("linger", 0.2)
+    kwargs.setdefault("base_delay", 1.0)
+    q = EmailQueue(transport, sleep=sleeps.append, **kwargs)
+    return q, sleeps
+
+
+def test_messages_within_linger_window_go_out_as_one_batch():
+    transport = MemoryTransport()
+    q, _ = make_queue(transport)
+    for i in range(5):
+        q.enqueue(f"s{i}@example.com", "Your OTP", "<p>{{ params.otp }}</p>", {"otp": str(i)})
+    assert q.flush(timeout=5)
+
+    assert len(transport.batches) == 1
+    batch = transport.batches[0]
+    assert batch["subject"] == "Your OTP"
+    assert [m["to"] for m in batch["messages"]] == [f"s{i}@example.com" for i in range(5)]
+    assert [m["params"]["otp"] for m in batch["messages"]] == ["0", "1", "2", "3", "4"]
+
+
+def test_batches_are_split_by_template_and_batch_size():
+    transport = MemoryTransport()
+    q, _ = make_queue(transport, batch_size=3)
+    for i in range(4):
+        q.enqueue(f"a{i}@example.com", "A", "<p>a</p>")
+    q.enqueue("b@example.com", "B", "<p>b</p>")
+    assert q.flush(timeout=5)
+
+    sizes = sorted((b["subject"], len(b["messages"])) for b in transport.batches)
+    assert sizes == [("A", 1), ("A", 3), ("B", 1)]
+    assert len(transport.sent) == 5
+
+
+def test_retryable_failures_are_retried_with_backoff():
+    transport = MemoryTransport(errors=[TransportError("429"), TransportError("503")])
+    q, sleeps = make_queue(transport, max_retries=4)
+    q.enqueue("s@example.com", "Your OTP", "<p>x</p>")
+    assert q.flush(timeout=5)
+
+    assert transport.attempts == 3
+    assert len(transport.sent) == 1
+    assert len(sleeps) == 2
+    # Exponential with up to 50% jitter: [1, 1.5) then [2, 3)
+    assert 1.0 <= sleeps[0] < 1.5
+    assert 2.0 <= sleeps[1] < 3.0
+
+
+def test_non_retryable_failure_is_dropped_without_retrying():
+    transport = MemoryTransport(errors=[TransportError("400 bad request", retryable=False)])
+    q, sleeps = make_queue(transport)
+    q.enqueue("s@example.com", "Your OTP", "<p>x</p>")
+    assert q.flush(timeout=5)
+
+    assert transport.attempts == 1
+    assert transport.sent == []
+    assert sleeps == []
+
+
+def test_non_retryable_batch_failure_drops_only_the_bad_message():
+    class RejectingTransport(MemoryTransport):
+        def send(self, subject, html, messages):
+            if any(m["to"] == "bad@example" for m in messages):
+                with self._lock:
+                    self.attempts += 1
+                raise TransportError("400 invalid email", retryable=False)
+            super().send(subject, html, messages)
+
+    transport = RejectingTransport()
+    q, sleeps = make_queue(transport)
+    for to in ["a@example.com", "b@example.com", "bad@example", "c@example.com", "d@example.com"]:
+        q.enqueue(to, "Your OTP", "<p>x</p>")
+    assert q.flush(timeout=5)
+
+    assert sorted(m["to"] for m in transport.sent) == ["a@example.com", "b@example.com", "c@example.com", "d@example.com"]
+    assert sleeps == []
+
+
+def test_gives_up_after_max_retries():
+    transport = MemoryTransport(fail_times=10)
+    q, sleeps = make_queue(transport, max_retries=2)
+    q.enqueue("s@example.com", "Your OTP", "<p>x</p>")
+    assert q.flush(timeout=5)
+
+    assert transport.attempts == 3
+    assert transport.sent == []
+    assert len(sleeps) == 2
+
+
+class FakeApiException(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class FakeSdk:
+    class SendSmtpEmail:
+        def __init__(self, **kwargs):
+            self.kwargs = kwargs
+
+
+class FakeApi:
+    def __init__(self, error=None):
+        self.sent = []
+        self.error = error
+
+    def send_transac_email(self, email):
+        if self.error:
+            raise self.error
+        self.sent.append(email)
+
+
+def brevo_transport(api):
+    # Bypass __init__, which needs the Brevo SDK and an API key
+    transport = BrevoTransport.__new__(BrevoTransport)
+    transport._sdk = FakeSdk
+    transport._api_exception = FakeApiException
+    transport._api = api
+    return transport
+
+
+def test_brevo_transport_sends_a_batch_as_message_versions():
+    api = FakeApi()
+    transport = brevo_transport(api)
+    q, _ = make_queue(transport)
+    q.enqueue("a@example.com", "Your OTP", "<p>{{ params.otp }}</p>", {"otp": "111111"})
+    q.enqueue("b@example.com", "Your OTP", "<p>{{ params.otp }}</p>", {"otp": "222222"})
+    assert q.flush(timeout=5)
+
+    assert len(api.sent) == 1
+    kwargs = api.sent[0].kwargs
+    assert kwargs["subject"] == "Your OTP"
+    assert kwargs["html_content"] == "<p>{{ params.otp }}</p>"
+    assert kwargs["message_versions"] == [
+        {"to": [{"email": "a@example.com"}], "params": {"otp": "111111"}},
+        {"to": [{"email": "b@example.com"}], "params": {"otp": "222222"}},
+    ]
+
+
+@pytest.mark.parametrize("status,retryable", [(429, True), (500, True), (503, True), (400, False), (401, False)])
+def test_brevo_errors_are_retryable_only_for_429_and_5xx(status, retryable):
+    transport = brevo_transport(FakeApi(error=FakeApiException(status)))
+    with pytest.raises(TransportError) as excinfo:
+        transport.send("s", "h", [{"to": "a@example.com", "params": {}}])
+    assert excinfo.value.retryable is retryable
+
+
+def test_enqueue_does_not_wait_for_delivery():
+    release = threading.Event()
+
+    class SlowTransport(MemoryTransport):
+        def send(self, subject, html, messages):
+            release.wait(5)
+            super().send(subject, html, messages)
+
+    transport = SlowTransport()
+    q, _ = make_queue(transport, linger=0)
+    q.enqueue("s@example.com", "Your OTP", "<p>x</p>")
+    assert transport.sent == []
+    release.set()
+    assert q.flush(timeout=5)
+    assert len(transport.sent) == 1
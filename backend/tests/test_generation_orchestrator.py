@@ -0,0 +1,206 @@
+import json
+
+import pytest
+
+from services.generation_orchestrator import (
+    CALL_SIZE, CircuitBreaker, FakeModelClient, GenerationOrchestrator, GenerationUnavailable, RateLimiter,
+    iter_json_array, parse_questions,
+)
+
+
+def chunked(text, size=7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def question(text, answer="a"):
+    return {"text": text, "options": ["a", "b", "c", "d"], "answer": answer}
+
+
+def make_orchestrator(client, models=("m1", "m2"), **kwargs):
+    kwargs.setdefault("sleep", lambda seconds: None)
+    return GenerationOrchestrator(client, models=list(models), **kwargs)
+
+
+# --- Incremental JSON array parser ---
+
+def test_parser_yields_elements_across_chunk_boundaries():
+    items = [question('Has "quotes", [brackets] and {braces}'), question("Escaped \\\" quote")]
+    text = "```json\n" + json.dumps(items) + "\n```"
+    assert list(iter_json_array(chunked(text, 3))) == items
+
+
+def test_parser_yields_none_for_malformed_elements_and_keeps_going():
+    text = '[{"text": "ok"}, {"text": oops}, 42, "a,]b", {"text": "also ok"}]'
+    assert list(iter_json_array(chunked(text))) == [{"text": "ok"}, None, 42, "a,]b", {"text": "also ok"}]
+
+
+def test_parser_drops_an_element_cut_off_by_the_end_of_the_stream():
+    text = '[{"text": "complete"}, {"text": "trunc'
+    assert list(iter_json_array(chunked(text))) == [{"text": "complete"}]
+
+
+def test_parser_yields_each_element_before_the_stream_ends():
+    def stream():
+        yield '[{"text": "first"},'
+        raise ConnectionError("stream broke")
+
+    it = iter_json_array(stream())
+    assert next(it) == {"text": "first"}
+    with pytest.raises(ConnectionError):
+        next(it)
+
+
+def test_parser_rejects_a_response_without_an_array():
+    with pytest.raises(ValueError):
+        list(iter_json_array(["no array here"]))
+
+
+def test_parse_questions_keeps_valid_items_around_malformed_ones():
+    text = json.dumps([question("Q1"), {"text": "missing options"}, question("Q2", answer="not an option")])
+    text = text[:-1] + ', {"text": broken}, ' + json.dumps(question("Q3")) + "]"
+    questions = parse_questions(text, "Algebra", 3)
+    assert [q["text"] for q in questions] == ["Q1", "Q3"]
+    assert all(q["topic"] == "Algebra" and q["difficulty"] == 3 and q["textHash"] for q in questions)
+
+
+def test_parse_questions_raises_when_nothing_is_valid():
+    with pytest.raises(ValueError):
+        parse_questions('[{"text": "no options"}]', "Algebra", 3)
+
+
+# --- Orchestrator with FakeModelClient ---
+
+def test_generate_splits_large_counts_into_calls():
+    client = FakeModelClient()
+    questions = make_orchestrator(client).generate("Algebra", 3, 25)
+    assert len(questions) == 25
+    assert client.calls == 3
+    assert len({q["text"] for q in questions}) == 25
+
+
+def test_failing_model_falls_through_to_the_next_one():
+    client = FakeModelClient(fail_models={"m1"})
+    orchestrator = make_orchestrator(client)
+    assert len(orchestrator.generate("Algebra", 3, 5)) == 5
+    assert orchestrator.breakers["m1"]._failures == 1
+
+
+def test_all_models_failing_raises_after_retries_with_backoff():
+    sleeps = []
+    client = FakeModelClient(fail_models={"m1", "m2"})
+    orchestrator = make_orchestrator(client, max_retries=3, base_delay=1.0, sleep=sleeps.append)
+    with pytest.raises(GenerationUnavailable):
+        orchestrator.generate("Algebra", 3, 5)
+    assert len(sleeps) == 2
+    assert 1.0 <= sleeps[0] < 1.5 and 2.0 <= sleeps[1] < 3.0
+
+
+def test_broken_stream_keeps_questions_parsed_before_the_break():
+    class BreakingClient(FakeModelClient):
+        def stream(self, model, prompt, chunk_size=64):
+            for i, chunk in enumerate(super().stream(model, prompt, chunk_size)):
+                if i == 6:
+                    raise ConnectionError("reset")
+                yield chunk
+
+    client = BreakingClient()
+    orchestrator = make_orchestrator(client, models=["m1"])
+    batch = list(orchestrator._stream_call("Algebra", 3, 10))
+    assert 0 < len(batch) < 10
+    assert orchestrator.breakers["m1"].state == "closed"
+
+
+def test_unparseable_response_counts_as_a_model_failure():
+    class GarbageClient(FakeModelClient):
+        def stream(self, model, prompt, chunk_size=64):
+            if model == "m1":
+                yield "Sorry, I can't help with that."
+                return
+            yield from super().stream(model, prompt, chunk_size)
+
+    orchestrator = make_orchestrator(GarbageClient())
+    assert len(orchestrator.generate("Algebra", 3, 4)) == 4
+    assert orchestrator.breakers["m1"]._failures == 1
+
+
+def test_closing_the_stream_early_does_not_leave_a_half_open_breaker_stuck():
+    clock = [0.0]
+    orchestrator = make_orchestrator(FakeModelClient(), models=["m1"], clock=lambda: clock[0])
+    breaker = orchestrator.breakers["m1"]
+    breaker._opened_at = -breaker.reset_seconds  # open long enough ago to be half-open
+    stream = orchestrator.stream("Algebra", 3, 5)
+    next(stream)
+    stream.close()
+    assert breaker.state == "closed"
+    assert not breaker._trial_in_flight
+
+
+def test_run_reports_per_job_results():
+    client = FakeModelClient(fail_models={"m1", "m2"})
+    orchestrator = make_orchestrator(client, max_retries=1)
+    results = orchestrator.run([{"topic": "Algebra", "difficulty": 2, "count": 3}])
+    assert results == [{"topic": "Algebra", "difficulty": 2, "requested": 3, "questions": [], "error": "m2 unavailable"}]
+
+
+class MemoryCache:
+    """Stand-in for ResponseCache with the same take/put contract"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def take(self, models, prompt, count):
+        for model in models:
+            entry = self.entries.get((model, prompt))
+            if entry and entry["served"] < len(entry["items"]):
+                items = entry["items"][entry["served"]:entry["served"] + count]
+                entry["served"] += len(items)
+                return items, model
+        return [], None
+
+    def put(self, model, prompt, items, served):
+        entry = self.entries.setdefault((model, prompt), {"items": [], "served": 0})
+        entry["items"] = entry["items"][entry["served"]:] + list(items[served:])
+        entry["served"] = 0
+
+
+def test_cached_surplus_is_served_before_calling_the_model():
+    client = FakeModelClient()
+    orchestrator = make_orchestrator(client, cache=MemoryCache())
+    first = orchestrator.generate("Algebra", 3, 4)
+    second = orchestrator.generate("Algebra", 3, CALL_SIZE - 4)
+    assert client.calls == 1
+    assert len({q["text"] for q in first + second}) == CALL_SIZE
+    orchestrator.generate("Algebra", 3, 1)
+    assert client.calls == 2
+
+
+# --- Rate limiter and circuit breaker ---
+
+def test_rate_limiter_waits_for_a_token_once_the_bucket_is_empty():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(60, clock=lambda: now[0], sleep=sleep)
+    for _ in range(60):
+        limiter.acquire()
+    assert sleeps == []
+    limiter.acquire()
+    assert sleeps == [pytest.approx(1.0)]
+
+
+def test_circuit_breaker_opens_then_allows_one_trial():
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=2, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    now[0] = 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react'
-import { Trophy, Award, TrendingUp, Star, Sparkles } from 'lucide-react'
+import { Trophy, Award, TrendingUp, Star, Sparkles, Flame } from 'lucide-react'
 import { api } from '../lib/api'
 
 export default function XPBadge({ compact = false }) {
@@ -42,6 +42,13 @@ export default function XPBadge({ compact = false }) {
                     </div>
                 </div>
 
+                {profile.streak?.current > 0 && (
+                    <div className="flex items-center gap-1 border-l border-indigo-200 pl-3" title={`Longest streak: ${profile.streak.longest} days`}>
+                        <Flame className="h-4 w-4 text-orange-500" />
+                        <span className="text-xs font-semibold text-gray-900">{profile.streak.current}</span>
+                    </div>
+                )}
+
                 {profile.badges && profile.badges.length > 0 && (
                     <div className="flex items-center gap-1 border-l border-indigo-200 pl-3">
                         <Award className="h-4 w-4 text-amber-500" />
@@ -98,6 +105,21 @@ export default function XPBadge({ compact = false }) {
                 </div>
             </div>
 
+            {/* Streak */}
+            {profile.streak && (
+                <div className="flex items-center justify-between mb-3 px-3 py-2 bg-orange-50 rounded-lg border border-orange-200">
+                    <div className="flex items-center gap-2">
+                        <Flame className="h-4 w-4 text-orange-500" />
+                        <span className="text-xs font-semibold text-orange-900">
+                            {profile.streak.current} day streak
+                        </span>
+                    </div>
+                    <span className="text-xs text-orange-700">
+                        Best: {profile.streak.longest} days
+                    </span>
+                </div>
+            )}
+
             {/* Badges */}
             {profile.badges && profile.badges.length > 0 && (
                 <div className="pt-3 border-t border-gray-200">
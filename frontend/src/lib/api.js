@@ -28,9 +28,12 @@ export const login = (payload) => api.post('/auth/login', payload)
 export const listUsers = () => api.get('/admin/users')
 export const addQuestion = (payload) => api.post('/admin/questions', payload)
 export const uploadQuestionsCsv = (formData) => api.post('/admin/questions/csv', formData, { headers: { 'Content-Type': 'multipart/form-data' } })
+export const createImportJob = (formData) => api.post('/admin/import-jobs', formData, { headers: { 'Content-Type': 'multipart/form-data' } })
+export const getImportJob = (jobId) => api.get(`/admin/import-jobs/${jobId}`)
 export const updateUserRole = (userId, role) => api.put(`/admin/users/${userId}/role`, { role })
 export const updateUserDepartment = (userId, department) => api.put(`/admin/users/${userId}/department`, { department })
 export const generateQuestions = (payload) => api.post('/admin/generate-questions', payload)
+export const generateQuestionsBatch = (jobs) => api.post('/admin/generate-questions/batch', { jobs })
 
 // Test engine
 export const startTest = (payload) => api.post('/test/start', payload)
@@ -38,10 +41,11 @@ export const submitAnswer = (payload) => api.post('/test/submit', payload)
 export const finishTest = (payload) => api.post('/test/finish', payload)
 
 // Data
-export const myResults = () => api.get('/data/my-results')
+export const myResults = (params = {}) => api.get('/data/my-results', { params })
 export const batchAnalytics = (query = '') => api.get(`/data/batch-analytics${query ? `?${query}` : ''}`)
 export const myTopicAverages = () => api.get('/data/my-topic-averages')
 export const studentStats = (query = '') => api.get(`/data/student-stats${query ? `?${query}` : ''}`)
+export const exportCohortResults = (query = '') => api.get(`/data/export/results${query ? `?${query}` : ''}`, { responseType: 'blob' })
 
 // Learning topics (student)
 export const fetchTopics = () => api.get('/learn/topics')
@@ -1,5 +1,5 @@
 import { useState } from 'react'
-import { addQuestion, uploadQuestionsCsv, generateQuestions } from '../lib/api'
+import { addQuestion, createImportJob, getImportJob, generateQuestions } from '../lib/api'
 import { Plus, Upload, FileText, AlertCircle, CheckCircle2, HelpCircle, Bot, Sparkles } from 'lucide-react'
 
 export default function AdminQuestions() {
@@ -58,10 +58,25 @@ export default function AdminQuestions() {
     try {
       const fd = new FormData()
       fd.append('file', csvFile)
-      const r = await uploadQuestionsCsv(fd)
-      const ins = r.data?.inserted || 0
-      const errs = (r.data?.errors || []).length
-      setCsvMsg(`Successfully uploaded: ${ins} questions inserted${errs ? `, ${errs} errors` : ''}`)
+      const created = await createImportJob(fd)
+      const jobId = created.data.jobId
+      setCsvMsg('Upload received, importing...')
+
+      // Large files are imported in the background; poll for progress
+      let job = created.data
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 1000))
+        job = (await getImportJob(jobId)).data
+        if (job.status === 'running') setCsvMsg(`Importing... ${job.rowsDone} rows processed`)
+      }
+      if (job.status === 'failed') {
+        setCsvMsg(job.error || 'Import failed')
+        return
+      }
+      const ins = job.inserted || 0
+      const errs = job.errorCount || 0
+      const dups = job.duplicates || 0
+      setCsvMsg(`Successfully uploaded: ${ins} questions inserted${dups ? `, ${dups} duplicates skipped` : ''}${errs ? `, ${errs} errors` : ''}`)
       setIsCsvSuccess(true)
       setCsvFile(null)
       setTimeout(() => { setCsvMsg(''); setIsCsvSuccess(false) }, 5000)
@@ -282,11 +297,11 @@ export default function AdminQuestions() {
             </div>
 
             <div>
-              <label className="block text-sm font-medium text-gray-700 mb-2">Choose CSV File</label>
+              <label className="block text-sm font-medium text-gray-700 mb-2">Choose CSV, JSON or XLSX File</label>
               <div className="relative">
                 <input
                   type="file"
-                  accept=".csv"
+                  accept=".csv,.json,.jsonl,.xlsx"
                   onChange={e => setCsvFile(e.target.files?.[0] || null)}
                   className="block w-full text-sm text-gray-600 file:mr-4 file:rounded-lg file:border-0 file:bg-indigo-50 file:px-4 file:py-2 file:text-sm file:font-medium file:text-indigo-700 hover:file:bg-indigo-100"
                 />
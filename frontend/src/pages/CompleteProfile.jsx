@@ -26,7 +26,7 @@ export default function CompleteProfile() {
   async function handleSubmit(e) {
     e.preventDefault(); setError(''); setLoading(true)
     try {
-      const resp = await updateProfile(form)
+      const resp = await updateProfile({ ...form, timezone: Intl.DateTimeFormat().resolvedOptions().timeZone })
       saveAuth(window.localStorage.getItem('skillatics_token'), resp.data.user)
       const role = resp.data.user?.role || 'Student'
       const redirect = role === 'Admin' ? '/admin' : (role === 'TPO' || role === 'Faculty') ? '/faculty' : '/student'
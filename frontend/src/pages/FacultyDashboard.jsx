@@ -1,15 +1,17 @@
 import { useEffect, useMemo, useState } from 'react'
-import { batchAnalytics, studentStats } from '../lib/api'
+import { batchAnalytics, studentStats, exportCohortResults } from '../lib/api'
 import { Bar } from 'react-chartjs-2'
 import { Chart, BarElement, CategoryScale, LinearScale, Tooltip, Legend } from 'chart.js'
 import { getCurrentUser } from '../lib/auth'
-import { Users, TrendingUp, Target, Award, Loader2, Filter } from 'lucide-react'
+import { Users, TrendingUp, Target, Award, Loader2, Filter, Download } from 'lucide-react'
 
 Chart.register(BarElement, CategoryScale, LinearScale, Tooltip, Legend)
 
 export default function FacultyDashboard() {
     const [data, setData] = useState(null)
     const [students, setStudents] = useState([])
+    const [studentSummary, setStudentSummary] = useState({ total: 0, atRisk: 0, distribution: [0, 0, 0, 0, 0] })
+    const [page, setPage] = useState(1)
     const [scope, setScope] = useState('college') // college | department | division
     const [department, setDepartment] = useState('')
     const [division, setDivision] = useState('')
@@ -18,6 +20,7 @@ export default function FacultyDashboard() {
     const me = useMemo(() => getCurrentUser() || {}, [])
 
     const YEAR_OPTIONS = ['First Year', 'Second Year', 'Third Year', 'Fourth Year']
+    const PAGE_SIZE = 50
 
     function refresh() {
         setLoading(true)
@@ -26,13 +29,41 @@ export default function FacultyDashboard() {
         if (department) params.set('department', department)
         if (division) params.set('division', division)
         if (yearOfStudy) params.set('yearOfStudy', yearOfStudy)
+        const statsParams = new URLSearchParams(params)
+        statsParams.set('page', page)
+        statsParams.set('limit', PAGE_SIZE)
         Promise.all([
             batchAnalytics(params.toString()).then(r => setData(r.data)).catch(() => setData({ avgScore: 0, tests: 0, avgCorrect: 0, avgTotal: 0 })),
-            studentStats(params.toString()).then(r => setStudents(r.data || [])).catch(() => setStudents([]))
+            studentStats(statsParams.toString()).then(r => {
+                setStudents(r.data?.items || [])
+                setStudentSummary({
+                    total: r.data?.total || 0,
+                    atRisk: r.data?.atRisk || 0,
+                    distribution: r.data?.distribution || [0, 0, 0, 0, 0]
+                })
+            }).catch(() => setStudents([]))
         ]).finally(() => setLoading(false))
     }
 
-    useEffect(() => { refresh() }, [scope, department, division, yearOfStudy])
+    useEffect(() => { setPage(1) }, [scope, department, division, yearOfStudy])
+    useEffect(() => { refresh() }, [scope, department, division, yearOfStudy, page])
+
+    const totalPages = Math.max(1, Math.ceil(studentSummary.total / PAGE_SIZE))
+
+    async function handleExport(format) {
+        const params = new URLSearchParams()
+        if (department) params.set('department', department)
+        if (division) params.set('division', division)
+        if (yearOfStudy) params.set('yearOfStudy', yearOfStudy)
+        params.set('format', format)
+        const resp = await exportCohortResults(params.toString())
+        const url = URL.createObjectURL(resp.data)
+        const link = document.createElement('a')
+        link.href = url
+        link.download = `cohort-results.${format}`
+        link.click()
+        URL.revokeObjectURL(url)
+    }
 
     if (loading && !data) return (
         <div className="flex min-h-[60vh] items-center justify-center">
@@ -68,11 +99,27 @@ export default function FacultyDashboard() {
 
             {/* Filters */}
             <div className="glass-card rounded-2xl p-6">
-                <div className="flex items-center gap-2 mb-6">
-                    <div className="rounded-lg bg-slate-100 p-2">
-                        <Filter className="h-5 w-5 text-slate-700" />
+                <div className="flex items-center justify-between mb-6">
+                    <div className="flex items-center gap-2">
+                        <div className="rounded-lg bg-slate-100 p-2">
+                            <Filter className="h-5 w-5 text-slate-700" />
+                        </div>
+                        <h3 className="text-lg font-bold text-slate-900">Advanced Filters</h3>
+                    </div>
+                    <div className="flex gap-2">
+                        <button
+                            onClick={() => handleExport('csv')}
+                            className="inline-flex items-center gap-1.5 rounded-lg border border-slate-200 bg-white px-3 py-1.5 text-sm font-medium text-slate-700 hover:border-orange-300"
+                        >
+                            <Download className="h-4 w-4" /> CSV
+                        </button>
+                        <button
+                            onClick={() => handleExport('parquet')}
+                            className="inline-flex items-center gap-1.5 rounded-lg border border-slate-200 bg-white px-3 py-1.5 text-sm font-medium text-slate-700 hover:border-orange-300"
+                        >
+                            <Download className="h-4 w-4" /> Parquet
+                        </button>
                     </div>
-                    <h3 className="text-lg font-bold text-slate-900">Advanced Filters</h3>
                 </div>
                 <div className="grid gap-6 md:grid-cols-2 lg:grid-cols-4">
                     {me.role === 'TPO' && (
@@ -179,7 +226,7 @@ export default function FacultyDashboard() {
                         <div>
                             <p className="text-sm font-medium text-slate-500">At-Risk Students</p>
                             <p className="mt-2 text-3xl font-bold text-red-600">
-                                {students.filter(s => (s.avgScore || 0) < 40).length}
+                                {studentSummary.atRisk}
                             </p>
                             <p className="text-xs text-red-400 mt-1">Avg Score &lt; 40%</p>
                         </div>
@@ -203,7 +250,7 @@ export default function FacultyDashboard() {
                     <div className="flex items-center justify-between">
                         <div>
                             <p className="text-sm font-medium text-slate-500">Active Students</p>
-                            <p className="mt-2 text-3xl font-bold text-slate-900">{students.length}</p>
+                            <p className="mt-2 text-3xl font-bold text-slate-900">{studentSummary.total}</p>
                         </div>
                         <div className="rounded-xl bg-blue-50 p-3 shadow-inner">
                             <Users className="h-6 w-6 text-blue-600" />
@@ -236,13 +283,7 @@ export default function FacultyDashboard() {
                                 labels: ['0-20%', '21-40%', '41-60%', '61-80%', '81-100%'],
                                 datasets: [{
                                     label: 'Students',
-                                    data: [
-                                        students.filter(s => s.avgScore <= 20).length,
-                                        students.filter(s => s.avgScore > 20 && s.avgScore <= 40).length,
-                                        students.filter(s => s.avgScore > 40 && s.avgScore <= 60).length,
-                                        students.filter(s => s.avgScore > 60 && s.avgScore <= 80).length,
-                                        students.filter(s => s.avgScore > 80).length
-                                    ],
+                                    data: studentSummary.distribution,
                                     backgroundColor: ['#ef4444', '#f97316', '#eab308', '#3b82f6', '#22c55e']
                                 }]
                             }}
@@ -314,6 +355,27 @@ export default function FacultyDashboard() {
                         </tbody>
                     </table>
                 </div>
+                {totalPages > 1 && (
+                    <div className="flex items-center justify-between border-t border-slate-100 bg-slate-50/50 px-6 py-3">
+                        <span className="text-sm text-slate-500">Page {page} of {totalPages}</span>
+                        <div className="flex gap-2">
+                            <button
+                                onClick={() => setPage(p => Math.max(1, p - 1))}
+                                disabled={page <= 1}
+                                className="rounded-lg border border-slate-200 bg-white px-3 py-1.5 text-sm font-medium text-slate-700 disabled:opacity-50"
+                            >
+                                Previous
+                            </button>
+                            <button
+                                onClick={() => setPage(p => Math.min(totalPages, p + 1))}
+                                disabled={page >= totalPages}
+                                className="rounded-lg border border-slate-200 bg-white px-3 py-1.5 text-sm font-medium text-slate-700 disabled:opacity-50"
+                            >
+                                Next
+                            </button>
+                        </div>
+                    </div>
+                )}
             </div>
         </div>
     )
@@ -9,6 +9,7 @@ Chart.register(LineElement, PointElement, CategoryScale, LinearScale, Tooltip, L
 
 export default function StudentDashboard() {
     const [rows, setRows] = useState([])
+    const [summary, setSummary] = useState({ tests: 0, avgScore: 0, bestScore: 0 })
     const [topics, setTopics] = useState([])
     const [skills, setSkills] = useState([])
     const [recommendations, setRecommendations] = useState([])
@@ -17,14 +18,16 @@ export default function StudentDashboard() {
     useEffect(() => {
         let mounted = true
         Promise.all([
-            myResults(),
+            myResults({ limit: 30 }),
             myTopicAverages(),
             api.get('/data/skill-gaps').catch(e => ({ data: [] })),
             api.get('/data/recommendations').catch(e => ({ data: [] }))
         ])
             .then(([r1, r2, r3, r4]) => {
                 if (!mounted) return
-                setRows(r1.data || [])
+                // Newest first from the API; the chart reads oldest to newest
+                setRows([...(r1.data?.items || [])].reverse())
+                setSummary(r1.data?.summary || { tests: 0, avgScore: 0, bestScore: 0 })
                 setTopics(r2.data || [])
                 setSkills(r3.data || [])
                 setRecommendations(r4.data || [])
@@ -61,10 +64,10 @@ export default function StudentDashboard() {
         ]
     }
 
-    const avgScore = rows.length > 0 ? Math.round(rows.reduce((sum, r) => sum + r.score, 0) / rows.length) : 0
-    const totalTests = rows.length
+    const avgScore = Math.round(summary.avgScore || 0)
+    const totalTests = summary.tests || 0
     const lastScore = rows.length > 0 ? rows[rows.length - 1].score : 0
-    const bestScore = rows.length > 0 ? Math.max(...rows.map(r => r.score)) : 0
+    const bestScore = summary.bestScore || 0
 
     return (
         <div className="space-y-8">
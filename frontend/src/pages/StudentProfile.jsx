@@ -29,7 +29,7 @@ export default function StudentProfile() {
     setSuccess('')
     setLoading(true)
     try {
-      const resp = await updateProfile(form)
+      const resp = await updateProfile({ ...form, timezone: Intl.DateTimeFormat().resolvedOptions().timeZone })
       saveAuth(window.localStorage.getItem('skillatics_token'), resp.data.user)
       // Update the local user state to reflect changes immediately
       setUser(resp.data.user)